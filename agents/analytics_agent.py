@@ -3,16 +3,139 @@ Analytics Agent - Phân tích kho hàng nâng cao
 Tính toán: Stock Cover Days, Inventory Turnover, Stock Health, Restock Recommendations
 """
 
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 import os
+import threading
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
 from langchain_groq import ChatGroq
 from utils.logger import traceable
-from configs.settings import GROQ_MODEL_NAME
-from db.connection import get_db, run_sql_unified
+from configs.settings import (
+    GROQ_MODEL_NAME, ANALYTICS_SNAPSHOT_TTL_SECONDS, ANALYTICS_SALES_SOURCE,
+    FORECAST_HISTORY_DAYS, FORECAST_HORIZON_DAYS, FORECAST_ALPHA, FORECAST_GAMMA, FORECAST_INTERMITTENT_ALPHA,
+    SAFETY_STOCK_SERVICE_LEVEL, REORDER_REVIEW_DAYS,
+    STOCKOUT_SIMULATION_TRIALS, STOCKOUT_SIMULATION_BLOCK_DAYS, STOCKOUT_SIMULATION_SEED,
+    ANALYTICS_SNAPSHOT_DIR, ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS, ANALYTICS_SNAPSHOT_KEEP,
+)
+from db.connection import get_db, run_sql_unified, get_data_source_id
+from agents.analytics_snapshot import AnalyticsSnapshot
+from agents.demand_forecast import build_demand_matrix, forecast_stock_cover
+from agents.safety_stock import compute_reorder_policy
+from agents.stockout_simulation import simulate_stockout
+from agents.transfer_optimizer import compute_transfer_balances, greedy_transfer_plan, haversine_matrix
+from agents.snapshot_store import load_latest_snapshot, write_snapshot
+
+
+# Sales sources for window analytics, exposed as (sku_id, warehouse_id, order_date, qty, revenue).
+# daily_sales_agg is maintained incrementally by triggers on sales (see init.sql).
+SALES_SOURCES = {
+    "daily_sales_agg": "daily_sales_agg",
+    "sales": "(SELECT sku_id, warehouse_id, order_date, order_quantity AS qty, revenue FROM sales)",
+}
+
+# Whitelisted sort orders for pushed-down stock cover queries: name -> (column, ascending)
+STOCK_COVER_ORDERS = {
+    "cover_asc": ("stock_cover_days", True),
+    "cover_desc": ("stock_cover_days", False),
+}
+TURNOVER_ORDERS = {
+    "turnover_desc": ("turnover_ratio", False),
+    "turnover_asc": ("turnover_ratio", True),
+}
+
+
+def filter_stock_cover_frame(
+    df: pd.DataFrame,
+    sku_id: Optional[str] = None,
+    warehouse_id: Optional[str] = None,
+    statuses: Optional[List[str]] = None,
+    exclude_statuses: Optional[List[str]] = None,
+    min_cover_days: Optional[float] = None,
+    max_cover_days: Optional[float] = None,
+    order: str = "cover_asc",
+    limit: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Áp dụng cùng bộ lọc như calculate_stock_cover_days lên một frame đã có (ví dụ snapshot)
+    
+    Giữ đúng ngữ nghĩa của phần WHERE/ORDER BY/LIMIT trong SQL để hai đường đi cho cùng kết quả.
+    """
+    mask = pd.Series(True, index=df.index)
+    if sku_id:
+        mask &= df['sku_id'] == sku_id
+    if warehouse_id:
+        mask &= df['warehouse_id'] == warehouse_id
+    if statuses:
+        mask &= df['stock_status'].isin(statuses)
+    if exclude_statuses:
+        mask &= ~df['stock_status'].isin(exclude_statuses)
+    if min_cover_days is not None:
+        mask &= df['stock_cover_days'] > min_cover_days
+    if max_cover_days is not None:
+        mask &= df['stock_cover_days'] < max_cover_days
+    
+    column, ascending = STOCK_COVER_ORDERS.get(order, STOCK_COVER_ORDERS["cover_asc"])
+    result = df[mask].sort_values(column, ascending=ascending, na_position='last', kind='stable')
+    return result.head(limit) if limit else result
+
+
+URGENT_REORDER_LABEL = 'URGENT - Order Now!'
+EMERGENCY_ACTION_LABEL = '🚨 CRITICAL - Emergency order needed'
+MONITOR_ACTION_LABEL = '⚠️ Monitor and plan reorder'
+
+
+def compute_reorder_urgency(days_until_stockout: pd.Series, lead_time_days: pd.Series) -> pd.Categorical:
+    """
+    Nhãn reorder urgency (vectorized)
+    
+    'URGENT - Order Now!' khi hết hàng trước/đúng lúc hàng mới về,
+    ngược lại 'Order in N days' với N = số ngày còn lại trước khi phải đặt hàng.
+    Labels are built once per distinct N and mapped back through categorical codes.
+    """
+    days = days_until_stockout.to_numpy(dtype=np.float64)
+    lead = lead_time_days.to_numpy(dtype=np.float64)
+    lead = np.where(np.isnan(lead), 0.0, lead)
+    
+    slack_days = np.trunc(days - lead)
+    is_urgent = days <= lead
+    slack = np.where(is_urgent, 0, slack_days).astype(np.int64)
+    unique_slack, inverse = np.unique(slack, return_inverse=True)
+    
+    categories = [URGENT_REORDER_LABEL] + [f'Order in {n} days' for n in unique_slack]
+    codes = np.select([is_urgent], [0], default=inverse + 1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def compute_stockout_dates(cover_days: pd.Series, today: datetime) -> np.ndarray:
+    """Ngày hết hàng dự kiến (YYYY-MM-DD) = today + cover_days, tính trên mảng datetime64"""
+    offsets = (cover_days.to_numpy(dtype=np.float64) * 86400e9).astype('timedelta64[ns]')
+    stockout_at = np.datetime64(pd.Timestamp(today).to_datetime64(), 'ns') + offsets
+    return stockout_at.astype('datetime64[D]').astype(str)
+
+
+def compute_action_required(stockout_before_restock: pd.Series) -> pd.Categorical:
+    """Hành động cần làm theo việc hết hàng có xảy ra trước khi hàng về hay không"""
+    codes = stockout_before_restock.to_numpy(dtype=bool).astype(np.int8)
+    return pd.Categorical.from_codes(codes, categories=[MONITOR_ACTION_LABEL, EMERGENCY_ACTION_LABEL])
+
+
+def compute_restock_candidates(df: pd.DataFrame, days_until_stockout: pd.Series) -> pd.Series:
+    """
+    Dòng dưới reorder point cần đề xuất đặt hàng
+    
+    Overstock / No Sales chỉ được đề xuất khi dự báo nhu cầu cũng đồng ý
+    (hết hàng trước hoặc đúng lúc hàng mới về), còn lại các dòng dưới reorder point đều được giữ.
+    """
+    if 'below_reorder_point' not in df.columns:
+        return pd.Series(False, index=df.index)
+    below = df['below_reorder_point'].fillna(False).astype(bool)
+    disputed = df['stock_status'].isin(['Overstock', 'No Sales'])
+    lead = df['average_lead_time_days'].fillna(0)
+    forecast_agrees = (days_until_stockout <= lead).fillna(False)
+    return below & (~disputed | forecast_agrees)
 
 
 class AnalyticsAgent:
@@ -33,47 +156,286 @@ class AnalyticsAgent:
         self.WARNING_DAYS = 30
         self.HEALTHY_DAYS = 60
         self.OVERSTOCK_DAYS = 90
+        
+        # ABC (cumulative revenue share) / XYZ (coefficient of variation of demand) thresholds
+        self.ABC_A_SHARE = 0.80
+        self.ABC_B_SHARE = 0.95
+        self.XYZ_X_CV = 0.5
+        self.XYZ_Y_CV = 1.0
+
+        # Rolling windows read from the daily aggregate; falls back to raw sales if it is missing
+        self.sales_source = ANALYTICS_SALES_SOURCE if ANALYTICS_SALES_SOURCE in SALES_SOURCES else "sales"
+        
+        # Shared snapshot: one stock cover query serves every analytics view until TTL expires
+        self.snapshot_ttl_seconds = ANALYTICS_SNAPSHOT_TTL_SECONDS
+        self._snapshot: Optional[AnalyticsSnapshot] = None
+        self._snapshot_lock = threading.Lock()
+        # Warehouse rollups computed without a snapshot: (computed_at, frame)
+        self._warehouse_rollups: Optional[Tuple[float, pd.DataFrame]] = None
+        # Persisted snapshots (analytics_snapshot_job.py) are served while younger than max age
+        self.snapshot_dir = ANALYTICS_SNAPSHOT_DIR
+        self.snapshot_max_age_seconds = ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS
+
+    @traceable(name="inventory_analytics.get_snapshot")
+    def get_snapshot(self, force_refresh: bool = False) -> AnalyticsSnapshot:
+        """
+        Lấy snapshot stock cover dùng chung (build lại khi hết TTL)
+        
+        Thứ tự: snapshot trong bộ nhớ còn hạn -> snapshot Parquet mới nhất còn hạn -> query database.
+        
+        Args:
+            force_refresh: Bỏ qua snapshot hiện tại (cả bản Parquet) và query lại database
+            
+        Returns:
+            AnalyticsSnapshot (frames chỉ đọc)
+        """
+        with self._snapshot_lock:
+            if not force_refresh and self._snapshot is not None and self._snapshot.is_fresh():
+                return self._snapshot
+            if force_refresh:
+                self._warehouse_rollups = None
+            
+            if not force_refresh:
+                persisted = self._load_persisted_snapshot()
+                if persisted is not None:
+                    self._snapshot = persisted
+                    return persisted
+            
+            t0 = time.perf_counter()
+            df = self.calculate_stock_cover_days()
+            t1 = time.perf_counter()
+            as_of_date = None
+            if not df.empty:
+                df, as_of_date = self._attach_demand_metrics(df)
+            build_ms = (time.perf_counter() - t0) * 1000
+            snapshot = AnalyticsSnapshot(
+                stock_cover=df,
+                period_days=30,
+                ttl_seconds=self.snapshot_ttl_seconds,
+                build_ms=build_ms,
+                turnover_loader=lambda period_days: self.calculate_inventory_turnover(period_days=period_days),
+                as_of_date=as_of_date,
+                forecast_ms=(time.perf_counter() - t1) * 1000,
+            )
+            # Do not cache failed/empty reads so the next request retries
+            if not df.empty:
+                self._snapshot = snapshot
+            print(f"📸 Analytics snapshot built in {build_ms:.0f}ms ({len(df)} rows, version {snapshot.data_version})")
+            return snapshot
     
-    @traceable(name="inventory_analytics.calculate_stock_cover")
-    def calculate_stock_cover_days(
-        self, 
-        sku_id: Optional[str] = None,
-        warehouse_id: Optional[str] = None,
-        period_days: int = 30
-    ) -> pd.DataFrame:
+    def load_daily_sales_history(self, history_days: int = FORECAST_HISTORY_DAYS) -> pd.DataFrame:
         """
-        Tính Stock Cover Days = Current Inventory / Average Daily Sales
+        Lịch sử bán theo ngày (sku_id, warehouse_id, order_date, qty) của history_days ngày
+        gần nhất, tính từ ngày mới nhất trong dữ liệu
+        """
+        sql = """
+        WITH date_range AS (
+            SELECT MAX(order_date) AS latest_date
+            FROM {sales_source} s
+        )
+        SELECT s.sku_id, s.warehouse_id, s.order_date, s.qty
+        FROM {sales_source} s
+        CROSS JOIN date_range dr
+        WHERE s.order_date > dr.latest_date - CAST(:history_days AS integer)
+        """
+        df, error = self._run_sales_window_sql(
+            sql, {"history_days": history_days}, "analytics_daily_history"
+        )
+        if error:
+            print(f"❌ Error loading daily sales history: {error}")
+            return pd.DataFrame()
+        return df
+    
+    def _attach_demand_metrics(self, stock_cover: pd.DataFrame):
+        """
+        Thêm dự báo nhu cầu (forecast_daily_demand / forecast_cover_days / predicted_stockout_date)
+        và chính sách đặt hàng (safety_stock / reorder_point / recommended_order_qty) vào stock cover
+        
+        Cả hai dùng chung một ma trận nhu cầu ngày × series; mức nhu cầu d của reorder point
+        là avg_daily_sales (cùng cơ sở với stock_status), ma trận chỉ cho độ biến động.
+        
+        Returns:
+            (frame mới, ngày dữ liệu mới nhất) - giữ nguyên frame nếu không có lịch sử bán
+        """
+        daily = self.load_daily_sales_history()
+        if daily.empty:
+            return stock_cover, None
+        as_of_date = pd.Timestamp(pd.to_datetime(daily['order_date']).max()).normalize()
+        demand = build_demand_matrix(daily, stock_cover, as_of_date, FORECAST_HISTORY_DAYS)
+        forecast = forecast_stock_cover(
+            stock_cover, daily,
+            history_days=FORECAST_HISTORY_DAYS,
+            horizon_days=FORECAST_HORIZON_DAYS,
+            alpha=FORECAST_ALPHA,
+            gamma=FORECAST_GAMMA,
+            as_of=as_of_date,
+            demand=demand,
+            intermittent_alpha=FORECAST_INTERMITTENT_ALPHA,
+        )
+        # Reorder point uses the same demand rate as stock_status (avg_daily_sales), so a row
+        # cannot be Overstock / No Sales and below its reorder point on different demand bases
+        policy = compute_reorder_policy(
+            stock_cover, demand,
+            service_level=SAFETY_STOCK_SERVICE_LEVEL,
+            review_period_days=REORDER_REVIEW_DAYS,
+            daily_mean=stock_cover['avg_daily_sales'].fillna(0).to_numpy(dtype=np.float64),
+        )
+        return pd.concat([stock_cover, forecast, policy], axis=1), as_of_date
+    
+    def _load_persisted_snapshot(self) -> Optional[AnalyticsSnapshot]:
+        """Snapshot Parquet mới nhất nếu còn đủ mới, None nếu không có"""
+        if self.snapshot_max_age_seconds <= 0:
+            return None
+        # Snapshots written for another database (e.g. DuckDB vs PostgreSQL) are never served
+        loaded = load_latest_snapshot(
+            self.snapshot_dir, self.snapshot_max_age_seconds, expected=self._snapshot_source()
+        )
+        if loaded is None:
+            return None
+        frames, manifest, path = loaded
+        stock_cover = frames.get("stock_cover")
+        if stock_cover is None or stock_cover.empty:
+            return None
+        
+        turnover = {
+            int(name.split("_", 1)[1]): frame
+            for name, frame in frames.items() if name.startswith("turnover_")
+        }
+        views = dict(manifest.get("documents", {}))
+        if "warehouse_rollups" in frames:
+            views["warehouse_rollups"] = frames["warehouse_rollups"]
+        as_of_date = manifest.get("as_of_date")
+        snapshot = AnalyticsSnapshot(
+            stock_cover=stock_cover,
+            period_days=manifest.get("period_days", 30),
+            ttl_seconds=self.snapshot_max_age_seconds,
+            build_ms=manifest.get("build_ms", 0.0),
+            turnover_loader=lambda period_days: self.calculate_inventory_turnover(period_days=period_days),
+            as_of_date=pd.Timestamp(as_of_date) if as_of_date else None,
+            forecast_ms=manifest.get("forecast_ms"),
+            built_at=float(manifest["created_at"]),
+            source=f"parquet:{manifest.get('version')}",
+            turnover=turnover,
+            views=views,
+            data_version=manifest.get("data_version"),
+        )
+        print(f"📂 Analytics snapshot loaded from {path} ({snapshot.staleness_text()})")
+        return snapshot
+    
+    def _snapshot_source(self) -> Dict[str, str]:
+        """Database mà snapshot được build từ đó (ghi vào manifest, phải khớp khi đọc lại)"""
+        return {"db_type": self.db_type.lower(), "data_source": get_data_source_id(self.db_type)}
+    
+    def persist_snapshot(self, turnover_periods: List[int] = (90,), force_refresh: bool = True) -> str:
+        """
+        Build snapshot (stock cover, turnover, health summary, warehouse rollups) và ghi ra Parquet
         
         Args:
-            sku_id: Filter by specific SKU (optional)
-            warehouse_id: Filter by specific warehouse (optional)
-            period_days: Number of days to calculate average sales (default: 30)
+            turnover_periods: Các kỳ turnover cần tính sẵn
+            force_refresh: Query lại database thay vì dùng snapshot đang có
             
         Returns:
-            DataFrame with stock cover days analysis
+            Đường dẫn thư mục version vừa ghi
+        """
+        snapshot = self.get_snapshot(force_refresh=force_refresh)
+        if snapshot.stock_cover.empty:
+            raise RuntimeError("Stock cover query returned no rows")
+        
+        frames = {"stock_cover": snapshot.stock_cover}
+        for period_days in turnover_periods:
+            turnover = snapshot.turnover(period_days)
+            if not turnover.empty:
+                frames[f"turnover_{period_days}"] = turnover
+        warehouse_rollups = self.get_warehouse_rollups()
+        if not warehouse_rollups.empty:
+            frames["warehouse_rollups"] = warehouse_rollups
+        documents = {"health_summary": self.get_stock_health_summary()}
+        
+        info = snapshot.info()
+        return write_snapshot(
+            self.snapshot_dir,
+            frames,
+            documents,
+            metadata={
+                **self._snapshot_source(),
+                "data_version": snapshot.data_version,
+                "period_days": snapshot.period_days,
+                "as_of_date": info["as_of_date"],
+                "build_ms": info["build_ms"],
+                "forecast_ms": info["forecast_ms"],
+                "rows": info["rows"],
+            },
+            keep=ANALYTICS_SNAPSHOT_KEEP,
+        )
+    
+    def peek_snapshot(self) -> Optional[AnalyticsSnapshot]:
         """
+        Snapshot còn hạn (trong bộ nhớ hoặc bản Parquet mới nhất), không query database
         
+        Returns:
+            AnalyticsSnapshot hoặc None nếu chưa có/hết hạn
+        """
+        with self._snapshot_lock:
+            if self._snapshot is not None and self._snapshot.is_fresh():
+                return self._snapshot
+            persisted = self._load_persisted_snapshot()
+            if persisted is not None:
+                self._snapshot = persisted
+            return persisted
+    
+    def invalidate_snapshot(self) -> None:
+        """Drop the cached snapshot (e.g. after data reload)"""
+        with self._snapshot_lock:
+            self._snapshot = None
+            self._warehouse_rollups = None
+    
+    def _run_sales_window_sql(self, sql: str, params: Dict[str, Any], statement_name: str):
+        """
+        Chạy query phân tích đọc từ nguồn sales theo ngày ({sales_source} trong SQL)
+        
+        Nếu bảng daily_sales_agg chưa tồn tại (database cũ), chuyển sang đọc bảng sales gốc.
+        """
+        source = self.sales_source
+        df, error = run_sql_unified(
+            sql.format(sales_source=SALES_SOURCES[source]), self.db_type,
+            params=params, statement_name=f"{statement_name}_{source}",
+        )
+        if error and source != "sales" and "daily_sales_agg" in error:
+            print("⚠️ daily_sales_agg not available, falling back to raw sales table")
+            self.sales_source = "sales"
+            return self._run_sales_window_sql(sql, params, statement_name)
+        return df, error
+    
+    def _stock_cover_base_sql(self, period_days: int = 30) -> Tuple[str, Dict[str, Any]]:
+        """
+        SQL stock cover một dòng / SKU-warehouse (kết thúc bằng WHERE 1=1 để nối thêm bộ lọc)
+        
+        Returns:
+            (sql chứa {sales_source}, bind params)
+        """
         # Build SQL query to calculate stock cover
         # NOTE: Using last available date in sales table instead of CURRENT_DATE
         # to handle historical data (2021-2023)
         # Improved: Calculate avg_daily_sales using actual days with sales or period days
-        sql = f"""
+        # Bind params (:name) keep the statement text constant so the server can reuse its plan
+        # Portable SQL (PostgreSQL + DuckDB): date - integer, CAST(... AS NUMERIC), NULLS LAST
+        sql = """
         WITH date_range AS (
             SELECT MAX(order_date) AS latest_date
-            FROM sales
+            FROM {sales_source} s
         ),
         daily_sales AS (
             SELECT 
                 s.sku_id,
                 s.warehouse_id,
-                SUM(s.order_quantity)::numeric / {period_days}.0 AS avg_daily_sales,
+                CAST(SUM(s.qty) AS NUMERIC) / CAST(:period_days AS integer) AS avg_daily_sales,
                 COUNT(DISTINCT s.order_date) AS active_days,
-                SUM(s.order_quantity) AS total_quantity_sold
-            FROM sales s
+                SUM(s.qty) AS total_quantity_sold
+            FROM {sales_source} s
             CROSS JOIN date_range dr
-            WHERE s.order_date >= dr.latest_date - INTERVAL '{period_days} days'
+            WHERE s.order_date >= dr.latest_date - CAST(:period_days AS integer)
             GROUP BY s.sku_id, s.warehouse_id
-            HAVING SUM(s.order_quantity) > 0
+            HAVING SUM(s.qty) > 0
         ),
         inventory_current AS (
             SELECT 
@@ -82,6 +444,7 @@ class AnalyticsAgent:
                 i.current_inventory_quantity,
                 i.total_value,
                 i.average_lead_time_days,
+                i.maximum_lead_time_days,
                 i.vendor_name
             FROM inventory i
         )
@@ -100,13 +463,14 @@ class AnalyticsAgent:
                 ELSE NULL 
             END AS stock_cover_days,
             ic.average_lead_time_days,
+            ic.maximum_lead_time_days,
             ic.total_value,
             CASE 
                 WHEN COALESCE(ds.avg_daily_sales, 0) = 0 THEN 'No Sales'
-                WHEN ic.current_inventory_quantity / NULLIF(ds.avg_daily_sales, 0) < {self.CRITICAL_DAYS} THEN 'Critical'
-                WHEN ic.current_inventory_quantity / NULLIF(ds.avg_daily_sales, 0) < {self.WARNING_DAYS} THEN 'Warning'
-                WHEN ic.current_inventory_quantity / NULLIF(ds.avg_daily_sales, 0) < {self.HEALTHY_DAYS} THEN 'Healthy'
-                WHEN ic.current_inventory_quantity / NULLIF(ds.avg_daily_sales, 0) >= {self.OVERSTOCK_DAYS} THEN 'Overstock'
+                WHEN ic.current_inventory_quantity / NULLIF(ds.avg_daily_sales, 0) < :critical_days THEN 'Critical'
+                WHEN ic.current_inventory_quantity / NULLIF(ds.avg_daily_sales, 0) < :warning_days THEN 'Warning'
+                WHEN ic.current_inventory_quantity / NULLIF(ds.avg_daily_sales, 0) < :healthy_days THEN 'Healthy'
+                WHEN ic.current_inventory_quantity / NULLIF(ds.avg_daily_sales, 0) >= :overstock_days THEN 'Overstock'
                 ELSE 'Good'
             END AS stock_status,
             CASE 
@@ -125,15 +489,93 @@ class AnalyticsAgent:
         LEFT JOIN skus sk ON ic.sku_id = sk.sku_id
         WHERE 1=1
         """
+        params = {
+            "period_days": period_days,
+            "critical_days": self.CRITICAL_DAYS,
+            "warning_days": self.WARNING_DAYS,
+            "healthy_days": self.HEALTHY_DAYS,
+            "overstock_days": self.OVERSTOCK_DAYS,
+        }
+        return sql, params
+    
+    @traceable(name="inventory_analytics.calculate_stock_cover")
+    def calculate_stock_cover_days(
+        self, 
+        sku_id: Optional[str] = None,
+        warehouse_id: Optional[str] = None,
+        period_days: int = 30,
+        statuses: Optional[List[str]] = None,
+        exclude_statuses: Optional[List[str]] = None,
+        min_cover_days: Optional[float] = None,
+        max_cover_days: Optional[float] = None,
+        order: str = "cover_asc",
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Tính Stock Cover Days = Current Inventory / Average Daily Sales
+        
+        Các bộ lọc được đẩy xuống SQL (WHERE/ORDER BY/LIMIT) để chỉ những dòng cần thiết rời database.
+        
+        Args:
+            sku_id: Filter by specific SKU (optional)
+            warehouse_id: Filter by specific warehouse (optional)
+            period_days: Number of days to calculate average sales (default: 30)
+            statuses: Only keep these stock_status values (optional)
+            exclude_statuses: Drop these stock_status values (optional)
+            min_cover_days: Keep stock_cover_days > value (optional)
+            max_cover_days: Keep stock_cover_days < value (optional)
+            order: One of STOCK_COVER_ORDERS (default: cover_asc)
+            limit: Max rows to return (optional)
+            
+        Returns:
+            DataFrame with stock cover days analysis
+        """
+        
+        sql, params = self._stock_cover_base_sql(period_days)
         
+        # One prepared statement per filter combination (keeps index-friendly plans for drill-downs)
+        statement_name = "analytics_stock_cover"
         if sku_id:
-            sql += f" AND ic.sku_id = '{sku_id}'"
+            sql += " AND ic.sku_id = :sku_id"
+            params["sku_id"] = sku_id
+            statement_name += "_sku"
         if warehouse_id:
-            sql += f" AND ic.warehouse_id = '{warehouse_id}'"
+            sql += " AND ic.warehouse_id = :warehouse_id"
+            params["warehouse_id"] = warehouse_id
+            statement_name += "_wh"
+        
+        # Filters on computed columns are applied on the wrapped result, still inside the database
+        sql = "SELECT * FROM (" + sql + ") sc WHERE 1=1"
+        if statuses:
+            names = [f"status_{i}" for i in range(len(statuses))]
+            sql += " AND sc.stock_status IN (" + ", ".join(f":{n}" for n in names) + ")"
+            params.update(zip(names, statuses))
+            statement_name += f"_st{len(statuses)}"
+        if exclude_statuses:
+            names = [f"exclude_status_{i}" for i in range(len(exclude_statuses))]
+            sql += " AND sc.stock_status NOT IN (" + ", ".join(f":{n}" for n in names) + ")"
+            params.update(zip(names, exclude_statuses))
+            statement_name += f"_ex{len(exclude_statuses)}"
+        if min_cover_days is not None:
+            sql += " AND sc.stock_cover_days > :min_cover_days"
+            params["min_cover_days"] = min_cover_days
+            statement_name += "_min"
+        if max_cover_days is not None:
+            sql += " AND sc.stock_cover_days < :max_cover_days"
+            params["max_cover_days"] = max_cover_days
+            statement_name += "_max"
         
-        sql += " ORDER BY stock_cover_days ASC NULLS LAST"
+        if order not in STOCK_COVER_ORDERS:
+            order = "cover_asc"
+        column, ascending = STOCK_COVER_ORDERS[order]
+        sql += f" ORDER BY sc.{column} {'ASC' if ascending else 'DESC'} NULLS LAST"
+        statement_name += f"_{order}"
+        if limit:
+            sql += " LIMIT :limit"
+            params["limit"] = int(limit)
+            statement_name += "_lim"
         
-        df, error = run_sql_unified(sql, self.db_type)
+        df, error = self._run_sales_window_sql(sql, params, statement_name)
         
         if error:
             print(f"❌ Error calculating stock cover: {error}")
@@ -149,11 +591,14 @@ class AnalyticsAgent:
         Returns:
             Dictionary with health statistics
         """
-        df = self.calculate_stock_cover_days()
+        snapshot = self.get_snapshot()
         
-        if df.empty:
+        if snapshot.stock_cover.empty:
             return {"error": "No data available"}
         
+        return snapshot.view("health_summary", lambda: self._build_stock_health_summary(snapshot.stock_cover))
+    
+    def _build_stock_health_summary(self, df: pd.DataFrame) -> Dict[str, Any]:
         # Count by status
         status_counts = df['stock_status'].value_counts().to_dict()
         
@@ -188,15 +633,15 @@ class AnalyticsAgent:
     @traceable(name="inventory_analytics.get_restock_recommendations")
     def get_restock_recommendations(self, urgency: str = "all") -> pd.DataFrame:
         """
-        Đề xuất restock dựa trên stock cover days và lead time
+        Đề xuất restock dựa trên stock cover days, safety stock và reorder point
         
         Args:
-            urgency: 'critical', 'warning', or 'all' (default)
+            urgency: 'critical', 'warning', or 'all' (default, cũng gồm các dòng dưới reorder point)
             
         Returns:
             DataFrame with restock recommendations
         """
-        df = self.calculate_stock_cover_days()
+        df = self.get_snapshot().stock_cover
         
         if df.empty:
             return pd.DataFrame()
@@ -207,38 +652,81 @@ class AnalyticsAgent:
         elif urgency.lower() == "warning":
             df = df[df['stock_status'].isin(['Critical', 'Warning'])]
         else:
-            # Exclude healthy, good, and overstock
-            df = df[df['stock_status'].isin(['Critical', 'Warning'])]
+            # Exclude healthy, good, and overstock unless already below the reorder point
+            mask = df['stock_status'].isin(['Critical', 'Warning'])
+            mask |= compute_restock_candidates(df, self._days_until_stockout(df))
+            df = df[mask]
         
         if df.empty:
             return df
         
-        # Calculate recommended reorder quantity
-        # Formula: (Target Days - Current Cover Days) * Daily Sales
-        target_cover_days = 45  # Target 45 days coverage
+        # Snapshot frames are shared; work on our own filtered copy
+        df = df.copy()
         
-        df['recommended_reorder_qty'] = np.maximum(
-            0,
-            (target_cover_days - df['stock_cover_days'].fillna(0)) * df['avg_daily_sales']
-        ).round(2)
+        # Calculate recommended reorder quantity
+        if 'order_up_to_level' in df.columns:
+            # Order up to reorder point (safety stock included) + review period demand
+            df['recommended_reorder_qty'] = np.maximum(
+                0, df['order_up_to_level'] - df['current_inventory_quantity']
+            ).round(2)
+        else:
+            # No sales history for the policy: (Target Days - Current Cover Days) * Daily Sales
+            target_cover_days = 45
+            df['recommended_reorder_qty'] = np.maximum(
+                0,
+                (target_cover_days - df['stock_cover_days'].fillna(0)) * df['avg_daily_sales']
+            ).round(2)
         
         # Calculate when to reorder (considering lead time)
-        df['days_until_stockout'] = df['stock_cover_days'].fillna(0)
-        df['reorder_urgency'] = df.apply(
-            lambda row: 'URGENT - Order Now!' if row['days_until_stockout'] <= row['average_lead_time_days']
-            else f'Order in {int(row["days_until_stockout"] - row["average_lead_time_days"])} days',
-            axis=1
+        # Forecast depletion (seasonal demand) when available, flat stock cover otherwise
+        # Rows with no depletion in sight (e.g. only below reorder point) sit at the forecast horizon
+        df['days_until_stockout'] = self._days_until_stockout(df).fillna(FORECAST_HORIZON_DAYS)
+        df['reorder_urgency'] = compute_reorder_urgency(
+            df['days_until_stockout'], df['average_lead_time_days']
         )
         
         # Sort by urgency
-        df = df.sort_values('stock_cover_days')
+        df = df.sort_values(['days_until_stockout', 'stock_cover_days'])
         
         # Select relevant columns
-        result = df[[
+        result = df[[c for c in [
             'sku_id', 'sku_name', 'warehouse_id', 'vendor_name',
             'current_inventory_quantity', 'avg_daily_sales', 
-            'stock_cover_days', 'average_lead_time_days',
+            'stock_cover_days', 'forecast_daily_demand', 'predicted_stockout_date',
+            'average_lead_time_days', 'maximum_lead_time_days',
+            'safety_stock', 'reorder_point',
             'recommended_reorder_qty', 'reorder_urgency', 'stock_status'
+        ] if c in df.columns]]
+        
+        return result
+    
+    @traceable(name="inventory_analytics.get_reorder_points")
+    def get_reorder_points(self, below_only: bool = False) -> pd.DataFrame:
+        """
+        Safety stock / reorder point / số lượng đặt hàng cho mọi SKU-warehouse (từ snapshot)
+        
+        Args:
+            below_only: Chỉ trả về các dòng có tồn kho <= reorder point
+                (Overstock / No Sales chỉ khi dự báo cũng đồng ý, xem compute_restock_candidates)
+            
+        Returns:
+            DataFrame sorted by stock position relative to reorder point (lowest first)
+        """
+        df = self.get_snapshot().stock_cover
+        
+        if df.empty or 'reorder_point' not in df.columns:
+            return pd.DataFrame()
+        
+        if below_only:
+            df = df[compute_restock_candidates(df, self._days_until_stockout(df))]
+        
+        position = df['current_inventory_quantity'] - df['reorder_point']
+        result = df.loc[position.sort_values(kind='stable').index, [
+            'sku_id', 'sku_name', 'warehouse_id', 'current_inventory_quantity',
+            'demand_mean_daily', 'demand_std_daily',
+            'average_lead_time_days', 'maximum_lead_time_days',
+            'safety_stock', 'reorder_point', 'order_up_to_level',
+            'below_reorder_point', 'recommended_order_qty'
         ]]
         
         return result
@@ -251,7 +739,7 @@ class AnalyticsAgent:
         Returns:
             DataFrame with overstock items
         """
-        df = self.calculate_stock_cover_days()
+        df = self.get_snapshot().stock_cover
         
         if df.empty:
             return pd.DataFrame()
@@ -285,6 +773,94 @@ class AnalyticsAgent:
         
         return result
     
+    @traceable(name="inventory_analytics.recommend_transfers")
+    def recommend_transfers(
+        self,
+        target_days: Optional[int] = None,
+        max_distance_km: Optional[float] = None,
+        sku_id: Optional[str] = None,
+        warehouse_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Đề xuất điều chuyển hàng từ kho overstock sang kho critical/warning của cùng SKU
+        
+        Toàn catalog một lượt: khoảng cách haversine giữa mọi cặp kho, rồi ghép dư/thiếu
+        greedy theo khoảng cách gần nhất. Kho dư giữ lại target_days ngày nhu cầu.
+        
+        Args:
+            target_days: Số ngày cover mục tiêu sau điều chuyển (default: HEALTHY_DAYS)
+            max_distance_km: Bỏ các cặp kho xa hơn ngưỡng (optional)
+            sku_id: Filter by specific SKU (optional)
+            warehouse_id: Chỉ các lệnh đi từ hoặc đến warehouse này (optional)
+            limit: Max rows to return (optional)
+            
+        Returns:
+            DataFrame sorted by receiving warehouse cover (most urgent first), then distance
+        """
+        target_days = target_days or self.HEALTHY_DAYS
+        df = self.get_snapshot().stock_cover
+        
+        if df.empty:
+            return pd.DataFrame()
+        if sku_id:
+            df = df[df['sku_id'] == sku_id]
+        
+        warehouses, error = run_sql_unified(
+            "SELECT warehouse_code, latitude, longitude FROM warehouses",
+            self.db_type, statement_name="analytics_warehouse_coords",
+        )
+        if error or warehouses.empty:
+            print(f"❌ Error loading warehouse coordinates: {error}")
+            return pd.DataFrame()
+        
+        balances = compute_transfer_balances(
+            df, target_days,
+            surplus_min_cover_days=self.OVERSTOCK_DAYS,
+            deficit_max_cover_days=self.WARNING_DAYS,
+        )
+        df = pd.concat([df, balances], axis=1)
+        plan = greedy_transfer_plan(
+            df[df['surplus_qty'] > 0],
+            df[df['deficit_qty'] > 0],
+            haversine_matrix(warehouses['latitude'], warehouses['longitude']),
+            pd.Index(warehouses['warehouse_code']),
+            max_distance_km=max_distance_km,
+        )
+        
+        if plan.empty:
+            return pd.DataFrame()
+        
+        donor = df.loc[plan['donor_row']].reset_index(drop=True)
+        receiver = df.loc[plan['receiver_row']].reset_index(drop=True)
+        plan = plan.reset_index(drop=True)
+        plan['sku_name'] = donor['sku_name']
+        plan['transfer_qty'] = plan['transfer_qty'].round(2)
+        plan['distance_km'] = plan['distance_km'].round(1)
+        plan['from_cover_days'] = donor['stock_cover_days']
+        plan['to_cover_days'] = receiver['stock_cover_days']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            plan['to_cover_days_after'] = (
+                (receiver['current_inventory_quantity'] + plan['transfer_qty']) / receiver['daily_demand']
+            ).round(1)
+        cost_per_unit = donor['total_value'] / donor['current_inventory_quantity'].replace(0, np.nan)
+        plan['transfer_value'] = (plan['transfer_qty'] * cost_per_unit).round(2)
+        plan['to_stock_status'] = receiver['stock_status']
+        
+        if warehouse_id:
+            plan = plan[(plan['from_warehouse'] == warehouse_id) | (plan['to_warehouse'] == warehouse_id)]
+        plan = plan.sort_values(['to_cover_days', 'distance_km'], na_position='last', kind='stable')
+        if limit:
+            plan = plan.head(limit)
+        
+        result = plan[[
+            'sku_id', 'sku_name', 'from_warehouse', 'to_warehouse', 'distance_km',
+            'transfer_qty', 'transfer_value', 'from_cover_days', 'to_cover_days',
+            'to_cover_days_after', 'to_stock_status'
+        ]]
+        
+        return result
+    
     @traceable(name="inventory_analytics.predict_stockout_dates")
     def predict_stockout_dates(self, days_threshold: int = 60) -> pd.DataFrame:
         """
@@ -296,72 +872,167 @@ class AnalyticsAgent:
         Returns:
             DataFrame with stockout predictions
         """
-        df = self.calculate_stock_cover_days()
+        snapshot = self.get_snapshot()
+        df = snapshot.stock_cover
         
         if df.empty:
             return pd.DataFrame()
         
+        # Days until stockout from the demand forecast, flat stock cover as fallback
+        days_until_stockout = self._days_until_stockout(df)
+        
         # Filter items with stock cover below threshold
-        df = df[
-            (df['stock_cover_days'].notna()) & 
-            (df['stock_cover_days'] < days_threshold) &
-            (df['stock_cover_days'] > 0)
-        ].copy()
+        mask = (
+            (days_until_stockout.notna()) & 
+            (days_until_stockout < days_threshold) &
+            (days_until_stockout > 0)
+        )
+        df = df[mask].copy()
         
         if df.empty:
             return df
         
-        # Calculate predicted stockout date
-        today = datetime.now()
-        df['predicted_stockout_date'] = df['stock_cover_days'].apply(
-            lambda days: (today + timedelta(days=days)).strftime('%Y-%m-%d')
-        )
+        df['days_until_stockout'] = days_until_stockout[mask]
+        
+        # Calculate predicted stockout date, anchored to the latest date in the data
+        as_of = snapshot.as_of_date if snapshot.as_of_date is not None else datetime.now()
+        df['predicted_stockout_date'] = compute_stockout_dates(df['days_until_stockout'], as_of)
         
         # Calculate if stockout happens before restock arrives
-        df['stockout_before_restock'] = df['stock_cover_days'] < df['average_lead_time_days']
+        df['stockout_before_restock'] = df['days_until_stockout'] < df['average_lead_time_days']
         
-        df['action_required'] = df['stockout_before_restock'].apply(
-            lambda x: '🚨 CRITICAL - Emergency order needed' if x else '⚠️ Monitor and plan reorder'
-        )
+        df['action_required'] = compute_action_required(df['stockout_before_restock'])
         
         # Sort by soonest stockout
-        df = df.sort_values('stock_cover_days')
+        df = df.sort_values('days_until_stockout')
         
-        result = df[[
+        result = df[[c for c in [
             'sku_id', 'sku_name', 'warehouse_id', 'vendor_name',
-            'current_inventory_quantity', 'avg_daily_sales',
-            'stock_cover_days', 'predicted_stockout_date',
+            'current_inventory_quantity', 'avg_daily_sales', 'forecast_daily_demand',
+            'stock_cover_days', 'days_until_stockout', 'predicted_stockout_date',
             'average_lead_time_days', 'stockout_before_restock', 'action_required'
-        ]]
+        ] if c in df.columns]]
+        
+        return result
+    
+    @staticmethod
+    def _days_until_stockout(df: pd.DataFrame) -> pd.Series:
+        """
+        Số ngày đến khi hết hàng: theo dự báo nhu cầu nếu có, ngược lại theo stock_cover_days
+        
+        Series có dự báo nhưng không cạn kho trong horizon giữ stock_cover_days (phẳng) làm ước lượng.
+        """
+        if 'forecast_cover_days' not in df.columns:
+            return df['stock_cover_days']
+        return df['forecast_cover_days'].fillna(df['stock_cover_days'])
+    
+    @traceable(name="inventory_analytics.simulate_stockout_risk")
+    def simulate_stockout_risk(
+        self,
+        trials: int = STOCKOUT_SIMULATION_TRIALS,
+        seed: Optional[int] = STOCKOUT_SIMULATION_SEED,
+        sku_id: Optional[str] = None,
+        warehouse_id: Optional[str] = None,
+        min_probability: float = 0.0,
+    ) -> pd.DataFrame:
+        """
+        Xác suất hết hàng trước khi hàng về (Monte Carlo) cho mọi SKU-warehouse cùng lúc
+        
+        Khác stockout_risk (so sánh cố định cover days với average lead time): nhu cầu được
+        bootstrap từ lịch sử bán theo ngày và lead time lấy ngẫu nhiên giữa average và maximum.
+        
+        Args:
+            trials: Số lần mô phỏng mỗi series
+            seed: Seed cho RNG (cùng seed + cùng dữ liệu -> cùng kết quả)
+            sku_id: Filter by specific SKU (optional)
+            warehouse_id: Filter by specific warehouse (optional)
+            min_probability: Chỉ trả về các dòng có xác suất hết hàng >= ngưỡng
+            
+        Returns:
+            DataFrame sorted by stockout probability, then expected shortfall (highest first)
+        """
+        snapshot = self.get_snapshot()
+        df = snapshot.stock_cover
+        
+        if df.empty:
+            return pd.DataFrame()
+        
+        if sku_id:
+            df = df[df['sku_id'] == sku_id]
+        if warehouse_id:
+            df = df[df['warehouse_id'] == warehouse_id]
+        if df.empty:
+            return pd.DataFrame()
+        
+        daily = self.load_daily_sales_history()
+        if daily.empty:
+            return pd.DataFrame()
+        as_of_date = pd.Timestamp(pd.to_datetime(daily['order_date']).max()).normalize()
+        demand = build_demand_matrix(daily, df, as_of_date, FORECAST_HISTORY_DAYS)
+        
+        simulated = simulate_stockout(
+            df['current_inventory_quantity'].to_numpy(),
+            demand,
+            df['average_lead_time_days'].to_numpy(),
+            df['maximum_lead_time_days'].to_numpy() if 'maximum_lead_time_days' in df.columns
+            else df['average_lead_time_days'].to_numpy(),
+            trials=trials,
+            block_days=STOCKOUT_SIMULATION_BLOCK_DAYS,
+            seed=seed,
+        )
+        simulated.index = df.index
+        df = pd.concat([df, simulated], axis=1)
+        df = df[df['stockout_probability'] >= min_probability]
+        df = df.sort_values(
+            ['stockout_probability', 'expected_shortfall'], ascending=False, kind='stable'
+        )
+        
+        result = df[[c for c in [
+            'sku_id', 'sku_name', 'warehouse_id', 'current_inventory_quantity',
+            'avg_daily_sales', 'average_lead_time_days', 'maximum_lead_time_days',
+            'stockout_risk', 'stockout_probability', 'expected_shortfall',
+            'expected_shortfall_if_stockout', 'lead_time_demand_p95'
+        ] if c in df.columns]]
         
         return result
     
     @traceable(name="inventory_analytics.calculate_inventory_turnover")
-    def calculate_inventory_turnover(self, period_days: int = 90) -> pd.DataFrame:
+    def calculate_inventory_turnover(
+        self,
+        period_days: int = 90,
+        sku_id: Optional[str] = None,
+        warehouse_id: Optional[str] = None,
+        order: str = "turnover_desc",
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
         """
         Tính Inventory Turnover Ratio
         Turnover = Total Sales Quantity / Average Inventory
         
         Args:
             period_days: Analysis period (default: 90 days)
+            sku_id: Filter by specific SKU (optional)
+            warehouse_id: Filter by specific warehouse (optional)
+            order: One of TURNOVER_ORDERS (default: turnover_desc)
+            limit: Max rows to return (optional)
             
         Returns:
             DataFrame with turnover metrics
         """
-        sql = f"""
+        sql = """
         WITH date_range AS (
             SELECT MAX(order_date) AS latest_date
-            FROM sales
+            FROM {sales_source} s
         ),
         sales_period AS (
             SELECT 
                 s.sku_id,
                 s.warehouse_id,
-                SUM(s.order_quantity) AS total_sales_qty,
+                SUM(s.qty) AS total_sales_qty,
                 SUM(s.revenue) AS total_revenue
-            FROM sales s
+            FROM {sales_source} s
             CROSS JOIN date_range dr
-            WHERE s.order_date >= dr.latest_date - INTERVAL '{period_days} days'
+            WHERE s.order_date >= dr.latest_date - CAST(:period_days AS integer)
             GROUP BY s.sku_id, s.warehouse_id
         )
         SELECT 
@@ -379,7 +1050,7 @@ class AnalyticsAgent:
 
             CASE 
                 WHEN COALESCE(sp.total_sales_qty, 0) > 0 AND i.current_inventory_quantity > 0
-                THEN ROUND({period_days} / (COALESCE(sp.total_sales_qty, 0) / i.current_inventory_quantity), 2)
+                THEN ROUND(CAST(:period_days AS integer) / (COALESCE(sp.total_sales_qty, 0) / i.current_inventory_quantity), 2)
                 ELSE NULL
             END AS days_to_sell_inventory,
             i.total_value AS inventory_value
@@ -388,10 +1059,30 @@ class AnalyticsAgent:
             ON i.sku_id = sp.sku_id 
             AND i.warehouse_id = sp.warehouse_id
         LEFT JOIN skus sk ON i.sku_id = sk.sku_id
-        ORDER BY turnover_ratio DESC
+        WHERE 1=1
         """
+        params = {"period_days": period_days}
+        statement_name = "analytics_turnover"
+        if sku_id:
+            sql += " AND i.sku_id = :sku_id"
+            params["sku_id"] = sku_id
+            statement_name += "_sku"
+        if warehouse_id:
+            sql += " AND i.warehouse_id = :warehouse_id"
+            params["warehouse_id"] = warehouse_id
+            statement_name += "_wh"
+        
+        if order not in TURNOVER_ORDERS:
+            order = "turnover_desc"
+        column, ascending = TURNOVER_ORDERS[order]
+        sql += f" ORDER BY {column} {'ASC' if ascending else 'DESC'} NULLS LAST"
+        statement_name += f"_{order}"
+        if limit:
+            sql += " LIMIT :limit"
+            params["limit"] = int(limit)
+            statement_name += "_lim"
         
-        df, error = run_sql_unified(sql, self.db_type)
+        df, error = self._run_sales_window_sql(sql, params, statement_name)
         
         if error:
             print(f"❌ Error calculating turnover: {error}")
@@ -399,6 +1090,260 @@ class AnalyticsAgent:
         
         return df
     
+    @traceable(name="inventory_analytics.calculate_abc_xyz")
+    def calculate_abc_xyz(
+        self,
+        period_days: int = 365,
+        bucket_days: int = 30,
+        abc_classes: Optional[List[str]] = None,
+        xyz_classes: Optional[List[str]] = None,
+        sku_id: Optional[str] = None,
+        warehouse_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Phân loại ABC (đóng góp doanh thu) / XYZ (biến động nhu cầu) cho mọi SKU-warehouse
+        
+        Một query: doanh số được gộp theo bucket (mặc định 30 ngày) ngay trong database,
+        cumulative revenue share dùng window function SUM() OVER (ORDER BY revenue DESC),
+        CV = std / mean của nhu cầu theo bucket (kể cả bucket không bán).
+        
+        Args:
+            period_days: Số ngày lịch sử (tính từ ngày bán mới nhất), làm tròn xuống số bucket nguyên (tối thiểu 2)
+            bucket_days: Độ dài bucket để đo biến động nhu cầu
+            abc_classes: Chỉ giữ các lớp ABC này, ví dụ ['A'] (optional)
+            xyz_classes: Chỉ giữ các lớp XYZ này, ví dụ ['X', 'Y'] (optional)
+            sku_id: Filter by specific SKU (optional)
+            warehouse_id: Filter by specific warehouse (optional)
+            limit: Max rows to return (optional)
+            
+        Returns:
+            DataFrame sorted by revenue (highest first) with abc_class, xyz_class, abc_xyz_class
+        """
+        # Whole buckets only: a short trailing bucket would inflate the CV (365 / 30 -> 12 buckets, 360 days)
+        num_buckets = max(period_days // bucket_days, 2)
+        sql = """
+        WITH date_range AS (
+            SELECT MAX(order_date) AS latest_date
+            FROM {sales_source} s
+        ),
+        bucket_sales AS (
+            SELECT 
+                s.sku_id,
+                s.warehouse_id,
+                FLOOR((dr.latest_date - s.order_date) / CAST(:bucket_days AS NUMERIC)) AS bucket,
+                SUM(s.qty) AS qty,
+                SUM(s.revenue) AS revenue
+            FROM {sales_source} s
+            CROSS JOIN date_range dr
+            WHERE s.order_date > dr.latest_date - CAST(:window_days AS integer)
+            GROUP BY 1, 2, 3
+        ),
+        series_stats AS (
+            SELECT 
+                sku_id,
+                warehouse_id,
+                SUM(revenue) AS total_revenue,
+                SUM(qty) AS total_qty,
+                SUM(qty * qty) AS sum_sq_qty,
+                COUNT(*) AS active_buckets
+            FROM bucket_sales
+            GROUP BY sku_id, warehouse_id
+        ),
+        ranked AS (
+            SELECT 
+                i.sku_id,
+                i.warehouse_id,
+                COALESCE(ss.total_revenue, 0) AS total_revenue,
+                COALESCE(ss.total_qty, 0) AS total_qty,
+                COALESCE(ss.active_buckets, 0) AS active_buckets,
+                CASE 
+                    WHEN COALESCE(ss.total_qty, 0) > 0
+                    THEN SQRT(GREATEST(
+                        ss.sum_sq_qty / CAST(:num_buckets AS integer)
+                        - POWER(ss.total_qty / CAST(:num_buckets AS integer), 2), 0
+                    ) * CAST(:num_buckets AS integer) / (CAST(:num_buckets AS integer) - 1))
+                    / (ss.total_qty / CAST(:num_buckets AS integer))
+                    ELSE NULL
+                END AS demand_cv,
+                SUM(COALESCE(ss.total_revenue, 0)) OVER (
+                    ORDER BY COALESCE(ss.total_revenue, 0) DESC, i.sku_id, i.warehouse_id
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                ) AS cumulative_revenue,
+                SUM(COALESCE(ss.total_revenue, 0)) OVER () AS grand_revenue
+            FROM inventory i
+            LEFT JOIN series_stats ss 
+                ON i.sku_id = ss.sku_id 
+                AND i.warehouse_id = ss.warehouse_id
+        ),
+        classified AS (
+            SELECT 
+                r.sku_id,
+                sk.sku_name,
+                r.warehouse_id,
+                r.total_revenue,
+                r.total_qty,
+                r.active_buckets,
+                ROUND(CAST(100.0 * r.total_revenue / NULLIF(r.grand_revenue, 0) AS NUMERIC), 4) AS revenue_share_pct,
+                ROUND(CAST(100.0 * r.cumulative_revenue / NULLIF(r.grand_revenue, 0) AS NUMERIC), 2) AS cumulative_revenue_pct,
+                ROUND(CAST(r.demand_cv AS NUMERIC), 3) AS demand_cv,
+                CASE 
+                    WHEN r.total_revenue <= 0 THEN 'C'
+                    WHEN r.cumulative_revenue - r.total_revenue < :a_share * r.grand_revenue THEN 'A'
+                    WHEN r.cumulative_revenue - r.total_revenue < :b_share * r.grand_revenue THEN 'B'
+                    ELSE 'C'
+                END AS abc_class,
+                CASE 
+                    WHEN r.demand_cv IS NULL THEN 'Z'
+                    WHEN r.demand_cv <= :x_cv THEN 'X'
+                    WHEN r.demand_cv <= :y_cv THEN 'Y'
+                    ELSE 'Z'
+                END AS xyz_class
+            FROM ranked r
+            LEFT JOIN skus sk ON r.sku_id = sk.sku_id
+        )
+        SELECT c.*, c.abc_class || c.xyz_class AS abc_xyz_class
+        FROM classified c
+        WHERE 1=1
+        """
+        params: Dict[str, Any] = {
+            "window_days": num_buckets * bucket_days,
+            "bucket_days": bucket_days,
+            "num_buckets": num_buckets,
+            "a_share": self.ABC_A_SHARE,
+            "b_share": self.ABC_B_SHARE,
+            "x_cv": self.XYZ_X_CV,
+            "y_cv": self.XYZ_Y_CV,
+        }
+        statement_name = "analytics_abc_xyz"
+        for column, classes, allowed in (
+            ("abc_class", abc_classes, "ABC"),
+            ("xyz_class", xyz_classes, "XYZ"),
+        ):
+            classes = [c.upper() for c in (classes or []) if c and c.upper() in allowed]
+            if classes:
+                names = [f"{column}_{i}" for i in range(len(classes))]
+                sql += f" AND c.{column} IN (" + ", ".join(f":{n}" for n in names) + ")"
+                params.update(zip(names, classes))
+                statement_name += f"_{column[:3]}{len(classes)}"
+        if sku_id:
+            sql += " AND c.sku_id = :sku_id"
+            params["sku_id"] = sku_id
+            statement_name += "_sku"
+        if warehouse_id:
+            sql += " AND c.warehouse_id = :warehouse_id"
+            params["warehouse_id"] = warehouse_id
+            statement_name += "_wh"
+        
+        sql += " ORDER BY c.cumulative_revenue_pct ASC NULLS LAST"
+        if limit:
+            sql += " LIMIT :limit"
+            params["limit"] = int(limit)
+            statement_name += "_lim"
+        
+        df, error = self._run_sales_window_sql(sql, params, statement_name)
+        
+        if error:
+            print(f"❌ Error calculating ABC/XYZ classes: {error}")
+            return pd.DataFrame()
+        
+        return df
+    
+    @traceable(name="inventory_analytics.calculate_multi_window_metrics")
+    def calculate_multi_window_metrics(
+        self,
+        windows: Optional[List[int]] = None,
+        sku_id: Optional[str] = None,
+        warehouse_id: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Tính velocity, stock cover days và turnover cho nhiều cửa sổ thời gian trong một lần quét
+        Dùng conditional aggregation (SUM ... FILTER) trên cửa sổ dài nhất
+        
+        Args:
+            windows: Danh sách số ngày (default: [7, 30, 90])
+            sku_id: Filter by specific SKU (optional)
+            warehouse_id: Filter by specific warehouse (optional)
+            
+        Returns:
+            DataFrame với các cột sales_qty_{N}d, avg_daily_sales_{N}d,
+            stock_cover_days_{N}d, turnover_ratio_{N}d cho mỗi cửa sổ N
+        """
+        windows = sorted({int(w) for w in (windows or [7, 30, 90]) if int(w) > 0})
+        if not windows:
+            return pd.DataFrame()
+        
+        params: Dict[str, Any] = {"max_window": max(windows)}
+        filter_sums = []
+        metric_cols = []
+        for idx, w in enumerate(windows):
+            param = f"window_{idx}"
+            params[param] = w
+            filter_sums.append(
+                f"SUM(s.qty) FILTER (WHERE s.order_date >= dr.latest_date - CAST(:{param} AS integer)) AS sales_qty_{w}d"
+            )
+            metric_cols.append(f"""
+            COALESCE(ws.sales_qty_{w}d, 0) AS sales_qty_{w}d,
+            ROUND(CAST(COALESCE(ws.sales_qty_{w}d, 0) AS NUMERIC) / CAST(:{param} AS integer), 4) AS avg_daily_sales_{w}d,
+            CASE 
+                WHEN COALESCE(ws.sales_qty_{w}d, 0) > 0 
+                THEN ROUND(i.current_inventory_quantity / (CAST(ws.sales_qty_{w}d AS NUMERIC) / CAST(:{param} AS integer)), 2)
+                ELSE NULL 
+            END AS stock_cover_days_{w}d,
+            CASE 
+                WHEN i.current_inventory_quantity > 0 
+                THEN ROUND(COALESCE(ws.sales_qty_{w}d, 0) / i.current_inventory_quantity, 2)
+                ELSE 0 
+            END AS turnover_ratio_{w}d""")
+        
+        sql = """
+        WITH date_range AS (
+            SELECT MAX(order_date) AS latest_date
+            FROM {sales_source} s
+        ),
+        window_sales AS (
+            SELECT 
+                s.sku_id,
+                s.warehouse_id,
+                """ + ",\n                ".join(filter_sums) + """
+            FROM {sales_source} s
+            CROSS JOIN date_range dr
+            WHERE s.order_date >= dr.latest_date - CAST(:max_window AS integer)
+            GROUP BY s.sku_id, s.warehouse_id
+        )
+        SELECT 
+            i.sku_id,
+            sk.sku_name,
+            i.warehouse_id,
+            i.current_inventory_quantity,
+            i.average_lead_time_days,""" + ",".join(metric_cols) + """
+        FROM inventory i
+        LEFT JOIN window_sales ws 
+            ON i.sku_id = ws.sku_id 
+            AND i.warehouse_id = ws.warehouse_id
+        LEFT JOIN skus sk ON i.sku_id = sk.sku_id
+        WHERE 1=1
+        """
+        
+        statement_name = "analytics_multi_window_" + "_".join(str(w) for w in windows)
+        if sku_id:
+            sql += " AND i.sku_id = :sku_id"
+            params["sku_id"] = sku_id
+            statement_name += "_sku"
+        if warehouse_id:
+            sql += " AND i.warehouse_id = :warehouse_id"
+            params["warehouse_id"] = warehouse_id
+            statement_name += "_wh"
+        sql += " ORDER BY i.sku_id, i.warehouse_id"
+        
+        df, error = self._run_sales_window_sql(sql, params, statement_name)
+        
+        if error:
+            print(f"❌ Error calculating multi-window metrics: {error}")
+            return pd.DataFrame()
+        
+        return df
+    
     @traceable(name="inventory_analytics.generate_analytics_report")
     def generate_analytics_report(self, user_question: str, df: pd.DataFrame) -> str:
         """
@@ -453,6 +1398,54 @@ Executive Summary:
             print(f"⚠️ LLM summary failed: {e}")
             return f"Data retrieved successfully with {len(df)} records. See table below for details."
     
+    @traceable(name="inventory_analytics.calculate_warehouse_rollups")
+    def calculate_warehouse_rollups(self, period_days: int = 30) -> pd.DataFrame:
+        """
+        Rollup stock cover theo warehouse, province và toàn hệ thống trong một query (GROUPING SETS)
+        
+        Args:
+            period_days: Number of days to calculate average sales (default: 30)
+            
+        Returns:
+            DataFrame với cột level ('warehouse' / 'province' / 'global'), province, warehouse_id, city,
+            thống kê stock cover và số item theo status
+        """
+        base_sql, params = self._stock_cover_base_sql(period_days)
+        sql = """
+        SELECT 
+            CASE 
+                WHEN GROUPING(sc.warehouse_id) = 0 THEN 'warehouse'
+                WHEN GROUPING(w.province) = 0 THEN 'province'
+                ELSE 'global'
+            END AS level,
+            w.province,
+            sc.warehouse_id,
+            w.city,
+            COUNT(*) AS total_skus,
+            ROUND(CAST(AVG(sc.stock_cover_days) AS NUMERIC), 2) AS avg_stock_cover_days,
+            ROUND(CAST(PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY sc.stock_cover_days) AS NUMERIC), 2) AS median_stock_cover_days,
+            MIN(sc.stock_cover_days) AS min_stock_cover_days,
+            MAX(sc.stock_cover_days) AS max_stock_cover_days,
+            ROUND(CAST(SUM(sc.total_value) AS NUMERIC), 2) AS total_inventory_value,
+            SUM(sc.current_inventory_quantity) AS total_inventory_quantity,
+            COUNT(*) FILTER (WHERE sc.stock_status = 'Critical') AS critical_items,
+            COUNT(*) FILTER (WHERE sc.stock_status = 'Warning') AS warning_items,
+            COUNT(*) FILTER (WHERE sc.stock_status = 'Overstock') AS overstock_items,
+            COUNT(*) FILTER (WHERE sc.stock_status = 'No Sales') AS no_sales_items
+        FROM (""" + base_sql + """) sc
+        LEFT JOIN warehouses w ON sc.warehouse_id = w.warehouse_code
+        GROUP BY GROUPING SETS ((w.province, sc.warehouse_id, w.city), (w.province), ())
+        ORDER BY GROUPING(w.province), w.province, GROUPING(sc.warehouse_id), avg_stock_cover_days NULLS LAST
+        """
+        
+        df, error = self._run_sales_window_sql(sql, params, "analytics_warehouse_rollups")
+        
+        if error:
+            print(f"❌ Error calculating warehouse rollups: {error}")
+            return pd.DataFrame()
+        
+        return df
+    
     @traceable(name="inventory_analytics.analyze_by_warehouse")
     def analyze_by_warehouse(self) -> pd.DataFrame:
         """
@@ -461,41 +1454,37 @@ Executive Summary:
         Returns:
             DataFrame with warehouse-level analysis
         """
-        df = self.calculate_stock_cover_days()
+        rollups = self.get_warehouse_rollups()
         
-        if df.empty:
+        if rollups.empty:
             return pd.DataFrame()
         
-        # Group by warehouse
-        warehouse_stats = df.groupby('warehouse_id').agg({
-            'sku_id': 'count',
-            'stock_cover_days': ['mean', 'median', 'min', 'max'],
-            'total_value': 'sum',
-            'current_inventory_quantity': 'sum'
-        }).round(2)
-        
-        warehouse_stats.columns = [
-            'total_skus', 
-            'avg_stock_cover_days', 
-            'median_stock_cover_days',
-            'min_stock_cover_days',
-            'max_stock_cover_days',
-            'total_inventory_value',
-            'total_inventory_quantity'
-        ]
-        
-        # Count critical items per warehouse
-        critical_counts = df[df['stock_status'] == 'Critical'].groupby('warehouse_id').size()
-        warehouse_stats['critical_items'] = critical_counts
-        warehouse_stats['critical_items'] = warehouse_stats['critical_items'].fillna(0).astype(int)
-        
-        # Count overstock items per warehouse
-        overstock_counts = df[df['stock_status'] == 'Overstock'].groupby('warehouse_id').size()
-        warehouse_stats['overstock_items'] = overstock_counts
-        warehouse_stats['overstock_items'] = warehouse_stats['overstock_items'].fillna(0).astype(int)
-        
-        warehouse_stats = warehouse_stats.reset_index()
-        warehouse_stats = warehouse_stats.sort_values('avg_stock_cover_days')
+        warehouse_stats = rollups[rollups['level'] == 'warehouse'].drop(columns=['level'])
+        warehouse_stats = warehouse_stats.sort_values('avg_stock_cover_days').reset_index(drop=True)
         
         return warehouse_stats
+    
+    def get_warehouse_rollups(self) -> pd.DataFrame:
+        """
+        Warehouse / province / global rollups
+        
+        Served from the shared snapshot when one is fresh; otherwise the single rollup query
+        runs on its own (cached for the snapshot TTL) instead of building the full snapshot.
+        """
+        snapshot = self.peek_snapshot()
+        if snapshot is not None:
+            return snapshot.view("warehouse_rollups", self._cached_warehouse_rollups)
+        return self._cached_warehouse_rollups()
+    
+    def _cached_warehouse_rollups(self, period_days: int = 30) -> pd.DataFrame:
+        """Rollup query result kept for snapshot_ttl_seconds (failed/empty reads are not cached)"""
+        with self._snapshot_lock:
+            cached = self._warehouse_rollups
+            if cached is not None and time.time() - cached[0] < self.snapshot_ttl_seconds:
+                return cached[1]
+        rollups = self.calculate_warehouse_rollups(period_days=period_days)
+        if not rollups.empty:
+            with self._snapshot_lock:
+                self._warehouse_rollups = (time.time(), rollups)
+        return rollups
 
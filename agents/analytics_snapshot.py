@@ -0,0 +1,124 @@
+"""
+Analytics Snapshot - Kết quả stock cover / turnover dùng chung giữa các phân tích
+Một lần đọc database, nhiều view (health summary, restock, overstock, stockout, warehouse)
+"""
+
+from typing import Callable, Dict, Any, Optional
+import hashlib
+import time
+import pandas as pd
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame, used as the snapshot data-version stamp"""
+    if df is None or df.empty:
+        return "empty"
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()[:12]
+
+
+class AnalyticsSnapshot:
+    """
+    Snapshot of the stock cover frame (and lazily, turnover frames) with a
+    data-version stamp and TTL.
+
+    Frames held by the snapshot are shared by every caller and must be treated
+    as read-only; filter or copy before adding columns.
+    """
+
+    def __init__(
+        self,
+        stock_cover: pd.DataFrame,
+        period_days: int,
+        ttl_seconds: int,
+        build_ms: float,
+        turnover_loader: Optional[Callable[[int], pd.DataFrame]] = None,
+        as_of_date: Optional[pd.Timestamp] = None,
+        forecast_ms: Optional[float] = None,
+        built_at: Optional[float] = None,
+        source: str = "database",
+        turnover: Optional[Dict[int, pd.DataFrame]] = None,
+        views: Optional[Dict[str, Any]] = None,
+        data_version: Optional[str] = None,
+    ):
+        self.stock_cover = stock_cover
+        self.period_days = period_days
+        self.ttl_seconds = ttl_seconds
+        self.build_ms = build_ms
+        # Latest sales date in the data; forecasts and stockout dates are anchored to it
+        self.as_of_date = as_of_date
+        self.forecast_ms = forecast_ms
+        # Persisted snapshots keep the build time recorded in their manifest
+        self.built_at = time.time() if built_at is None else built_at
+        self.source = source
+        self.data_version = data_version or frame_fingerprint(stock_cover)
+        self._turnover_loader = turnover_loader
+        self._turnover: Dict[int, pd.DataFrame] = dict(turnover or {})
+        self._turnover_build_ms: Dict[int, float] = {}
+        # Derived views (health summary, warehouse rollup), computed once per snapshot
+        self._views: Dict[str, Any] = dict(views or {})
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.built_at
+
+    def is_fresh(self) -> bool:
+        return self.age_seconds < self.ttl_seconds
+
+    def turnover(self, period_days: int = 90) -> pd.DataFrame:
+        """Turnover frame for a period, loaded on first access and cached for the snapshot lifetime"""
+        if period_days not in self._turnover:
+            if self._turnover_loader is None:
+                return pd.DataFrame()
+            t0 = time.perf_counter()
+            df = self._turnover_loader(period_days)
+            self._turnover_build_ms[period_days] = (time.perf_counter() - t0) * 1000
+            if df.empty:
+                return df
+            self._turnover[period_days] = df
+        return self._turnover[period_days]
+
+    def view(self, name: str, builder: Callable[[], Any]) -> Any:
+        """Derived view computed on first access and cached for the snapshot lifetime"""
+        if name not in self._views:
+            self._views[name] = builder()
+        return self._views[name]
+
+    def cached_view(self, name: str) -> Any:
+        return self._views.get(name)
+
+    def staleness_text(self) -> str:
+        """Human readable freshness, e.g. 'snapshot 12 min old, data as of 2023-07-30'"""
+        age = self.age_seconds
+        if age < 60:
+            age_text = f"{age:.0f}s"
+        elif age < 3600:
+            age_text = f"{age / 60:.0f} min"
+        else:
+            age_text = f"{age / 3600:.1f} h"
+        text = f"snapshot {age_text} old"
+        if self.as_of_date is not None:
+            text += f", data as of {self.as_of_date.date()}"
+        return text
+
+    def cached_turnover(self, period_days: int = 90) -> Optional[pd.DataFrame]:
+        """Turnover frame if it was already loaded for this snapshot, without triggering a query"""
+        return self._turnover.get(period_days)
+
+    def info(self) -> Dict[str, Any]:
+        """Snapshot metadata for debug output"""
+        return {
+            "data_version": self.data_version,
+            "source": self.source,
+            "period_days": self.period_days,
+            "rows": len(self.stock_cover),
+            "build_ms": round(self.build_ms, 2),
+            "as_of_date": None if self.as_of_date is None else str(self.as_of_date.date()),
+            "forecast_ms": None if self.forecast_ms is None else round(self.forecast_ms, 2),
+            "age_s": round(self.age_seconds, 2),
+            "ttl_s": self.ttl_seconds,
+            "turnover_periods": sorted(self._turnover),
+            "turnover_build_ms": {k: round(v, 2) for k, v in self._turnover_build_ms.items()},
+            "views": sorted(self._views),
+            "staleness": self.staleness_text(),
+        }
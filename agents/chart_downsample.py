@@ -0,0 +1,80 @@
+"""
+Chart Downsample - Giảm số điểm của time series trước khi gửi sang Plotly
+Largest-Triangle-Three-Buckets (LTTB) vectorized bằng NumPy, không vòng lặp Python theo bucket
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _as_float_axis(x: pd.Series) -> np.ndarray:
+    """Trục x dạng số: datetime -> epoch ns, số giữ nguyên, còn lại (category/text) -> vị trí"""
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return x.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+    if pd.api.types.is_numeric_dtype(x):
+        return x.to_numpy(dtype=np.float64)
+    return np.arange(len(x), dtype=np.float64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Chỉ số các điểm giữ lại theo LTTB (x đã sắp xếp tăng dần)
+
+    Điểm đầu và cuối luôn được giữ; n-2 điểm giữa chia thành threshold-2 bucket, mỗi bucket giữ
+    điểm tạo tam giác lớn nhất với bucket trước và trung bình bucket sau. Để tính mọi bucket
+    trong một lượt vectorized, đỉnh bên trái là trung bình bucket trước (thay vì điểm đã chọn).
+
+    Args:
+        x, y: Tọa độ (float), cùng độ dài n
+        threshold: Số điểm tối đa sau khi giảm
+
+    Returns:
+        Mảng chỉ số tăng dần (độ dài threshold, hoặc n nếu không cần giảm)
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    num_buckets = threshold - 2
+    edges = np.linspace(1, n - 1, num_buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    counts = np.diff(edges)
+
+    y_filled = np.nan_to_num(y, nan=0.0)
+    mean_x = np.add.reduceat(x[:n - 1], starts) / counts
+    mean_y = np.add.reduceat(y_filled[:n - 1], starts) / counts
+    # Đỉnh trái (bucket trước / điểm đầu) và đỉnh phải (bucket sau / điểm cuối) của mỗi bucket
+    left_x = np.concatenate(([x[0]], mean_x[:-1]))
+    left_y = np.concatenate(([y_filled[0]], mean_y[:-1]))
+    right_x = np.concatenate((mean_x[1:], [x[-1]]))
+    right_y = np.concatenate((mean_y[1:], [y_filled[-1]]))
+
+    bucket = np.repeat(np.arange(num_buckets), counts)
+    px, py = x[1:n - 1], y_filled[1:n - 1]
+    area = np.abs(
+        (left_x[bucket] - right_x[bucket]) * (py - left_y[bucket])
+        - (left_x[bucket] - px) * (right_y[bucket] - left_y[bucket])
+    )
+    # Điểm đầu tiên đạt diện tích lớn nhất trong mỗi bucket
+    bucket_max = np.maximum.reduceat(area, starts - 1)
+    candidates = np.flatnonzero(area == bucket_max[bucket])
+    _, first = np.unique(bucket[candidates], return_index=True)
+    chosen = candidates[first] + 1
+    return np.concatenate(([0], chosen, [n - 1]))
+
+
+def downsample_series(df: pd.DataFrame, x: str, y_cols: list, threshold: int) -> pd.DataFrame:
+    """
+    Giảm một series (một trace nhóm) xuống tối đa threshold điểm, sắp xếp theo x
+
+    Nhiều cột y dùng chung tập điểm: chọn theo LTTB trên từng cột rồi hợp lại, nên mỗi cột
+    giữ đúng đỉnh/đáy của mình; tổng số điểm <= threshold * len(y_cols).
+    """
+    if len(df) <= threshold:
+        return df
+    df = df.sort_values(x, kind="stable")
+    x_values = _as_float_axis(df[x])
+    keep = np.unique(np.concatenate([
+        lttb_indices(x_values, df[col].to_numpy(dtype=np.float64), threshold) for col in y_cols
+    ]))
+    return df.iloc[keep]
@@ -0,0 +1,219 @@
+"""
+Demand Forecast - Dự báo nhu cầu theo ngày cho mọi (sku, warehouse) cùng lúc
+Exponential smoothing có mùa vụ theo tuần, chạy trên ma trận dày ngày × series bằng NumPy
+"""
+
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+SERIES_KEYS = ["sku_id", "warehouse_id"]
+# Average inter-demand interval (days) at or above which a series is intermittent (Syntetos-Boylan)
+INTERMITTENT_ADI = 1.32
+# A series whose current gap without sales exceeds this many typical intervals starts decaying toward 0
+STALE_GAP_FACTOR = 2.0
+
+
+def build_demand_matrix(
+    daily_sales: pd.DataFrame,
+    series: pd.DataFrame,
+    end_date: pd.Timestamp,
+    history_days: int,
+) -> np.ndarray:
+    """
+    Ma trận nhu cầu (history_days × số series), ngày không bán = 0
+
+    Args:
+        daily_sales: Cột sku_id, warehouse_id, order_date, qty (có thể nhiều dòng/ngày)
+        series: Các cặp (sku_id, warehouse_id) theo thứ tự cột của ma trận
+        end_date: Ngày cuối cùng của lịch sử (dòng cuối ma trận)
+        history_days: Số ngày lịch sử
+    """
+    matrix = np.zeros((history_days, len(series)), dtype=np.float64)
+    if daily_sales.empty or series.empty:
+        return matrix
+
+    series_index = pd.MultiIndex.from_frame(series[SERIES_KEYS])
+    cols = series_index.get_indexer(pd.MultiIndex.from_frame(daily_sales[SERIES_KEYS]))
+    age_days = (end_date - pd.to_datetime(daily_sales["order_date"])).dt.days.to_numpy()
+    rows = history_days - 1 - age_days
+    valid = (cols >= 0) & (rows >= 0) & (rows < history_days)
+    np.add.at(matrix, (rows[valid], cols[valid]), daily_sales["qty"].to_numpy(dtype=np.float64)[valid])
+    return matrix
+
+
+def fit_seasonal_smoothing(
+    demand: np.ndarray, alpha: float = 0.3, gamma: float = 0.1, season_length: int = 7
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Additive exponential smoothing (level + seasonal, no trend) cho mọi series cùng lúc
+
+    Mỗi bước thời gian là một phép toán vector trên toàn bộ series, nên chi phí là
+    O(T) vòng lặp Python bất kể số series.
+
+    Args:
+        demand: Ma trận (T × N)
+        alpha: Hệ số làm mượt level
+        gamma: Hệ số làm mượt seasonal
+        season_length: Chu kỳ mùa vụ (7 = theo tuần)
+
+    Returns:
+        (level (N,), seasonal (season_length × N)) với seasonal[k] ứng với ngày t có t % season_length == k
+    """
+    num_days, num_series = demand.shape
+    if num_days < 2 * season_length:
+        # Không đủ lịch sử để ước lượng mùa vụ: chỉ làm mượt level
+        level = demand[:1].mean(axis=0) if num_days else np.zeros(num_series)
+        for t in range(1, num_days):
+            level = alpha * demand[t] + (1 - alpha) * level
+        return level, np.zeros((season_length, num_series))
+
+    level = demand[:season_length].mean(axis=0)
+    seasonal = demand[:season_length] - level
+    for t in range(season_length, num_days):
+        k = t % season_length
+        new_level = alpha * (demand[t] - seasonal[k]) + (1 - alpha) * level
+        seasonal[k] = gamma * (demand[t] - new_level) + (1 - gamma) * seasonal[k]
+        level = new_level
+    return level, seasonal
+
+
+def forecast_seasonal(level: np.ndarray, seasonal: np.ndarray, start: int, horizon_days: int) -> np.ndarray:
+    """
+    Dự báo (horizon_days × N) từ ngày thứ `start` của chuỗi, không âm
+
+    level + seasonal bị cắt tại 0 rồi co giãn để trung bình một chu kỳ đúng bằng level:
+    cắt phần âm không được cộng thêm nhu cầu, level ~ 0 thì dự báo ~ 0.
+    """
+    profile = np.maximum(level[np.newaxis, :] + seasonal, 0.0)
+    profile_mean = profile.mean(axis=0)
+    target = np.maximum(level, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(profile_mean > 0, target / profile_mean, 0.0)
+    season_idx = (start + np.arange(horizon_days)) % seasonal.shape[0]
+    return profile[season_idx] * scale[np.newaxis, :]
+
+
+def fit_intermittent_rate(demand: np.ndarray, alpha: float = 0.1) -> np.ndarray:
+    """
+    Nhu cầu/ngày của series thưa (intermittent) theo Croston-SBA, cho mọi series cùng lúc
+
+    Làm mượt riêng cỡ đơn (chỉ tại ngày có bán) và khoảng cách giữa hai ngày có bán;
+    rate = (1 - alpha/2) × size / interval (hiệu chỉnh bias của Croston). Khi số ngày kể từ lần bán
+    cuối vượt STALE_GAP_FACTOR × interval, interval được nâng theo khoảng trống đó, nên series
+    lâu không bán giảm dần về 0 thay vì giữ nguyên.
+
+    Args:
+        demand: Ma trận (T × N)
+        alpha: Hệ số làm mượt size / interval
+
+    Returns:
+        rate (N,), 0 cho series không có ngày bán nào
+    """
+    num_days, num_series = demand.shape
+    sold = demand > 0
+    sale_days = sold.sum(axis=0)
+    if num_days == 0:
+        return np.zeros(num_series)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        size = np.where(sale_days > 0, np.where(sold, demand, 0.0).sum(axis=0) / sale_days, 0.0)
+        interval = np.where(sale_days > 0, num_days / sale_days, np.inf)
+    since_sale = np.ones(num_series)
+    seen_sale = np.zeros(num_series, dtype=bool)
+    for t in range(num_days):
+        on_sale = sold[t]
+        size = np.where(on_sale, alpha * demand[t] + (1 - alpha) * size, size)
+        # The gap before the first sale in the window is cut off by the window start, not a full interval
+        interval = np.where(on_sale & seen_sale, alpha * since_sale + (1 - alpha) * interval, interval)
+        since_sale = np.where(on_sale, 1.0, since_sale + 1.0)
+        seen_sale |= on_sale
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = (1 - alpha / 2) * size / np.maximum(interval, since_sale / STALE_GAP_FACTOR)
+    return np.where(sale_days > 0, rate, 0.0)
+
+
+def compute_depletion_days(on_hand: np.ndarray, forecast: np.ndarray) -> np.ndarray:
+    """
+    Số ngày (có phần lẻ) cho đến khi nhu cầu cộng dồn vượt tồn kho
+
+    NaN khi tồn kho không cạn trong horizon dự báo.
+    """
+    horizon_days, num_series = forecast.shape
+    on_hand = np.asarray(on_hand, dtype=np.float64)
+    cumulative = np.cumsum(forecast, axis=0)
+    reached = cumulative >= on_hand[np.newaxis, :]
+    depletes = reached.any(axis=0)
+
+    first_day = reached.argmax(axis=0)
+    series_idx = np.arange(num_series)
+    before = np.where(first_day > 0, cumulative[np.maximum(first_day - 1, 0), series_idx], 0.0)
+    demand_on_day = forecast[first_day, series_idx]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(demand_on_day > 0, (on_hand - before) / demand_on_day, 0.0)
+
+    days = first_day + np.clip(fraction, 0.0, 1.0)
+    days = np.where(on_hand <= 0, 0.0, days)
+    return np.where(depletes | (on_hand <= 0), days, np.nan)
+
+
+def forecast_stock_cover(
+    stock_cover: pd.DataFrame,
+    daily_sales: pd.DataFrame,
+    history_days: int = 120,
+    horizon_days: int = 90,
+    alpha: float = 0.3,
+    gamma: float = 0.1,
+    as_of: Optional[pd.Timestamp] = None,
+    demand: Optional[np.ndarray] = None,
+    intermittent_alpha: float = 0.1,
+) -> pd.DataFrame:
+    """
+    Dự báo nhu cầu và ngày cạn kho cho từng dòng của stock cover frame
+
+    Series bán đều dùng exponential smoothing có mùa vụ tuần; series thưa (khoảng cách trung bình
+    giữa hai ngày có bán >= INTERMITTENT_ADI) dùng rate Croston-SBA, không có mùa vụ.
+
+    Args:
+        stock_cover: Frame có sku_id, warehouse_id, current_inventory_quantity
+        daily_sales: Lịch sử bán theo ngày (sku_id, warehouse_id, order_date, qty)
+        history_days: Số ngày lịch sử dùng để fit
+        horizon_days: Số ngày dự báo
+        alpha, gamma: Hệ số làm mượt level / seasonal
+        as_of: Ngày dữ liệu mới nhất (mặc định: max order_date của daily_sales)
+        demand: Ma trận nhu cầu đã dựng sẵn bằng build_demand_matrix (optional)
+        intermittent_alpha: Hệ số làm mượt size / interval cho series thưa
+
+    Returns:
+        DataFrame cùng index với stock_cover: forecast_daily_demand, forecast_cover_days,
+        predicted_stockout_date (tính từ as_of, không phải ngày hiện tại)
+    """
+    result = pd.DataFrame(index=stock_cover.index)
+    if as_of is None:
+        if daily_sales.empty:
+            return result
+        as_of = pd.to_datetime(daily_sales["order_date"]).max()
+    as_of = pd.Timestamp(as_of).normalize()
+
+    if demand is None:
+        demand = build_demand_matrix(daily_sales, stock_cover, as_of, history_days)
+    level, seasonal = fit_seasonal_smoothing(demand, alpha=alpha, gamma=gamma)
+    forecast = forecast_seasonal(level, seasonal, start=history_days, horizon_days=horizon_days)
+    sale_days = (demand > 0).sum(axis=0)
+    intermittent = sale_days * INTERMITTENT_ADI <= demand.shape[0]
+    if intermittent.any():
+        rate = fit_intermittent_rate(demand[:, intermittent], alpha=intermittent_alpha)
+        forecast[:, intermittent] = rate[np.newaxis, :]
+
+    cover_days = compute_depletion_days(
+        stock_cover["current_inventory_quantity"].to_numpy(dtype=np.float64), forecast
+    )
+    stockout_at = as_of + pd.to_timedelta(cover_days, unit="D")
+    result["forecast_daily_demand"] = forecast.mean(axis=0).round(4)
+    result["forecast_cover_days"] = np.round(cover_days, 2)
+    result["predicted_stockout_date"] = np.where(
+        np.isnan(cover_days), None, stockout_at.strftime("%Y-%m-%d").to_numpy(dtype=object)
+    )
+    return result
@@ -0,0 +1,76 @@
+"""
+Figure Cache - Plotly figure đã dựng (JSON) theo (fingerprint kết quả, hash spec)
+LRU giới hạn theo tổng số byte, thread-safe, dùng chung cho mọi session trong process
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import threading
+import pandas as pd
+
+from agents.analytics_snapshot import frame_fingerprint
+
+
+# Planner metadata does not change the rendered figure
+SPEC_METADATA_KEYS = {"planner", "confidence"}
+
+
+def figure_cache_key(df: pd.DataFrame, spec: Dict[str, Any]) -> Tuple[str, str]:
+    """(fingerprint kết quả, hash spec); tên/kiểu cột thuộc phần spec vì spec tham chiếu tới chúng"""
+    render_spec = {k: v for k, v in spec.items() if k not in SPEC_METADATA_KEYS}
+    payload = json.dumps(
+        {"spec": render_spec, "columns": [f"{c}:{t}" for c, t in df.dtypes.items()]},
+        sort_keys=True, default=str,
+    )
+    return frame_fingerprint(df), hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+class FigureCache:
+    """
+    LRU của figure JSON; khi tổng kích thước vượt max_bytes thì bỏ các figure ít dùng nhất
+
+    Figure lớn hơn max_bytes không được cache.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, int]]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple[str, str], fig_json: str) -> None:
+        size = len(fig_json.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size_bytes -= previous[1]
+            self._entries[key] = (fig_json, size)
+            self._size_bytes += size
+            while self._size_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size_bytes -= evicted_size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -7,8 +7,9 @@ from agents.intent_agent import IntentClassificationAgent
 from agents.sql_agent import generate_sql
 from agents.viz_agent import VisualizationAgent
 from agents.response_agent import ResponseAgent
-from agents.analytics_agent import AnalyticsAgent
-from db.connection import get_db, run_sql_unified, get_postgres_url
+from agents.analytics_agent import AnalyticsAgent, filter_stock_cover_frame
+from db.connection import get_db, run_sql_unified, iter_sql_unified, get_postgres_url
+from configs.settings import VIZ_SQL_PROBE_ROWS
 from langsmith.run_helpers import traceable
 import pandas as pd
 import time
@@ -210,14 +211,17 @@ class OrchestratorAgent:
                     "debug": {**(debug_base or {}), "sql_generate": gen_debug},
                 }
             
-            # Execute SQL
             t_exec0 = time.perf_counter()
-            df, error = run_sql_unified(sql, db_type)
+            df, error, spec, aggregate_sql = self._fetch_viz_data(user_question, sql, db_type)
             t_exec1 = time.perf_counter()
             (debug_base or {}).get("steps", []).append({
                 "step": "sql_execute",
                 "duration_ms": (t_exec1 - t_exec0) * 1000,
-                "detail": {"rows": 0 if error else len(df), "error": error}
+                "detail": {
+                    "rows": 0 if error else len(df),
+                    "error": error,
+                    "aggregation_pushdown": aggregate_sql is not None,
+                }
             })
             if error:
                 return {
@@ -239,12 +243,16 @@ class OrchestratorAgent:
             
             # Plan + Render chart via agent (không tạo summary cho visualize)
             t_viz0 = time.perf_counter()
-            viz = self.viz_agent.plan_and_render(user_question, df)
+            if spec is None:
+                viz = self.viz_agent.plan_and_render(user_question, df)
+            else:
+                fig, cache_hit = self.viz_agent.render_cached(df, spec)
+                viz = {"spec": spec, "figure": fig, "figure_cache_hit": cache_hit}
             t_viz1 = time.perf_counter()
             (debug_base or {}).get("steps", []).append({
                 "step": "viz_plan_render",
                 "duration_ms": (t_viz1 - t_viz0) * 1000,
-                "detail": viz.get("spec")
+                "detail": {**(viz.get("spec") or {}), "figure_cache_hit": viz.get("figure_cache_hit", False)}
             })
             chart_result = viz.get("figure")
             
@@ -276,6 +284,45 @@ class OrchestratorAgent:
     
     
     
+    def _fetch_viz_data(self, user_question: str, sql: str, db_type: str) -> tuple:
+        """
+        Chạy SQL của chart một lần, đọc theo khối
+
+        Kết quả nhỏ (<= VIZ_SQL_PROBE_ROWS dòng) được đọc hết. Kết quả lớn hơn: chart được lập
+        từ các dòng đầu; nếu spec cần GROUP BY thì database gộp (aggregate SQL) và phần còn lại
+        bị bỏ, nếu không thì đọc tiếp phần còn lại của cùng kết quả (không chạy lại SQL).
+
+        Returns:
+            (df, error, spec, aggregate_sql) - spec / aggregate_sql là None khi không dùng
+        """
+        spec = None
+        aggregate_sql = None
+        batches = iter_sql_unified(sql, db_type, VIZ_SQL_PROBE_ROWS + 1)
+        try:
+            frames = []
+            rows = 0
+            for frame in batches:
+                frames.append(frame)
+                rows += len(frame)
+                if rows > VIZ_SQL_PROBE_ROWS:
+                    break
+            df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            if rows > VIZ_SQL_PROBE_ROWS:
+                spec = self.viz_agent.plan_chart(user_question, df)
+                aggregate_sql = self.viz_agent.build_aggregate_sql(sql, spec, df.head(5))
+                if aggregate_sql is not None:
+                    aggregated, error = run_sql_unified(aggregate_sql, db_type)
+                    if not error:
+                        return aggregated, None, spec, aggregate_sql
+                    # Not wrappable as a subquery: keep reading the original result
+                    aggregate_sql = None
+                df = pd.concat([df, *batches], ignore_index=True)
+            return df, None, spec, aggregate_sql
+        except Exception as e:
+            return pd.DataFrame(), str(e), spec, aggregate_sql
+        finally:
+            batches.close()
+
     def _handle_schema_intent(self, user_question: str, db_type: str) -> dict:
         """Handle schema intent - Database structure information"""
         try:
@@ -319,6 +366,96 @@ class OrchestratorAgent:
         # Default: top 20
         return 20
     
+    def _extract_windows(self, question: str) -> list:
+        """
+        Extract analysis windows (days) from question, e.g. "compare 7, 30 and 90-day velocity",
+        "last 3 months", "this quarter", "weekly vs monthly". Threshold phrases like
+        "less than 30 days" are not windows, and a bare "weekly report" / "monthly vendor list"
+        is not a time window either.
+        """
+        q = question.lower()
+        # Bỏ các cụm ngưỡng (threshold) để không nhầm thành cửa sổ thời gian
+        q = re.sub(r'\b(?:less than|under|below|dưới|nhỏ hơn|greater than|above|over|trên|lớn hơn)\s+\d+\s*(?:day|ngày|week|tuần|month|tháng)s?', ' ', q)
+        
+        windows = set()
+        for match in re.finditer(r'(\d+(?:\s*(?:,|and|or|vs\.?|/|&|và)\s*\d+)*)\s*-?\s*(?:day|ngày|d\b)', q):
+            windows.update(int(n) for n in re.findall(r'\d+', match.group(1)))
+        
+        unit_days = {
+            'week': 7, 'tuần': 7,
+            'month': 30, 'tháng': 30,
+            'quarter': 90, 'quý': 90,
+        }
+        # "last quarter", "past 6 months", "this month", "3 months", "2-week"
+        time_phrases = [
+            r'\b(?:last|past|previous|prior|this|current|next)\s+(?:(\d+)\s+)?(week|month|quarter)s?\b',
+            r'\b(\d+)\s*-?\s*(week|month|quarter)s?\b',
+            # "tuần qua", "3 tháng gần nhất", "quý này", "tháng trước"
+            r'(?:(\d+)\s+)?(tuần|tháng|quý)\s+(?:qua|trước|này|gần nhất|gần đây|vừa qua)',
+        ]
+        for pattern in time_phrases:
+            for match in re.finditer(pattern, q):
+                windows.add(int(match.group(1) or 1) * unit_days[match.group(2)])
+        # Period comparisons: "weekly vs monthly", "week and quarter", "tuần và tháng"
+        period = r'(week|month|quarter|tuần|tháng|quý)(?:ly|s)?'
+        for match in re.finditer(rf'\b{period}\s*(?:vs\.?|versus|and|or|/|&|và|so với)\s*\b{period}\b', q):
+            windows.update(unit_days[unit] for unit in match.groups())
+        return sorted(w for w in windows if 0 < w <= 730)
+    
+    def _extract_entity_filters(self, question: str) -> dict:
+        """Extract SKU ID (e.g. 1009AA) and warehouse ID (e.g. HCM001) mentioned in question"""
+        filters = {}
+        sku_match = re.search(r'\b\d{4}[A-Z]{2}\b', question.upper())
+        if sku_match:
+            filters["sku_id"] = sku_match.group(0)
+        warehouse_match = re.search(r'\b[A-Z]{3}\d{3}\b', question.upper())
+        if warehouse_match:
+            filters["warehouse_id"] = warehouse_match.group(0)
+        return filters
+    
+    def _extract_stock_cover_filters(self, question_lower: str) -> dict:
+        """
+        Chuyển ý định trong câu hỏi thành bộ lọc stock cover (status / ngưỡng / thứ tự)
+        để đẩy xuống SQL hoặc áp dụng lên snapshot
+        """
+        # Extract threshold from question (e.g., "less than 30 days", "under 45 days")
+        threshold_patterns = [
+            (r'(?:less than|under|below|dưới|nhỏ hơn)\s+(\d+)\s*day', "max_cover_days"),
+            (r'(?:greater than|above|over|trên|lớn hơn)\s+(\d+)\s*day', "min_cover_days"),
+        ]
+        for pattern, key in threshold_patterns:
+            match = re.search(pattern, question_lower)
+            if match:
+                return {key: int(match.group(1))}
+        
+        if 'critical' in question_lower and 'warning' not in question_lower:
+            # CHỈ critical items (< 15 days)
+            return {"statuses": ['Critical']}
+        if any(x in question_lower for x in ['warning', 'cảnh báo', 'risk', 'danger', 'run out', 'running out', 'hết hàng', 'nguy cơ']):
+            # Warning + Critical (< 30 days)
+            return {"statuses": ['Critical', 'Warning', 'At Risk']}
+        # Default (and "lowest"): exclude "No Sales" items, lowest cover first
+        return {"exclude_statuses": ['No Sales']}
+    
+    def _extract_abc_xyz_filters(self, question: str) -> dict:
+        """
+        Extract requested ABC / XYZ classes, e.g. "AX items", "class A", "nhóm Z", "B-class"
+        """
+        q = question.upper()
+        abc, xyz = set(), set()
+        for match in re.finditer(r'\b([ABC])([XYZ])\b', q):
+            abc.add(match.group(1))
+            xyz.add(match.group(2))
+        for match in re.finditer(r'\b(?:CLASS|NHÓM|LOẠI|HẠNG)\s+([ABCXYZ])\b|\b([ABCXYZ])-CLASS\b', q):
+            letter = match.group(1) or match.group(2)
+            (abc if letter in "ABC" else xyz).add(letter)
+        filters = {}
+        if abc:
+            filters["abc_classes"] = sorted(abc)
+        if xyz:
+            filters["xyz_classes"] = sorted(xyz)
+        return filters
+    
     def _handle_inventory_analytics_intent(self, user_question: str, db_type: str, debug_base: dict | None = None) -> dict:
         """Handle inventory analytics intent - FOCUS: Stock Cover Days only"""
         try:
@@ -327,26 +464,151 @@ class OrchestratorAgent:
             # Extract top N from question
             limit = self._extract_top_n(user_question)
             
-            # Determine analytics type: Stock Cover vs Turnover
+            # Determine analytics type: Stock Cover vs Turnover vs multi-window comparison
             is_turnover = any(x in question_lower for x in ['turnover', 'rotation', 'vòng quay', 'tốc độ bán'])
+            windows = self._extract_windows(user_question)
+            is_multi_window = len(windows) >= 2
+            is_abc_xyz = bool(
+                re.search(r'\b(?:abc|xyz|pareto)\b', question_lower)
+                or re.search(r'\b[ABC][XYZ]\b', user_question)
+            ) or any(x in question_lower for x in ['classification', 'phân loại', 'phân nhóm'])
+            is_transfer = any(
+                x in question_lower for x in ['transfer', 'rebalanc', 'move stock', 'điều chuyển', 'chuyển kho', 'điều phối']
+            )
+            is_simulation = any(
+                x in question_lower for x in ['probability', 'monte carlo', 'simulat', 'xác suất', 'mô phỏng']
+            )
             
-            if is_turnover:
-                df = self.analytics_agent.calculate_inventory_turnover()
-                analytics_type = "inventory_turnover"
+            entity_filters = self._extract_entity_filters(user_question)
+            
+            # A fresh shared snapshot is filtered in memory; otherwise filters, ordering and
+            # the limit are pushed into SQL so only the requested rows leave the database
+            snapshot = self.analytics_agent.peek_snapshot()
+            analytics_source = "sql_pushdown"
+            t_query0 = time.perf_counter()
+            
+            if is_abc_xyz:
+                # Cumulative revenue share + demand CV computed by window functions in one query
+                analytics_type = "abc_xyz_classification"
+                df = self.analytics_agent.calculate_abc_xyz(
+                    **self._extract_abc_xyz_filters(user_question),
+                    **entity_filters,
+                    limit=limit,
+                )
+                
+                cols_to_keep = [
+                    'sku_id', 'sku_name', 'warehouse_id', 'total_revenue',
+                    'cumulative_revenue_pct', 'demand_cv', 'abc_xyz_class'
+                ]
+                df = df[[c for c in cols_to_keep if c in df.columns]]
+                rename_map = {
+                    'sku_id': 'SKU ID',
+                    'sku_name': 'Product Name',
+                    'warehouse_id': 'Warehouse',
+                    'total_revenue': 'Revenue',
+                    'cumulative_revenue_pct': 'Cumulative Revenue %',
+                    'demand_cv': 'Demand CV',
+                    'abc_xyz_class': 'Class'
+                }
+                df = df.rename(columns=rename_map)
+            
+            elif is_transfer:
+                # Surplus/deficit of the same SKU across warehouses, matched nearest-first
+                analytics_type = "warehouse_transfers"
+                df = self.analytics_agent.recommend_transfers(**entity_filters, limit=limit)
+                
+                cols_to_keep = [
+                    'sku_id', 'sku_name', 'from_warehouse', 'to_warehouse', 'distance_km',
+                    'transfer_qty', 'to_cover_days', 'to_cover_days_after'
+                ]
+                df = df[[c for c in cols_to_keep if c in df.columns]]
+                rename_map = {
+                    'sku_id': 'SKU ID',
+                    'sku_name': 'Product Name',
+                    'from_warehouse': 'From',
+                    'to_warehouse': 'To',
+                    'distance_km': 'Distance (km)',
+                    'transfer_qty': 'Transfer Qty',
+                    'to_cover_days': 'Cover Days (before)',
+                    'to_cover_days_after': 'Cover Days (after)'
+                }
+                df = df.rename(columns=rename_map)
+            
+            elif is_simulation:
+                # Monte Carlo over bootstrapped demand and random lead time, every series at once
+                analytics_type = "stockout_simulation"
+                df = self.analytics_agent.simulate_stockout_risk(**entity_filters)
+                df = df[df['stockout_probability'] > 0].head(limit) if not df.empty else df
+                
+                cols_to_keep = [
+                    'sku_id', 'sku_name', 'warehouse_id', 'current_inventory_quantity',
+                    'average_lead_time_days', 'stockout_probability', 'expected_shortfall'
+                ]
+                df = df[[c for c in cols_to_keep if c in df.columns]]
+                rename_map = {
+                    'sku_id': 'SKU ID',
+                    'sku_name': 'Product Name',
+                    'warehouse_id': 'Warehouse',
+                    'current_inventory_quantity': 'Stock',
+                    'average_lead_time_days': 'Lead Time',
+                    'stockout_probability': 'Stockout Probability',
+                    'expected_shortfall': 'Expected Shortfall'
+                }
+                df = df.rename(columns=rename_map)
+            
+            elif is_multi_window:
+                # One scan computes velocity / cover / turnover for every requested window
+                df = self.analytics_agent.calculate_multi_window_metrics(windows, **entity_filters)
+                analytics_type = "multi_window_velocity"
                 if df.empty:
                     return {
                         "success": False,
-                        "error": "No turnover data available",
+                        "error": "No multi-window data available",
                         "intent": "inventory_analytics",
                         "agent": "analytics_agent"
                     }
                 
+                # Exclude items without sales in any window, sort by the shortest window cover
+                sales_cols = [f'sales_qty_{w}d' for w in windows]
+                df = df[df[sales_cols].sum(axis=1) > 0]
+                sort_metric = 'turnover_ratio' if is_turnover else 'stock_cover_days'
+                df = df.sort_values(f'{sort_metric}_{windows[0]}d', ascending=not is_turnover, na_position='last')
+                df = df.head(limit)
+                
+                metric_prefix = 'turnover_ratio' if is_turnover else 'stock_cover_days'
+                metric_label = 'Turnover' if is_turnover else 'Cover Days'
+                cols_to_keep = ['sku_id', 'sku_name', 'current_inventory_quantity']
+                rename_map = {
+                    'sku_id': 'SKU ID',
+                    'sku_name': 'Product Name',
+                    'current_inventory_quantity': 'Stock',
+                }
+                for w in windows:
+                    cols_to_keep += [f'avg_daily_sales_{w}d', f'{metric_prefix}_{w}d']
+                    rename_map[f'avg_daily_sales_{w}d'] = f'Sales/Day ({w}d)'
+                    rename_map[f'{metric_prefix}_{w}d'] = f'{metric_label} ({w}d)'
+                df = df[[c for c in cols_to_keep if c in df.columns]].rename(columns=rename_map)
+            
+            elif is_turnover:
+                analytics_type = "inventory_turnover"
                 # Check for "lowest" or "slowest" (Bottom performing items)
+                order = "turnover_desc"
                 if any(x in question_lower for x in ['low', 'lowest', 'slow', 'chậm', 'bottom', 'ít nhất']):
-                    df = df.sort_values('turnover_ratio', ascending=True)
-
-                # Apply limit
-                df = df.head(limit)
+                    order = "turnover_asc"
+                
+                cached = snapshot.cached_turnover() if snapshot is not None else None
+                if cached is not None:
+                    analytics_source = "snapshot"
+                    df = cached
+                    for key, value in entity_filters.items():
+                        df = df[df[key] == value]
+                    df = df.sort_values(
+                        'turnover_ratio', ascending=(order == "turnover_asc"), na_position='last', kind='stable'
+                    ).head(limit)
+                else:
+                    df = self.analytics_agent.calculate_inventory_turnover(
+                        order=order, limit=limit, **entity_filters
+                    )
                 
                 # SIMPLIFY TABLE for Turnover
                 cols_to_keep = [
@@ -371,54 +633,17 @@ class OrchestratorAgent:
                 
             else:
                 # Default: Stock Cover Days analysis
-                df = self.analytics_agent.calculate_stock_cover_days()
                 analytics_type = "stock_cover_days"
-                
-                if df.empty:
-                    return {
-                        "success": False,
-                        "error": "No stock cover data available",
-                        "intent": "inventory_analytics",
-                        "agent": "analytics_agent"
-                    }
-                
-                # Extract threshold from question (e.g., "less than 30 days", "under 45 days")
-                threshold = None
-                threshold_patterns = [
-                    r'(?:less than|under|below|dưới|nhỏ hơn)\s+(\d+)\s*day',
-                    r'(?:greater than|above|over|trên|lớn hơn)\s+(\d+)\s*day',
-                ]
-                
-                for pattern in threshold_patterns:
-                    match = re.search(pattern, question_lower)
-                    if match:
-                        threshold = int(match.group(1))
-                        is_less_than = any(word in pattern for word in ['less', 'under', 'below', 'dưới', 'nhỏ'])
-                        break
-                
-                # Filter based on question intent
-                if threshold is not None:
-                    # Filter by specific threshold
-                    if is_less_than:
-                        df = df[(df['stock_cover_days'].notna()) & (df['stock_cover_days'] < threshold)]
-                    else:
-                        df = df[(df['stock_cover_days'].notna()) & (df['stock_cover_days'] > threshold)]
-                elif 'critical' in question_lower and 'warning' not in question_lower:
-                    # CHỈ critical items (< 15 days)
-                    df = df[df['stock_status'] == 'Critical']
-                elif any(x in question_lower for x in ['warning', 'cảnh báo', 'risk', 'danger', 'run out', 'running out', 'hết hàng', 'nguy cơ']):
-                    # Warning + Critical (< 30 days)
-                    df = df[df['stock_status'].isin(['Critical', 'Warning', 'At Risk'])]
-                elif any(x in question_lower for x in ['low', 'lowest', 'sắp hết', 'ít nhất']):
-                    # Top N lowest stock cover (exclude No Sales)
-                    df = df[df['stock_status'] != 'No Sales']
-                    df = df.sort_values('stock_cover_days', ascending=True)
+                filters = {
+                    **self._extract_stock_cover_filters(question_lower),
+                    **entity_filters,
+                    "limit": limit,
+                }
+                if snapshot is not None and not snapshot.stock_cover.empty:
+                    analytics_source = "snapshot"
+                    df = filter_stock_cover_frame(snapshot.stock_cover, **filters)
                 else:
-                    # Default: exclude "No Sales" items
-                    df = df[df['stock_status'] != 'No Sales']
-                
-                # Apply limit AFTER filtering
-                df = df.head(limit)
+                    df = self.analytics_agent.calculate_stock_cover_days(**filters)
                 
                 # SIMPLIFY TABLE: Select and rename columns for cleaner display
                 cols_to_keep = [
@@ -449,6 +674,16 @@ class OrchestratorAgent:
                     "agent": "analytics_agent"
                 }
 
+            (debug_base or {}).get("steps", []).append({
+                "step": "analytics_query",
+                "duration_ms": (time.perf_counter() - t_query0) * 1000,
+                "detail": {
+                    "source": "multi_window_scan" if is_multi_window else analytics_source,
+                    "rows": len(df),
+                    "snapshot": snapshot.info() if snapshot is not None else None,
+                }
+            })
+            
             # Generate natural language summary
             nl_summary = self.analytics_agent.generate_analytics_report(user_question, df)
             
@@ -472,7 +707,13 @@ class OrchestratorAgent:
                 "response": nl_summary,
                 "response_table_md": table_md,
                 "message": f"📊 Analytics completed! Generated {len(df)} insights.",
-                "debug": debug_base
+                "data_freshness": snapshot.staleness_text() if analytics_source == "snapshot" else None,
+                "debug": {
+                    **(debug_base or {}),
+                    "analytics_snapshot": snapshot.info() if snapshot is not None else None,
+                    "windows": windows,
+                    "analytics_source": analytics_source,
+                }
             }
             
         except Exception as e:
@@ -0,0 +1,80 @@
+"""
+Safety Stock - Safety stock, reorder point và số lượng đặt hàng cho mọi (sku, warehouse) cùng lúc
+Dựa trên độ biến động nhu cầu (std theo ngày) và độ biến động lead time (average vs maximum)
+"""
+
+from statistics import NormalDist
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+
+# Maximum lead time is treated as roughly the 97.7th percentile (mean + 2 sigma) of lead time
+MAX_LEAD_TIME_SIGMAS = 2.0
+
+
+def service_level_z(service_level: float) -> float:
+    """z-score của cycle service level (ví dụ 0.95 -> 1.645)"""
+    service_level = min(max(service_level, 0.5), 0.9999)
+    return NormalDist().inv_cdf(service_level)
+
+
+def compute_reorder_policy(
+    stock_cover: pd.DataFrame,
+    demand: np.ndarray,
+    service_level: float = 0.95,
+    review_period_days: int = 30,
+    daily_mean: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    Safety stock / reorder point / recommended order quantity (vectorized)
+
+    safety_stock = z * sqrt(L * sigma_d^2 + d^2 * sigma_L^2)
+    reorder_point = d * L + safety_stock
+    order_up_to = reorder_point + d * review_period_days
+
+    với d, sigma_d là trung bình / độ lệch chuẩn nhu cầu theo ngày (kể cả ngày không bán),
+    L = average lead time, sigma_L = (maximum - average lead time) / MAX_LEAD_TIME_SIGMAS.
+
+    Args:
+        stock_cover: Frame có current_inventory_quantity, average_lead_time_days, maximum_lead_time_days
+        demand: Ma trận nhu cầu (ngày × series) cùng thứ tự với stock_cover
+        service_level: Cycle service level mục tiêu
+        review_period_days: Số ngày nhu cầu cần phủ thêm sau reorder point
+        daily_mean: Nhu cầu trung bình theo ngày dùng cho d (ví dụ avg_daily_sales mà stock_status
+            dựa vào), None -> trung bình của ma trận demand. sigma_d luôn lấy từ ma trận demand.
+
+    Returns:
+        DataFrame cùng index với stock_cover
+    """
+    on_hand = stock_cover["current_inventory_quantity"].to_numpy(dtype=np.float64)
+    avg_lead = np.nan_to_num(stock_cover["average_lead_time_days"].to_numpy(dtype=np.float64))
+    if "maximum_lead_time_days" in stock_cover.columns:
+        max_lead = stock_cover["maximum_lead_time_days"].to_numpy(dtype=np.float64)
+        max_lead = np.where(np.isnan(max_lead), avg_lead, np.maximum(max_lead, avg_lead))
+    else:
+        max_lead = avg_lead
+
+    if daily_mean is None:
+        daily_mean = demand.mean(axis=0) if len(demand) else np.zeros(len(stock_cover))
+    daily_mean = np.nan_to_num(np.asarray(daily_mean, dtype=np.float64))
+    daily_std = demand.std(axis=0, ddof=1) if len(demand) > 1 else np.zeros(len(stock_cover))
+    lead_std = (max_lead - avg_lead) / MAX_LEAD_TIME_SIGMAS
+
+    z = service_level_z(service_level)
+    safety_stock = z * np.sqrt(avg_lead * daily_std ** 2 + daily_mean ** 2 * lead_std ** 2)
+    reorder_point = daily_mean * avg_lead + safety_stock
+    order_up_to = reorder_point + daily_mean * review_period_days
+    below_reorder_point = (on_hand <= reorder_point) & (daily_mean > 0)
+
+    result = pd.DataFrame(index=stock_cover.index)
+    result["demand_mean_daily"] = daily_mean.round(4)
+    result["demand_std_daily"] = daily_std.round(4)
+    result["safety_stock"] = safety_stock.round(2)
+    result["reorder_point"] = reorder_point.round(2)
+    result["order_up_to_level"] = order_up_to.round(2)
+    result["below_reorder_point"] = below_reorder_point
+    result["recommended_order_qty"] = np.where(
+        below_reorder_point, np.maximum(order_up_to - on_hand, 0.0), 0.0
+    ).round(2)
+    return result
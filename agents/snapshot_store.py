@@ -0,0 +1,143 @@
+"""
+Snapshot Store - Lưu/đọc analytics snapshot dạng Parquet có version dưới data/
+Mỗi version là một thư mục <timestamp>_<data_version>/ gồm các frame .parquet và manifest.json
+"""
+
+from typing import Any, Dict, Optional, Tuple
+import json
+import os
+import shutil
+import time
+import pandas as pd
+
+
+MANIFEST_FILE = "manifest.json"
+
+
+def _json_default(value: Any) -> Any:
+    """numpy scalars -> Python scalars, anything else -> str"""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def write_snapshot(
+    base_dir: str,
+    frames: Dict[str, pd.DataFrame],
+    documents: Dict[str, Any],
+    metadata: Dict[str, Any],
+    keep: int = 5,
+) -> str:
+    """
+    Ghi một version snapshot mới
+
+    Frames và documents được ghi vào thư mục tạm rồi rename, manifest ghi sau cùng,
+    nên reader không bao giờ thấy version ghi dở.
+
+    Args:
+        base_dir: Thư mục gốc chứa các version (ví dụ data/analytics_snapshots)
+        frames: {tên: DataFrame} ghi ra <tên>.parquet
+        documents: {tên: object JSON} ghi vào manifest
+        metadata: Thông tin version (data_version, as_of_date, build_ms, ...)
+        keep: Số version giữ lại
+
+    Returns:
+        Đường dẫn thư mục version
+    """
+    created_at = time.time()
+    # Microseconds keep names unique and in time order even for several versions per second
+    version = (
+        f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(created_at))}{int(created_at % 1 * 1e6):06d}"
+        f"_{metadata.get('data_version', 'unknown')}"
+    )
+    os.makedirs(base_dir, exist_ok=True)
+    tmp_dir = os.path.join(base_dir, f".tmp_{version}_{os.getpid()}")
+    final_dir = os.path.join(base_dir, version)
+
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        for name, df in frames.items():
+            df.to_parquet(os.path.join(tmp_dir, f"{name}.parquet"), index=False)
+        manifest = {
+            **metadata,
+            "version": version,
+            "created_at": created_at,
+            "frames": sorted(frames),
+            "documents": documents,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, default=_json_default)
+        if os.path.exists(final_dir):
+            shutil.rmtree(final_dir)
+        os.replace(tmp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    prune_snapshots(base_dir, keep)
+    return final_dir
+
+
+def _created_at(path: str) -> float:
+    """created_at trong manifest (thời điểm ghi thật), manifest hỏng -> 0 (cũ nhất)"""
+    try:
+        return float(read_manifest(path)["created_at"])
+    except Exception:
+        return 0.0
+
+
+def list_snapshots(base_dir: str) -> list:
+    """Các thư mục version hoàn chỉnh (có manifest), mới nhất trước theo created_at của manifest"""
+    if not os.path.isdir(base_dir):
+        return []
+    versions = [
+        os.path.join(base_dir, name)
+        for name in os.listdir(base_dir)
+        if not name.startswith(".") and os.path.isfile(os.path.join(base_dir, name, MANIFEST_FILE))
+    ]
+    return sorted(versions, key=lambda path: (_created_at(path), path), reverse=True)
+
+
+def prune_snapshots(base_dir: str, keep: int) -> None:
+    """Xóa các version cũ, giữ lại `keep` version mới nhất"""
+    for path in list_snapshots(base_dir)[max(keep, 1):]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_latest_snapshot(
+    base_dir: str, max_age_seconds: float, expected: Optional[Dict[str, Any]] = None
+) -> Optional[Tuple[Dict[str, pd.DataFrame], Dict[str, Any], str]]:
+    """
+    Đọc version mới nhất nếu chưa quá max_age_seconds
+
+    Args:
+        expected: Các trường manifest bắt buộc phải khớp (ví dụ db_type, data_source);
+            version không khớp (kể cả version cũ không ghi các trường này) bị bỏ qua
+
+    Returns:
+        (frames, manifest, path) hoặc None nếu không có version đủ mới
+    """
+    for path in list_snapshots(base_dir):
+        try:
+            manifest = read_manifest(path)
+            if time.time() - float(manifest["created_at"]) > max_age_seconds:
+                return None
+            mismatched = {
+                key: manifest.get(key) for key, value in (expected or {}).items() if manifest.get(key) != value
+            }
+            if mismatched:
+                print(f"⚠️ Skipping analytics snapshot {path}: written for {mismatched}")
+                continue
+            frames = {
+                name: pd.read_parquet(os.path.join(path, f"{name}.parquet"))
+                for name in manifest.get("frames", [])
+            }
+            return frames, manifest, path
+        except Exception as e:
+            print(f"⚠️ Could not read analytics snapshot {path}, trying an older version: {e}")
+    return None
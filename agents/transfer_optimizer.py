@@ -0,0 +1,126 @@
+"""
+Transfer Optimizer - Đề xuất điều chuyển hàng giữa các kho: dư ở kho này, thiếu cùng SKU ở kho khác
+Ma trận khoảng cách haversine (vectorized) + ghép dư/thiếu greedy theo khoảng cách gần nhất, toàn catalog một lượt
+"""
+
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_matrix(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Khoảng cách great-circle (km) giữa mọi cặp điểm, ma trận (W × W)
+
+    Args:
+        lat, lon: Vĩ độ / kinh độ (độ), cùng độ dài W
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def compute_transfer_balances(
+    stock_cover: pd.DataFrame,
+    target_days: float,
+    surplus_min_cover_days: float,
+    deficit_max_cover_days: float,
+) -> pd.DataFrame:
+    """
+    Số lượng dư (có thể chuyển đi) và thiếu (cần nhận) của mỗi SKU-warehouse
+
+    Kho dư giữ lại target_days ngày nhu cầu, kho thiếu được bù lên target_days ngày.
+    Nhu cầu ngày lấy từ dự báo (forecast_daily_demand) nếu có, ngược lại avg_daily_sales.
+    Kho không bán được (No Sales) coi toàn bộ tồn kho là dư.
+
+    Returns:
+        Frame cùng index với stock_cover: daily_demand, surplus_qty, deficit_qty
+    """
+    on_hand = stock_cover["current_inventory_quantity"].to_numpy(dtype=np.float64)
+    daily = stock_cover["avg_daily_sales"].fillna(0).to_numpy(dtype=np.float64)
+    if "forecast_daily_demand" in stock_cover.columns:
+        forecast = stock_cover["forecast_daily_demand"].to_numpy(dtype=np.float64)
+        daily = np.where(np.isnan(forecast), daily, forecast)
+    cover = stock_cover["stock_cover_days"].to_numpy(dtype=np.float64)
+    target = daily * target_days
+
+    is_surplus = (daily <= 0) | (cover >= surplus_min_cover_days)
+    is_deficit = (daily > 0) & (cover < deficit_max_cover_days)
+    result = pd.DataFrame(index=stock_cover.index)
+    result["daily_demand"] = daily
+    result["surplus_qty"] = np.where(is_surplus, np.maximum(on_hand - target, 0.0), 0.0)
+    result["deficit_qty"] = np.where(is_deficit, np.maximum(target - on_hand, 0.0), 0.0)
+    return result
+
+
+def greedy_transfer_plan(
+    donors: pd.DataFrame,
+    receivers: pd.DataFrame,
+    distance_km: np.ndarray,
+    warehouse_index: pd.Index,
+    max_distance_km: Optional[float] = None,
+    min_qty: float = 1.0,
+) -> pd.DataFrame:
+    """
+    Ghép dư với thiếu cho mọi SKU cùng lúc: các cặp (donor, receiver) cùng SKU được xếp theo
+    khoảng cách tăng dần và phân bổ greedy (cặp gần nhất được ưu tiên)
+
+    Args:
+        donors: Cột sku_id, warehouse_id, surplus_qty
+        receivers: Cột sku_id, warehouse_id, deficit_qty
+        distance_km: Ma trận khoảng cách (W × W) theo thứ tự warehouse_index
+        warehouse_index: Mã warehouse tương ứng hàng/cột của distance_km
+        max_distance_km: Bỏ các cặp xa hơn ngưỡng (optional)
+        min_qty: Bỏ các lệnh điều chuyển nhỏ hơn ngưỡng
+
+    Returns:
+        DataFrame: sku_id, from_warehouse, to_warehouse, distance_km, transfer_qty,
+        donor_row, receiver_row (index gốc của donors / receivers)
+    """
+    columns = ["sku_id", "from_warehouse", "to_warehouse", "distance_km", "transfer_qty", "donor_row", "receiver_row"]
+    if donors.empty or receivers.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Mọi cặp cùng SKU, khác kho, trong một merge
+    pairs = donors[["sku_id", "warehouse_id"]].reset_index(names="donor_row").merge(
+        receivers[["sku_id", "warehouse_id"]].reset_index(names="receiver_row"),
+        on="sku_id", suffixes=("_from", "_to"),
+    )
+    pairs = pairs[pairs["warehouse_id_from"] != pairs["warehouse_id_to"]]
+    from_idx = warehouse_index.get_indexer(pairs["warehouse_id_from"])
+    to_idx = warehouse_index.get_indexer(pairs["warehouse_id_to"])
+    located = (from_idx >= 0) & (to_idx >= 0)
+    pairs = pairs[located]
+    pairs["distance_km"] = distance_km[from_idx[located], to_idx[located]]
+    if max_distance_km is not None:
+        pairs = pairs[pairs["distance_km"] <= max_distance_km]
+    if pairs.empty:
+        return pd.DataFrame(columns=columns)
+    pairs = pairs.sort_values(["distance_km", "sku_id"], kind="stable")
+
+    remaining_surplus = donors["surplus_qty"].to_dict()
+    remaining_deficit = receivers["deficit_qty"].to_dict()
+    plan = []
+    for donor_row, receiver_row, distance in zip(
+        pairs["donor_row"].tolist(), pairs["receiver_row"].tolist(), pairs["distance_km"].tolist()
+    ):
+        qty = min(remaining_surplus[donor_row], remaining_deficit[receiver_row])
+        if qty < min_qty:
+            continue
+        remaining_surplus[donor_row] -= qty
+        remaining_deficit[receiver_row] -= qty
+        plan.append((donor_row, receiver_row, distance, qty))
+
+    if not plan:
+        return pd.DataFrame(columns=columns)
+    plan = pd.DataFrame(plan, columns=["donor_row", "receiver_row", "distance_km", "transfer_qty"])
+    plan["sku_id"] = donors.loc[plan["donor_row"], "sku_id"].to_numpy()
+    plan["from_warehouse"] = donors.loc[plan["donor_row"], "warehouse_id"].to_numpy()
+    plan["to_warehouse"] = receivers.loc[plan["receiver_row"], "warehouse_id"].to_numpy()
+    return plan[columns]
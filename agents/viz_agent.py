@@ -1,17 +1,37 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import os
+import re
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 
 from utils.logger import traceable
 from langchain_groq import ChatGroq
-from configs.settings import GROQ_MODEL_NAME
+from configs.settings import (
+    GROQ_MODEL_NAME, VIZ_MAX_POINTS_PER_SERIES, VIZ_MAX_TOTAL_POINTS,
+    VIZ_WEBGL_MIN_POINTS, VIZ_DENSITY_MIN_POINTS, VIZ_RULE_MIN_CONFIDENCE, VIZ_FIGURE_CACHE_MB,
+)
+from agents.chart_downsample import downsample_series
+from agents.figure_cache import FigureCache, figure_cache_key
 
 
- 
+# Question keywords used by the rule-based planner
+TREND_KEYWORDS = ['trend', 'over time', 'daily', 'weekly', 'monthly', 'yearly', 'timeline', 'xu hướng', 'theo thời gian', 'theo ngày', 'theo tháng']
+SHARE_KEYWORDS = ['share', 'proportion', 'percentage', 'breakdown', 'composition', 'pie', 'donut', 'tỷ lệ', 'tỉ lệ', 'tỷ trọng', 'cơ cấu']
+DISTRIBUTION_KEYWORDS = ['distribution', 'histogram', 'spread', 'phân bố', 'phân phối']
+CORRELATION_KEYWORDS = [' vs ', 'versus', 'correlation', 'relationship', 'scatter', 'tương quan']
+TEMPORAL_NAME_HINTS = {'date', 'day', 'week', 'month', 'quarter', 'year', 'time', 'period'}
+# Integer columns are time axes only when named like order_year / month (not lead_time_days)
+INTEGER_TEMPORAL_SUFFIXES = {'week', 'month', 'quarter', 'year'}
+# Categorical columns with at most this many values can become a series (group_by) or pie slices
+MAX_SERIES_CARDINALITY = 12
+MAX_PIE_SLICES = 10
+
+# Shared by every VisualizationAgent (and so every Streamlit session) in the process
+_figure_cache = FigureCache(VIZ_FIGURE_CACHE_MB * 1024 * 1024)
 
 
 class VisualizationAgent:
@@ -26,8 +46,111 @@ class VisualizationAgent:
             groq_api_key=os.getenv("GROQ_API_KEY"),
         )
 
+    @staticmethod
+    def _classify_columns(df: pd.DataFrame) -> Tuple[list, list, list]:
+        """(temporal, numeric, categorical) columns from dtypes and column names"""
+        temporal, numeric, categorical = [], [], []
+        sample = df.head(20)
+        for col, dtype in df.dtypes.items():
+            tokens = re.split(r'[\W_]+', str(col).lower())
+            if pd.api.types.is_datetime64_any_dtype(dtype):
+                temporal.append(col)
+            elif pd.api.types.is_bool_dtype(dtype):
+                categorical.append(col)
+            elif pd.api.types.is_numeric_dtype(dtype):
+                # year / month numbers are time axes, not measures
+                is_period = pd.api.types.is_integer_dtype(dtype) and tokens[-1] in INTEGER_TEMPORAL_SUFFIXES
+                (temporal if is_period else numeric).append(col)
+            elif TEMPORAL_NAME_HINTS.intersection(tokens) and pd.to_datetime(sample[col], errors="coerce").notna().all():
+                temporal.append(col)
+            else:
+                categorical.append(col)
+        return temporal, numeric, categorical
+
+    @staticmethod
+    def _labels(cols: list) -> str:
+        """order_date, revenue -> 'Order Date, Revenue' cho tiêu đề chart"""
+        return ", ".join(str(c).replace("_", " ").title() for c in cols)
+
+    def plan_chart_rules(self, question: str, df: pd.DataFrame) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Lập chart spec không cần LLM cho các dạng kết quả phổ biến
+
+        Dựa trên kiểu cột (thời gian / số / phân loại), số giá trị khác nhau và từ khóa trong câu hỏi
+        ("trend", "share", "distribution", ...). Câu hỏi nêu rõ loại chart (pie/line/bar/scatter) được ưu tiên.
+
+        Returns:
+            (spec, confidence) - spec là None khi không nhận ra dạng kết quả
+        """
+        spec, confidence = self._plan_from_shape(question, df)
+        requested = re.search(r'\b(pie|donut|line|bar|scatter)\b', question.lower())
+        if spec is None or not requested or requested.group(1) == spec["chart_type"]:
+            return spec, confidence
+        if {requested.group(1), spec["chart_type"]} <= {"line", "bar"}:
+            # Line <-> bar dùng chung x / y / group_by
+            return {**spec, "chart_type": requested.group(1)}, confidence
+        # Loại chart được yêu cầu không khớp dạng kết quả: để LLM quyết định
+        return spec, min(confidence, 0.5)
+
+    def _plan_from_shape(self, question: str, df: pd.DataFrame) -> Tuple[Optional[Dict[str, Any]], float]:
+        """Spec + confidence theo dạng kết quả (xem plan_chart_rules)"""
+        q = f" {question.lower()} "
+        temporal, numeric, categorical = self._classify_columns(df)
+        if not numeric:
+            return None, 0.0
+        cardinality = {c: df[c].nunique(dropna=True) for c in categorical}
+        low_card = sorted((c for c in categorical if cardinality[c] <= MAX_SERIES_CARDINALITY), key=cardinality.get)
+        wants_trend = any(k in q for k in TREND_KEYWORDS)
+        wants_share = any(k in q for k in SHARE_KEYWORDS)
+        wants_distribution = any(k in q for k in DISTRIBUTION_KEYWORDS)
+        wants_correlation = any(k in q for k in CORRELATION_KEYWORDS)
+
+        if len(temporal) == 1 and not wants_share and len(categorical) <= 1:
+            # Date + measure(s) (+ one low-cardinality series column): line
+            x = temporal[0]
+            spec = {"chart_type": "line", "x": x, "y": numeric[:3], "title": f"{self._labels(numeric[:3])} over {self._labels([x])}"}
+            confidence = 0.9
+            if categorical:
+                if categorical[0] not in low_card:
+                    return spec, 0.5
+                spec.update({"y": numeric[:1], "group_by": categorical[0], "agg": "sum",
+                             "title": f"{self._labels(numeric[:1])} over {self._labels([x])} by {self._labels(categorical[:1])}"})
+                confidence = 0.85
+            return spec, min(confidence + (0.05 if wants_trend else 0.0), 1.0)
+
+        if not temporal and len(categorical) == 1:
+            x = categorical[0]
+            if wants_share and len(numeric) == 1 and cardinality[x] <= MAX_PIE_SLICES:
+                chart_type = "donut" if "donut" in q else "pie"
+                return {"chart_type": chart_type, "x": x, "y": numeric[:1], "title": f"{self._labels(numeric[:1])} Share by {self._labels([x])}"}, 0.9
+            if wants_trend or wants_correlation:
+                return {"chart_type": "bar", "x": x, "y": numeric[:1], "title": f"{self._labels(numeric[:1])} by {self._labels([x])}"}, 0.6
+            y = numeric[:3]
+            confidence = 0.9 if len(y) == 1 else 0.8
+            if wants_distribution:
+                confidence = max(confidence, 0.85)
+            return {"chart_type": "bar", "x": x, "y": y, "title": f"{self._labels(y)} by {self._labels([x])}"}, confidence
+
+        if not temporal and len(categorical) == 2 and len(numeric) == 1 and low_card:
+            # Two categories + one measure: grouped bar, fewer-valued category as the series
+            group_by = low_card[0]
+            x = categorical[1] if categorical[0] == group_by else categorical[0]
+            return {"chart_type": "bar", "x": x, "y": numeric[:1], "group_by": group_by, "agg": "sum",
+                    "title": f"{self._labels(numeric[:1])} by {self._labels([x])} and {self._labels([group_by])}"}, 0.8
+
+        if not temporal and not categorical and len(numeric) >= 2:
+            spec = {"chart_type": "scatter", "x": numeric[0], "y": [numeric[1]], "title": f"{self._labels([numeric[1]])} vs {self._labels([numeric[0]])}"}
+            return spec, 0.9 if wants_correlation else 0.7
+
+        return None, 0.0
+
     @traceable(name="viz.plan")
     def plan_chart(self, question: str, df: pd.DataFrame) -> Dict[str, Any]:
+        # Dạng kết quả rõ ràng: dùng luật, bỏ qua một lượt gọi LLM
+        spec, confidence = self.plan_chart_rules(question, df)
+        if spec is not None and confidence >= VIZ_RULE_MIN_CONFIDENCE:
+            return {**spec, "planner": "rules", "confidence": round(confidence, 2)}
+        
         columns = ", ".join([str(c) for c in df.columns])
         sample = df.head(5).to_dict(orient="records")
         prompt = f"""
@@ -55,7 +178,7 @@ Sample rows: {sample}
 """
         try:
             res = self.llm.invoke(prompt)
-            import json, re
+            import json
             content = getattr(res, "content", "")
             match = re.search(r"\{[\s\S]*\}", content)
             spec = json.loads(match.group(0) if match else content)
@@ -67,6 +190,7 @@ Sample rows: {sample}
                 spec["chart_type"] = "bar"
             if "title" not in spec:
                 spec["title"] = "Data Visualization"
+            spec["planner"] = "llm"
                 
         except Exception as e:
             print(f"⚠️ LLM planning failed: {e}, using fallback")
@@ -108,22 +232,11 @@ Sample rows: {sample}
         agg = (spec.get("agg") or "sum").lower()
         title = spec.get("title", "Chart")
 
-        if x and x in df.columns:
-            # cố gắng parse thời gian nếu có chữ 'date' trong tên cột
-            if isinstance(x, str) and "date" in x.lower():
-                try:
-                    df[x] = pd.to_datetime(df[x], errors="coerce")
-                except Exception:
-                    pass
-
-        # Chuẩn bị dữ liệu theo group/agg nếu cần
-        working = df.copy()
-        numeric = working.select_dtypes(np.number).columns.tolist()
-        y_cols = [c for c in y_cols if c in numeric]
-        if not y_cols and numeric:
-            y_cols = numeric[:1]
+        # Chuẩn bị dữ liệu: chỉ các cột spec cần, không sửa và không copy toàn bộ df của caller
+        y_cols = self._resolve_y_columns(df, y_cols)
+        working = self._project_columns(df, x, y_cols, group_by)
 
-        if group_by and group_by in working.columns and x and x in working.columns and y_cols:
+        if self._needs_aggregation(working.columns, x, y_cols, group_by):
             agg_func = {col: ("mean" if agg in ("avg", "mean") else "sum") for col in y_cols}
             working = (
                 working.groupby([x, group_by], as_index=False)
@@ -135,12 +248,7 @@ Sample rows: {sample}
             if chart_type == "pie" and x and y_cols and len(y_cols) > 0:
                 # Aggregate data if needed
                 if len(working) > 10:  # Too many slices
-                    top_9 = working.nlargest(9, y_cols[0])
-                    others_sum = working.nsmallest(len(working)-9, y_cols[0])[y_cols[0]].sum()
-                    if others_sum > 0:
-                        others_row = {x: 'Others', y_cols[0]: others_sum}
-                        top_9 = pd.concat([top_9, pd.DataFrame([others_row])], ignore_index=True)
-                    working = top_9
+                    working = self._top_n_with_others(working, x, y_cols[0], 9)
                 
                 fig = px.pie(
                     working, 
@@ -196,7 +304,7 @@ Sample rows: {sample}
             elif chart_type == "bar" and x and y_cols and len(y_cols) > 0:
                 # Limit data points for better readability
                 if len(working) > 20:
-                    working = working.nlargest(20, y_cols[0])
+                    working = self._top_n(working, y_cols[0], 20)
                     title += " (Top 20)"
                 
                 if len(y_cols) > 1:
@@ -219,17 +327,25 @@ Sample rows: {sample}
                     xaxis_tickangle=-45 if len(working) > 5 else 0,
                     showlegend=True if (len(y_cols) > 1 or group_by) else False
                 )
+            elif chart_type == "scatter" and x and x in working.columns and y_cols:
+                fig = self._scatter_figure(working, x, y_cols, group_by, title)
             else:
                 # default line; if multiple y -> add each as a trace
                 if x and y_cols and len(y_cols) > 0:
                     fig = go.Figure()
+                    series, shown = self._downsample_line_series(working, x, y_cols, group_by)
+                    if shown < len(working):
+                        title += f" ({shown:,} of {len(working):,} points)"
+                    # WebGL khi số điểm (sau downsample) quá lớn cho SVG
+                    trace_cls = go.Scattergl if shown * len(y_cols) > VIZ_WEBGL_MIN_POINTS else go.Scatter
                     if group_by and group_by in working.columns:
-                        for name, part in working.groupby(group_by):
+                        for name, part in series:
                             for col in y_cols:
-                                fig.add_trace(go.Scatter(x=part[x], y=part[col], mode="lines+markers", name=f"{name}-{col}"))
+                                fig.add_trace(trace_cls(x=part[x], y=part[col], mode="lines+markers", name=f"{name}-{col}"))
                     else:
-                        for col in y_cols:
-                            fig.add_trace(go.Scatter(x=working[x], y=working[col], mode="lines+markers", name=col))
+                        for _, part in series:
+                            for col in y_cols:
+                                fig.add_trace(trace_cls(x=part[x], y=part[col], mode="lines+markers", name=col))
                     fig.update_layout(title=title, xaxis_title=str(x), yaxis_title="Value")
                 else:
                     return None
@@ -253,12 +369,7 @@ Sample rows: {sample}
             if chart_type == "pie" and x and y_cols and len(y_cols) > 0:
                 # Limit pie slices
                 if len(working) > 8:
-                    top_7 = working.nlargest(7, y_cols[0])
-                    others_sum = working.nsmallest(len(working)-7, y_cols[0])[y_cols[0]].sum()
-                    if others_sum > 0:
-                        others_row = {x: 'Others', y_cols[0]: others_sum}
-                        top_7 = pd.concat([top_7, pd.DataFrame([others_row])], ignore_index=True)
-                    working = top_7
+                    working = self._top_n_with_others(working, x, y_cols[0], 7)
                 
                 labels = working[x].astype(str)
                 values = working[y_cols[0]]
@@ -290,7 +401,7 @@ Sample rows: {sample}
             elif chart_type == "bar" and x and y_cols and len(y_cols) > 0:
                 # Limit bars for readability
                 if len(working) > 15:
-                    working = working.nlargest(15, y_cols[0])
+                    working = self._top_n(working, y_cols[0], 15)
                     title += " (Top 15)"
                 
                 col = y_cols[0]
@@ -338,8 +449,189 @@ Sample rows: {sample}
             plt.tight_layout()
             return fig
 
+    @staticmethod
+    def _resolve_y_columns(df: pd.DataFrame, y_cols: list) -> list:
+        """Các cột y hợp lệ (số, không phải bool); mặc định cột số đầu tiên"""
+        numeric = [
+            c for c, dtype in df.dtypes.items()
+            if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+        ]
+        y_cols = [c for c in (y_cols or []) if c in numeric]
+        if not y_cols and numeric:
+            y_cols = numeric[:1]
+        return y_cols
+
+    @staticmethod
+    def _needs_aggregation(columns, x: Optional[str], y_cols: list, group_by: Optional[str]) -> bool:
+        """Spec gộp y theo (x, group_by) - cùng điều kiện cho pandas và SQL"""
+        return bool(group_by and group_by in columns and x and x in columns and y_cols)
+
+    @staticmethod
+    def _quote_identifier(name: str) -> str:
+        return '"' + str(name).replace('"', '""') + '"'
+
+    def build_aggregate_sql(self, sql: str, spec: Dict[str, Any], sample: pd.DataFrame) -> Optional[str]:
+        """
+        Bọc SQL đã sinh bằng GROUP BY (x, group_by) theo spec để database chỉ trả về các điểm được vẽ
+
+        Tên cột chỉ lấy từ các cột có thật trong kết quả mẫu (sample), được quote khi ghép vào SQL.
+
+        Args:
+            sql: SQL đã sinh cho câu hỏi
+            spec: Chart spec (x, y, group_by, agg)
+            sample: Vài dòng đầu của kết quả (để biết cột và kiểu dữ liệu)
+
+        Returns:
+            SQL đã gộp, hoặc None nếu spec không cần gộp
+        """
+        x, group_by = spec.get("x"), spec.get("group_by")
+        y_cols = self._resolve_y_columns(sample, spec.get("y", []))
+        if not self._needs_aggregation(sample.columns, x, y_cols, group_by):
+            return None
+        func = "AVG" if (spec.get("agg") or "sum").lower() in ("avg", "mean") else "SUM"
+        keys = ", ".join(self._quote_identifier(c) for c in dict.fromkeys([x, group_by]))
+        measures = ", ".join(
+            f"{func}({self._quote_identifier(c)}) AS {self._quote_identifier(c)}"
+            for c in y_cols if c not in (x, group_by)
+        )
+        if not measures:
+            return None
+        inner = sql.strip().rstrip(";")
+        return (
+            f"SELECT {keys}, {measures}\nFROM (\n{inner}\n) viz_src\n"
+            f"GROUP BY {keys}\nORDER BY {keys}"
+        )
+
+    @staticmethod
+    def _project_columns(df: pd.DataFrame, x: Optional[str], y_cols: list, group_by: Optional[str]) -> pd.DataFrame:
+        """
+        Frame mới chỉ gồm các cột spec dùng (x, group_by, y), dùng lại dữ liệu cột của df (không copy)
+
+        Cột x có chữ 'date' trong tên được parse thành datetime trên projection, df gốc giữ nguyên.
+        """
+        columns = {
+            c: df[c] for c in dict.fromkeys([x, group_by, *y_cols])
+            if c is not None and c in df.columns
+        }
+        if isinstance(x, str) and x in columns and "date" in x.lower():
+            try:
+                columns[x] = pd.to_datetime(columns[x], errors="coerce")
+            except Exception:
+                pass
+        return pd.DataFrame(columns, copy=False)
+
+    @staticmethod
+    def _top_n_positions(values: np.ndarray, n: int) -> np.ndarray:
+        """Vị trí n giá trị lớn nhất (giảm dần, NaN xếp cuối) bằng một lượt argpartition"""
+        values = np.where(np.isnan(values), -np.inf, values)
+        top = np.argpartition(values, len(values) - n)[len(values) - n:]
+        return top[np.argsort(-values[top], kind="stable")]
+
+    def _top_n(self, working: pd.DataFrame, value_col: str, n: int) -> pd.DataFrame:
+        """n dòng có value_col lớn nhất, giảm dần"""
+        values = working[value_col].to_numpy(dtype=np.float64)
+        return working.iloc[self._top_n_positions(values, n)]
+
+    def _top_n_with_others(self, working: pd.DataFrame, label_col: str, value_col: str, n: int) -> pd.DataFrame:
+        """n dòng lớn nhất + một dòng 'Others' là tổng phần còn lại (nếu > 0), cùng một lượt partition"""
+        values = working[value_col].to_numpy(dtype=np.float64)
+        top = self._top_n_positions(values, n)
+        top_frame = working.iloc[top]
+        others_sum = np.nansum(values) - np.nansum(values[top])
+        if others_sum > 0:
+            others_row = {label_col: 'Others', value_col: others_sum}
+            top_frame = pd.concat([top_frame, pd.DataFrame([others_row])], ignore_index=True)
+        return top_frame
+
+    def _scatter_figure(self, working: pd.DataFrame, x: str, y_cols: list, group_by: Optional[str], title: str) -> go.Figure:
+        """
+        Scatter chọn loại trace theo số điểm: SVG (Scatter) khi ít, WebGL (Scattergl) trên
+        VIZ_WEBGL_MIN_POINTS, density heatmap (cột y đầu tiên) trên VIZ_DENSITY_MIN_POINTS
+        """
+        points = len(working) * len(y_cols)
+        if points > VIZ_DENSITY_MIN_POINTS:
+            # Bin bằng NumPy, chỉ gửi lưới đếm (100 × 100) thay vì từng điểm
+            col = y_cols[0]
+            xy = working[[x, col]].dropna()
+            is_datetime = pd.api.types.is_datetime64_any_dtype(xy[x])
+            x_values = (
+                xy[x].to_numpy(dtype="datetime64[ns]").astype(np.int64) if is_datetime
+                else xy[x].to_numpy(dtype=np.float64)
+            )
+            counts, x_edges, y_edges = np.histogram2d(x_values, xy[col].to_numpy(dtype=np.float64), bins=100)
+            x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+            if is_datetime:
+                x_centers = pd.to_datetime(x_centers.astype(np.int64))
+            fig = go.Figure(go.Heatmap(
+                x=x_centers, y=(y_edges[:-1] + y_edges[1:]) / 2, z=counts.T,
+                colorscale="Blues", colorbar=dict(title="Count"),
+                hovertemplate="x: %{x}<br>y: %{y}<br>Count: %{z}<extra></extra>",
+            ))
+            fig.update_layout(
+                title=f"{title} (density of {len(working):,} points)",
+                xaxis_title=str(x), yaxis_title=str(col),
+            )
+            return fig
+
+        trace_cls = go.Scattergl if points > VIZ_WEBGL_MIN_POINTS else go.Scatter
+        fig = go.Figure()
+        if group_by and group_by in working.columns:
+            for name, part in working.groupby(group_by):
+                for col in y_cols:
+                    fig.add_trace(trace_cls(x=part[x], y=part[col], mode="markers", name=f"{name}-{col}"))
+        else:
+            for col in y_cols:
+                fig.add_trace(trace_cls(x=working[x], y=working[col], mode="markers", name=col))
+        fig.update_layout(
+            title=title, xaxis_title=str(x),
+            yaxis_title=str(y_cols[0]) if len(y_cols) == 1 else "Value",
+            showlegend=len(fig.data) > 1,
+        )
+        return fig
+
+    def _downsample_line_series(self, working: pd.DataFrame, x: str, y_cols: list, group_by: Optional[str]):
+        """
+        Tách working thành các series (theo group_by) và giảm điểm bằng LTTB khi vượt ngân sách
+
+        Mỗi series giữ tối đa VIZ_MAX_POINTS_PER_SERIES điểm, và tổng cộng khoảng VIZ_MAX_TOTAL_POINTS
+        điểm cho mọi trace, nên payload không tăng theo số dòng kết quả.
+
+        Returns:
+            ([(tên, frame)], tổng số dòng sau khi giảm)
+        """
+        if group_by and group_by in working.columns:
+            series = list(working.groupby(group_by))
+        else:
+            series = [(None, working)]
+        budget = min(
+            VIZ_MAX_POINTS_PER_SERIES,
+            max(VIZ_MAX_TOTAL_POINTS // max(len(series) * len(y_cols), 1), 50),
+        )
+        series = [(name, downsample_series(part, x, y_cols, budget)) for name, part in series]
+        return series, sum(len(part) for _, part in series)
+
+    def render_cached(self, df: pd.DataFrame, spec: Dict[str, Any]) -> Tuple[Optional[Any], bool]:
+        """
+        render_from_spec qua figure cache: cùng kết quả + cùng spec thì dựng lại từ JSON đã lưu
+
+        Chỉ Plotly figure được cache; figure matplotlib (fallback khi Plotly lỗi) trả về nguyên trạng.
+
+        Returns:
+            (figure, cache_hit)
+        """
+        if df is None or df.empty:
+            return None, False
+        key = figure_cache_key(df, spec)
+        fig_json = _figure_cache.get(key)
+        if fig_json is not None:
+            return pio.from_json(fig_json), True
+        fig = self.render_from_spec(df, spec)
+        if isinstance(fig, go.Figure):
+            _figure_cache.put(key, fig.to_json())
+        return fig, False
+
     @traceable(name="viz.plan_and_render")
     def plan_and_render(self, question: str, df: pd.DataFrame) -> Dict[str, Any]:
         spec = self.plan_chart(question, df)
-        fig = self.render_from_spec(df, spec)
-        return {"spec": spec, "figure": fig}
+        fig, cache_hit = self.render_cached(df, spec)
+        return {"spec": spec, "figure": fig, "figure_cache_hit": cache_hit}
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Analytics Snapshot Job - Tính sẵn stock cover, turnover, health summary, warehouse rollup
+và ghi snapshot Parquet có version dưới data/ để AnalyticsAgent đọc thay vì query lại
+
+Usage:
+    python analytics_snapshot_job.py --once                 # chạy một lần (cron)
+    python analytics_snapshot_job.py --interval 900         # chạy lặp mỗi 15 phút
+"""
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from configs.settings import ANALYTICS_SNAPSHOT_INTERVAL_SECONDS
+
+
+def run_once(agent, turnover_periods: List[int]) -> bool:
+    """Build + ghi một version snapshot, trả về True nếu thành công"""
+    t0 = time.perf_counter()
+    try:
+        path = agent.persist_snapshot(turnover_periods=turnover_periods)
+    except Exception as e:
+        print(f"❌ Analytics snapshot failed: {e}")
+        return False
+    print(f"✅ Analytics snapshot written to {path} in {time.perf_counter() - t0:.1f}s")
+    return True
+
+
+class SnapshotScheduler:
+    """
+    Scheduler chạy nền trong process (daemon thread) ghi snapshot định kỳ
+
+    Dùng chung AnalyticsAgent với app nên snapshot trong bộ nhớ cũng được làm mới.
+    """
+
+    def __init__(self, agent, interval_seconds: int = ANALYTICS_SNAPSHOT_INTERVAL_SECONDS,
+                 turnover_periods: Optional[List[int]] = None):
+        self.agent = agent
+        self.interval_seconds = interval_seconds
+        self.turnover_periods = turnover_periods or [90]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SnapshotScheduler":
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="analytics-snapshot", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            run_once(self.agent, self.turnover_periods)
+            self._stop.wait(self.interval_seconds)
+
+
+def main(argv: Optional[List[str]] = None) -> bool:
+    parser = argparse.ArgumentParser(description="Write versioned analytics snapshots (Parquet)")
+    parser.add_argument("--db-type", default="postgresql", choices=["postgresql", "duckdb"])
+    parser.add_argument("--once", action="store_true", help="Chạy một lần rồi thoát (cho cron)")
+    parser.add_argument("--interval", type=int, default=ANALYTICS_SNAPSHOT_INTERVAL_SECONDS,
+                        help="Số giây giữa hai lần chạy khi không có --once")
+    parser.add_argument("--turnover-periods", type=int, nargs="+", default=[90])
+    args = parser.parse_args(argv)
+
+    from agents.analytics_agent import AnalyticsAgent
+
+    agent = AnalyticsAgent(db_type=args.db_type)
+    if args.once:
+        return run_once(agent, args.turnover_periods)
+
+    print(f"⏰ Writing analytics snapshots every {args.interval}s (Ctrl+C to stop)")
+    try:
+        while True:
+            run_once(agent, args.turnover_periods)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped")
+    return True
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("📸 Analytics Snapshot Job")
+    print("=" * 60)
+    if not main():
+        sys.exit(1)
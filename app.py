@@ -1,6 +1,5 @@
 import os
 import time
-import datetime
 import json
 import pickle
 from html import escape
@@ -12,7 +11,13 @@ from dotenv import load_dotenv
 from agents.orchestrator import OrchestratorAgent
 # from agents.viz_agent import render_auto_chart  # Removed - no longer needed
 from db.connection import get_db, run_sql_unified
-from configs.settings import DEFAULT_DB_PATH, DEFAULT_MODEL, DEFAULT_EXAMPLES_PATH, RAG_TOP_K
+from configs.settings import DEFAULT_DB_PATH, DEFAULT_MODEL, DEFAULT_EXAMPLES_PATH, RAG_TOP_K, ANALYTICS_SNAPSHOT_SCHEDULER, CHART_STORE_DIR
+from configs.settings import CONVERSATION_LOG_DIR, CONVERSATION_LOAD_MESSAGES, CONVERSATION_MAX_MESSAGES, CONVERSATION_COMPACT_EVERY, CHART_EXPORT_WORKERS
+from utils.chart_export import save_chart_spec, load_chart_spec, ChartExporter
+from utils.conversation_store import (
+    ConversationStore, conversation_log_path, conversation_records, is_conversation_id,
+    legacy_conversation_records, list_conversations, new_conversation_id, restore_charts, serialize_charts,
+)
 
 # NEW: plotting for auto-visualize
 import matplotlib.pyplot as plt
@@ -32,106 +37,146 @@ load_dotenv()
 st.set_page_config(page_title="Multi-Agent for Inventory", layout="wide")
 
 # Config flags
-LOAD_SAVED_CHARTS = False  # Tạm thời bỏ load chart từ conversation/segments
+LOAD_SAVED_CHARTS = True  # Chart được lưu dạng tham chiếu tới figure JSON (CHART_STORE_DIR), load rất nhẹ
 
 # Initialize session state for chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_saved_chart(chart_ref):
+    """Figure JSON của chart đã lưu (cache theo chart_ref)"""
+    return load_chart_spec(chart_ref, CHART_STORE_DIR)
+
+@st.cache_resource
+def get_chart_exporter():
+    # One PNG export pool per process, shared by every session
+    return ChartExporter(CHART_STORE_DIR, max_workers=CHART_EXPORT_WORKERS)
+
+def render_png_download(chart_ref, widget_key):
+    """Nút xuất / tải PNG: chỉ xuất khi người dùng yêu cầu, chạy ở background"""
+    exporter = get_chart_exporter()
+    status = exporter.status(chart_ref)
+    if status == "done":
+        png = exporter.get(chart_ref)
+        if png:
+            st.download_button("⬇️ Download PNG", png, file_name=f"chart_{chart_ref}.png", mime="image/png", key=widget_key)
+            return
+    if status == "pending":
+        st.caption("🖼️ Exporting PNG in background...")
+        return
+    if status == "failed":
+        st.caption("⚠️ PNG export failed (kaleido required)")
+    if st.button("🖼️ Export PNG", key=widget_key):
+        exporter.submit(chart_ref)
+        st.caption("🖼️ Exporting PNG in background...")
+
+@st.cache_resource
+def get_conversation_log(conversation_id):
+    # One store per conversation: sessions showing the same conversation share its lock
+    return ConversationStore(
+        conversation_log_path(CONVERSATION_LOG_DIR, conversation_id),
+        max_messages=CONVERSATION_MAX_MESSAGES,
+        compact_every=CONVERSATION_COMPACT_EVERY,
+    )
+
+def current_conversation_id():
+    """Conversation của session này (giữ trong URL ?conversation=... để reload không mất lịch sử)"""
+    conversation_id = st.session_state.get("conversation_id")
+    if conversation_id is None:
+        requested = st.query_params.get("conversation")
+        conversation_id = requested if is_conversation_id(requested) else new_conversation_id()
+        st.session_state.conversation_id = conversation_id
+    if st.query_params.get("conversation") != conversation_id:
+        st.query_params["conversation"] = conversation_id
+    return conversation_id
+
+def get_conversation_store():
+    return get_conversation_log(current_conversation_id())
+
+def start_conversation(conversation_id=None):
+    """Chuyển session sang conversation khác (mới nếu không truyền id); log cũ được giữ nguyên"""
+    st.session_state.conversation_id = conversation_id or new_conversation_id()
+    st.query_params["conversation"] = st.session_state.conversation_id
+    st.session_state.messages = []
+    st.session_state.charts = []
+    st.session_state.persisted_messages = 0
+    st.session_state.has_older_messages = False
+    st.session_state.pop("conversation_window", None)
+
+def migrate_legacy_conversation():
+    """
+    Chuyển lịch sử dùng chung cũ (data/conversation.json, data/conversation.jsonl) thành
+    một conversation riêng trong CONVERSATION_LOG_DIR, chọn được trong sidebar
+    """
+    for legacy_path in ("data/conversation.json", "data/conversation.jsonl"):
+        if not os.path.exists(legacy_path):
+            continue
+        try:
+            conversation_id = f"migrated_{int(time.time())}_{os.path.basename(legacy_path).split('.')[-1]}"
+            store = get_conversation_log(conversation_id)
+            if legacy_path.endswith(".json"):
+                with open(legacy_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                store.rewrite(legacy_conversation_records(data))
+            else:
+                with open(legacy_path, "rb") as f:
+                    store.rewrite(ConversationStore._parse(f.read().split(b"\n")))
+            os.rename(legacy_path, f"{legacy_path}.migrated_{int(time.time())}")
+        except Exception as e:
+            st.warning(f"Could not migrate {legacy_path}: {e}")
+
 # Load conversation from file if exists
 def load_conversation():
-    """Load conversation from file"""
+    """Load the most recent messages (and their charts) from the conversation log"""
     try:
-        if os.path.exists("data/conversation.json"):
-            with open("data/conversation.json", "r", encoding="utf-8") as f:
-                content = f.read()
-                if not content.strip():
-                    st.warning("Conversation file is empty")
-                    return False
-                
-                try:
-                    data = json.loads(content)
-                except json.JSONDecodeError as e:
-                    st.error(f"Invalid JSON format in conversation file: {e}")
-                    # Try to backup and reset
-                    backup_file = f"data/conversation_backup_{int(time.time())}.json"
-                    os.rename("data/conversation.json", backup_file)
-                    st.info(f"Backed up corrupted file to {backup_file}")
-                    return False
-                
-                st.session_state.messages = data.get("messages", [])
+        migrate_legacy_conversation()
+        store = get_conversation_store()
+        window = st.session_state.get("conversation_window", CONVERSATION_LOAD_MESSAGES)
+        records, has_more = store.load_recent(window)
 
-                # Optionally skip loading saved charts
-                if LOAD_SAVED_CHARTS:
-                    charts = []
-                    for chart_data in data.get("charts", []):
-                        if "chart_png_base64" in chart_data:
-                            try:
-                                import base64
-                                png_bytes = base64.b64decode(chart_data["chart_png_base64"])
-                                charts.append({
-                                    "question": chart_data.get("question", ""),
-                                    "chart": None,
-                                    "chart_png": png_bytes,
-                                    "timestamp": chart_data.get("timestamp", time.time())
-                                })
-                            except Exception as e:
-                                st.warning(f"Could not load chart PNG: {e}")
-                                continue
-                    st.session_state.charts = charts
-                    st.success(f"✅ Loaded {len(charts)} charts from conversation")
-                else:
-                    st.session_state.charts = []
-                return True
+        messages, saved_charts = [], []
+        for record in records:
+            message = dict(record.get("message") or {})
+            if not message:
+                continue
+            # Optionally skip loading saved charts
+            if LOAD_SAVED_CHARTS and record.get("chart"):
+                message["chart_index"] = len(saved_charts)
+                saved_charts.append(record["chart"])
+            messages.append(message)
+
+        st.session_state.messages = messages
+        st.session_state.charts = restore_charts(saved_charts)
+        st.session_state.persisted_messages = len(messages)
+        st.session_state.has_older_messages = has_more
+        return bool(messages)
     except Exception as e:
         st.error(f"Error loading conversation: {e}")
-        # Try to backup corrupted file
-        if os.path.exists("data/conversation.json"):
-            try:
-                backup_file = f"data/conversation_backup_{int(time.time())}.json"
-                os.rename("data/conversation.json", backup_file)
-                st.info(f"Backed up corrupted file to {backup_file}")
-            except:
-                pass
     return False
 
 def save_conversation():
-    """Save conversation to file"""
+    """Append messages not yet in the conversation log (one record per message)"""
     try:
-        os.makedirs("data", exist_ok=True)
-        
-        # Convert charts to serializable format (PNG images)
-        serializable_charts = []
-        for chart_data in st.session_state.get("charts", []):
-            if chart_data and "chart_png" in chart_data:
-                try:
-                    import base64
-                    # Convert PNG bytes to base64 string for JSON storage
-                    if chart_data["chart_png"]:
-                        png_base64 = base64.b64encode(chart_data["chart_png"]).decode('utf-8')
-                        serializable_chart = {
-                            "question": chart_data.get("question", ""),
-                            "chart_png_base64": png_base64,
-                            "timestamp": chart_data.get("timestamp", time.time())
-                        }
-                        serializable_charts.append(serializable_chart)
-                except Exception as e:
-                    st.warning(f"Could not serialize chart PNG: {e}")
-                    continue
-        
-        data = {
-            "messages": st.session_state.messages,
-            "charts": serializable_charts,
-            "timestamp": time.time()
-        }
-        class DateTimeEncoder(json.JSONEncoder):
-            def default(self, obj):
-                if isinstance(obj, (pd.Timestamp, datetime.date, datetime.datetime)):
-                    return obj.isoformat()
-                return super().default(obj)
-
-        with open("data/conversation.json", "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
+        messages = st.session_state.messages
+        persisted = st.session_state.get("persisted_messages", 0)
+        if persisted > len(messages):
+            persisted = 0
+        get_conversation_store().append(
+            conversation_records(messages[persisted:], st.session_state.get("charts", []))
+        )
+        st.session_state.persisted_messages = len(messages)
+    except Exception as e:
+        st.error(f"Error saving conversation: {e}")
+
+def replace_conversation():
+    """Lưu lịch sử hiện tại của session (sau khi load chat segment) thành một conversation mới"""
+    try:
+        messages, charts = st.session_state.messages, st.session_state.get("charts", [])
+        start_conversation()
+        st.session_state.messages, st.session_state.charts = messages, charts
+        get_conversation_store().rewrite(conversation_records(messages, charts))
+        st.session_state.persisted_messages = len(messages)
     except Exception as e:
         st.error(f"Error saving conversation: {e}")
 
@@ -151,7 +196,7 @@ def save_chat_segment():
         segment_data = {
             "name": segment_name,
             "messages": st.session_state.messages,
-            "charts": st.session_state.get("charts", []),
+            "charts": serialize_charts(st.session_state.get("charts", [])),
             "timestamp": time.time(),
             "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
         }
@@ -213,7 +258,8 @@ def load_chat_segment(filename):
         
         # Load messages and charts
         st.session_state.messages = segment_data.get("messages", [])
-        st.session_state.charts = segment_data.get("charts", [])
+        st.session_state.charts = restore_charts(segment_data.get("charts", []))
+        replace_conversation()
         
         st.success(f"✅ Loaded chat segment: {segment_data.get('name', filename)}")
         st.rerun()
@@ -277,7 +323,12 @@ st.title("🤖 Multi-Agent for Inventory")
 # --- Initialize Orchestrator ---
 @st.cache_resource
 def get_orchestrator():
-    return OrchestratorAgent(db_type="postgresql")
+    orchestrator = OrchestratorAgent(db_type="postgresql")
+    if ANALYTICS_SNAPSHOT_SCHEDULER:
+        # Background job keeps a fresh analytics snapshot (memory + Parquet) for analytics questions
+        from analytics_snapshot_job import SnapshotScheduler
+        SnapshotScheduler(orchestrator.analytics_agent).start()
+    return orchestrator
 
 with st.sidebar:
     # Display University Logo
@@ -324,7 +375,7 @@ with st.sidebar:
                     segment_data = {
                         "name": segment_name.strip(),
                         "messages": st.session_state.messages,
-                        "charts": st.session_state.get("charts", []),
+                        "charts": serialize_charts(st.session_state.get("charts", [])),
                         "timestamp": time.time(),
                         "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
                     }
@@ -371,17 +422,21 @@ with st.sidebar:
                 st.error(f"DB error: {e}")
                 
     with col_clear:
-        if st.button("🗑️ Clear", use_container_width=True, help="Clear chat history"):
-            st.session_state.messages = []
-            st.session_state.charts = []
-            # Clear conversation file
-            if os.path.exists("data/conversation.json"):
-                try:
-                    os.remove("data/conversation.json")
-                except:
-                    pass
+        if st.button("🗑️ Clear", use_container_width=True, help="Start a new conversation (the old one stays in Conversations)"):
+            start_conversation()
             st.rerun()
     
+    # Resume an earlier conversation (each session writes only its own log)
+    conversations = list_conversations(CONVERSATION_LOG_DIR)
+    current_id = current_conversation_id()
+    if current_id not in conversations:
+        conversations.insert(0, current_id)
+    selected_id = st.selectbox("💬 Conversations", conversations, index=conversations.index(current_id))
+    if selected_id != current_id:
+        start_conversation(selected_id)
+        load_conversation()
+        st.rerun()
+    
     # Button dưới
     if st.button("🔄 Rebuild RAG Index", use_container_width=True):
         try:
@@ -412,6 +467,13 @@ with tab_text2sql:
     
     # Display chat history in the container
     with chat_container:
+        # Only the last CONVERSATION_LOAD_MESSAGES messages are loaded on startup
+        if st.session_state.get("has_older_messages"):
+            if st.button("⬆️ Load earlier messages"):
+                save_conversation()
+                st.session_state.conversation_window = len(st.session_state.messages) + CONVERSATION_LOAD_MESSAGES
+                load_conversation()
+                st.rerun()
         for i, message in enumerate(st.session_state.messages):
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
@@ -444,20 +506,30 @@ with tab_text2sql:
                         if chart_data:
                             st.subheader("📊 Visualization")
                             try:
+                                saved_json = None
+                                if chart_data.get("chart") is None and chart_data.get("chart_ref"):
+                                    saved_json = load_saved_chart(chart_data["chart_ref"])
                                 # Try to display as Plotly figure first (for new charts)
                                 if "chart" in chart_data and chart_data["chart"] is not None:
                                     st.plotly_chart(chart_data["chart"], use_container_width=True)
-                                # Display PNG image (for loaded charts)
-                                elif "chart_png" in chart_data and chart_data["chart_png"]:
+                                # Re-render loaded charts from their saved figure JSON
+                                elif saved_json:
+                                    import plotly.io as pio
+                                    st.plotly_chart(pio.from_json(saved_json), use_container_width=True)
+                                # Display PNG image (charts saved by older versions)
+                                elif chart_data.get("chart_png_base64"):
+                                    import base64
                                     # Display with better quality and layout preservation
                                     st.image(
-                                        chart_data["chart_png"], 
+                                        base64.b64decode(chart_data["chart_png_base64"]), 
                                         caption=chart_data.get("question", "Chart"), 
                                         use_container_width=True,
                                         channels="RGB"  # Ensure proper color channels
                                     )
                                 else:
                                     st.info("📊 Chart was saved but cannot be displayed")
+                                if chart_data.get("chart_ref"):
+                                    render_png_download(chart_data["chart_ref"], f"png_{chart_index}")
                             except Exception as e:
                                 st.error(f"Error displaying chart: {e}")
     
@@ -602,6 +674,8 @@ with tab_text2sql:
                         if result.get("intent") == "inventory_analytics" and result.get("analytics_type"):
                             analytics_type = result.get("analytics_type", "").replace("_", " ").title()
                             response_parts.append(f"📊 **Analytics Type:** {analytics_type}")
+                            if result.get("data_freshness"):
+                                response_parts.append(f"🕒 **Data freshness:** {result['data_freshness']}")
                         
                         # Add report summary
                         if "summary" in result and result["summary"]:
@@ -669,45 +743,31 @@ with tab_text2sql:
                                 from streamlit import plotly_chart
                                 st.plotly_chart(result["chart"], use_container_width=True)
                                 
-                                # Save chart as PNG for persistence
                                 if "charts" not in st.session_state:
                                     st.session_state.charts = []
                                 chart_index = len(st.session_state.charts)
                                 
-                                # Use Plotly's built-in download functionality for PNG
+                                # Persist the figure as compressed JSON (content-addressed sidecar), not a PNG
+                                chart_ref = None
                                 try:
-                                    import plotly.io as pio
-                                    # Use the same method as Plotly's download button
-                                    png_bytes = pio.to_image(
-                                        result["chart"], 
-                                        format="png",
-                                        width=800,  # Fixed width for consistency
-                                        height=600, # Fixed height for consistency
-                                        scale=1,    # Use default scale like download button
-                                        engine="kaleido"
-                                    )
-                                    chart_png = png_bytes
-                                except ImportError:
-                                    st.info("📊 Chart displayed successfully. Install 'kaleido' for PNG export.")
-                                    chart_png = None
+                                    chart_ref = save_chart_spec(result["chart"], CHART_STORE_DIR)
                                 except Exception as e:
-                                    # More specific error handling
-                                    if "kaleido" in str(e).lower():
-                                        st.info("📊 Chart displayed successfully. Run: pip install kaleido")
-                                    else:
-                                        st.warning(f"Chart PNG export failed: {str(e)[:100]}")
-                                    chart_png = None
+                                    st.warning(f"Could not save chart: {str(e)[:100]}")
                                 
                                 st.session_state.charts.append({
                                     "question": question,
                                     "chart": result["chart"],  # Keep original for display
-                                    "chart_png": chart_png,   # PNG bytes for persistence
+                                    "chart_ref": chart_ref,   # Figure JSON key in CHART_STORE_DIR
                                     "timestamp": time.time()
                                 })
                                 
                                 # Add chart index to message
                                 message_content["chart_index"] = chart_index
                                 
+                                # PNG only on request (background export), never on the answer path
+                                if chart_ref:
+                                    render_png_download(chart_ref, f"png_{chart_index}")
+                                
                             except Exception as e:
                                 # If it's a Plotly figure, we shouldn't try st.pyplot
                                 is_plotly = False
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Analytics Vectorization Micro-benchmark
+Compares the legacy row-wise pandas apply implementations of reorder urgency,
+stockout dates and action labels with the vectorized versions in AnalyticsAgent,
+from catalog size (300 SKU-warehouse rows) up to 1M rows
+
+Usage:
+    python -m benchmarks.analytics_vectorize --sizes 300 10000 1000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from agents.analytics_agent import (
+    compute_reorder_urgency,
+    compute_stockout_dates,
+    compute_action_required,
+)
+
+
+def make_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Synthetic stock cover frame with realistic cover days and lead times"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "stock_cover_days": np.round(rng.gamma(2.0, 20.0, rows), 2),
+        "average_lead_time_days": rng.integers(5, 60, rows).astype(np.float64),
+    })
+
+
+# Legacy implementations (row-wise apply), kept here only as the baseline
+def legacy_reorder_urgency(df: pd.DataFrame) -> pd.Series:
+    return df.apply(
+        lambda row: 'URGENT - Order Now!' if row['stock_cover_days'] <= row['average_lead_time_days']
+        else f'Order in {int(row["stock_cover_days"] - row["average_lead_time_days"])} days',
+        axis=1
+    )
+
+
+def legacy_stockout_dates(df: pd.DataFrame, today: datetime) -> pd.Series:
+    return df['stock_cover_days'].apply(lambda days: (today + timedelta(days=days)).strftime('%Y-%m-%d'))
+
+
+def legacy_action_required(df: pd.DataFrame) -> pd.Series:
+    before = df['stock_cover_days'] < df['average_lead_time_days']
+    return before.apply(
+        lambda x: '🚨 CRITICAL - Emergency order needed' if x else '⚠️ Monitor and plan reorder'
+    )
+
+
+def vectorized_reorder_urgency(df: pd.DataFrame) -> pd.Categorical:
+    return compute_reorder_urgency(df['stock_cover_days'], df['average_lead_time_days'])
+
+
+def vectorized_stockout_dates(df: pd.DataFrame, today: datetime) -> np.ndarray:
+    return compute_stockout_dates(df['stock_cover_days'], today)
+
+
+def vectorized_action_required(df: pd.DataFrame) -> pd.Categorical:
+    return compute_action_required(df['stock_cover_days'] < df['average_lead_time_days'])
+
+
+def _time_ms(fn: Callable, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best
+
+
+def run(sizes: List[int], legacy_max_rows: int, repeats: int) -> List[Dict]:
+    today = datetime.now()
+    cases = [
+        ("reorder_urgency", legacy_reorder_urgency, vectorized_reorder_urgency, False),
+        ("predicted_stockout_date", legacy_stockout_dates, vectorized_stockout_dates, True),
+        ("action_required", legacy_action_required, vectorized_action_required, False),
+    ]
+    results: List[Dict] = []
+    for rows in sizes:
+        df = make_frame(rows)
+        for name, legacy_fn, vector_fn, needs_today in cases:
+            args = (df, today) if needs_today else (df,)
+            vector_ms = _time_ms(lambda: vector_fn(*args), repeats)
+            legacy_ms: Optional[float] = None
+            matches: Optional[bool] = None
+            if rows <= legacy_max_rows:
+                legacy_ms = _time_ms(lambda: legacy_fn(*args), 1)
+                matches = bool(np.array_equal(
+                    np.asarray(legacy_fn(*args), dtype=object),
+                    np.asarray(vector_fn(*args), dtype=object),
+                ))
+            results.append({
+                "rows": rows,
+                "operation": name,
+                "legacy_ms": None if legacy_ms is None else round(legacy_ms, 3),
+                "vectorized_ms": round(vector_ms, 3),
+                "speedup": None if legacy_ms is None else round(legacy_ms / max(vector_ms, 1e-6), 1),
+                "outputs_match": matches,
+            })
+            legacy_txt = "skipped" if legacy_ms is None else f"{legacy_ms:10.1f}ms"
+            print(f"   {rows:>9,d} rows | {name:24s} | legacy {legacy_txt} | vectorized {vector_ms:8.2f}ms"
+                  + ("" if matches is None else f" | match={matches}"))
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> bool:
+    parser = argparse.ArgumentParser(description="Benchmark vectorized analytics transforms")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[300, 3_000, 30_000, 300_000, 1_000_000])
+    parser.add_argument("--legacy-max-rows", type=int, default=300_000,
+                        help="Skip the slow apply baseline above this size")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default=None, help="Optional JSON output path")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.legacy_max_rows, args.repeats)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": time.time(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"✅ Results written to {args.output}")
+    return all(r["outputs_match"] is not False for r in results)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("⚡ Analytics Vectorization Benchmark")
+    print("=" * 60)
+    if not main():
+        print("❌ Vectorized output differs from legacy output")
+        sys.exit(1)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Demand Forecast Benchmark
+Times the batched weekly-seasonal exponential smoothing fit + depletion projection
+on synthetic sparse sales for increasing numbers of (sku, warehouse) series
+
+Usage:
+    python -m benchmarks.demand_forecast --series 300 3000 10000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from configs.settings import FORECAST_HISTORY_DAYS, FORECAST_HORIZON_DAYS
+from agents.demand_forecast import forecast_stock_cover
+
+
+def make_inputs(num_series: int, history_days: int, sale_rate: float, seed: int = 42):
+    """Synthetic stock cover frame + sparse daily sales with a weekly pattern"""
+    rng = np.random.default_rng(seed)
+    series = pd.DataFrame({
+        "sku_id": [f"{i:06d}" for i in range(num_series)],
+        "warehouse_id": "BENCH1",
+        "current_inventory_quantity": rng.gamma(2.0, 200.0, num_series).round(),
+    })
+    dates = pd.date_range(end="2023-07-30", periods=history_days)
+    weekly = 1.0 + 0.5 * np.sin(2 * np.pi * np.arange(history_days) / 7)
+    sold = rng.random((history_days, num_series)) < sale_rate
+    day_idx, series_idx = np.nonzero(sold)
+    daily = pd.DataFrame({
+        "sku_id": series["sku_id"].to_numpy()[series_idx],
+        "warehouse_id": "BENCH1",
+        "order_date": dates[day_idx],
+        "qty": rng.poisson(20 * weekly[day_idx]).astype(np.float64),
+    })
+    return series, daily
+
+
+def run(series_counts: List[int], history_days: int, horizon_days: int, sale_rate: float, repeats: int) -> List[Dict]:
+    results: List[Dict] = []
+    for num_series in series_counts:
+        series, daily = make_inputs(num_series, history_days, sale_rate)
+        best = float("inf")
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            forecast = forecast_stock_cover(series, daily, history_days=history_days, horizon_days=horizon_days)
+            best = min(best, (time.perf_counter() - t0) * 1000)
+        depleting = int(forecast["forecast_cover_days"].notna().sum())
+        results.append({"series": num_series, "sales_rows": len(daily), "fit_ms": round(best, 2), "depleting": depleting})
+        print(f"   {num_series:>7,d} series | {len(daily):>9,d} sales rows | fit+project {best:8.1f}ms | {depleting} deplete within {horizon_days}d")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> bool:
+    parser = argparse.ArgumentParser(description="Benchmark batched demand forecasting")
+    parser.add_argument("--series", type=int, nargs="+", default=[300, 3_000, 10_000])
+    parser.add_argument("--history-days", type=int, default=FORECAST_HISTORY_DAYS)
+    parser.add_argument("--horizon-days", type=int, default=FORECAST_HORIZON_DAYS)
+    parser.add_argument("--sale-rate", type=float, default=0.1, help="Probability a series sells on a given day")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results = run(args.series, args.history_days, args.horizon_days, args.sale_rate, args.repeats)
+    return bool(results)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("📈 Demand Forecast Benchmark")
+    print("=" * 60)
+    if not main():
+        sys.exit(1)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+RAG Retrieval Benchmark
+Measures retrieval quality (recall@k, MRR) and latency/memory of each retriever
+configuration against labelled pairs from data/test_set.jsonl
+
+Usage:
+    python -m benchmarks.rag_retrieval --top-k 1 2 3 --backend dense hybrid
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from configs.settings import RAG_EMBEDDING_MODEL, RAG_SIMILARITY_THRESHOLD, RAG_TOP_K
+from rag.rag_retriever import RAGRetriever
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def sql_template(sql: str) -> str:
+    """Mask literals so that queries differing only by IDs/values compare equal"""
+    text = _STRING_LITERAL.sub("?", sql.strip().rstrip(";"))
+    text = _NUMBER_LITERAL.sub("?", text)
+    return " ".join(text.lower().split())
+
+
+def load_jsonl(path: str) -> List[Dict]:
+    rows: List[Dict] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "question" in obj and "sql" in obj:
+                rows.append(obj)
+    return rows
+
+
+def build_labelled_queries(test_path: str, examples_path: str) -> List[Dict]:
+    """
+    Label each test question with the indices of relevant examples
+
+    An example is relevant when it has the same question text or the same SQL
+    template (literals masked). Test rows without SQL (VISUALIZE/ANALYTICS markers)
+    or without any relevant example are skipped.
+    """
+    examples = load_jsonl(examples_path)
+    by_question: Dict[str, List[int]] = {}
+    by_template: Dict[str, List[int]] = {}
+    for idx, ex in enumerate(examples):
+        by_question.setdefault(ex["question"].strip().lower(), []).append(idx)
+        by_template.setdefault(sql_template(ex["sql"]), []).append(idx)
+
+    labelled: List[Dict] = []
+    for row in load_jsonl(test_path):
+        sql = row["sql"].strip()
+        if not sql.lower().startswith(("select", "with")):
+            continue
+        relevant = set(by_question.get(row["question"].strip().lower(), []))
+        relevant.update(by_template.get(sql_template(sql), []))
+        if relevant:
+            labelled.append({"question": row["question"], "relevant": sorted(relevant)})
+
+    return labelled
+
+
+def _percentiles(values_ms: List[float]) -> Dict[str, float]:
+    if not values_ms:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+    arr = np.asarray(values_ms)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "mean": round(float(arr.mean()), 3),
+    }
+
+
+def _max_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process (None where `resource` is unavailable, e.g. Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def _retrieve(retriever: RAGRetriever, backend: str, question: str, top_k: int, threshold: float, embedding) -> List[Dict]:
+    if backend == "hybrid":
+        return retriever.retrieve_hybrid_examples(question, top_k, threshold, query_embedding=embedding)
+    return retriever.retrieve_similar_examples(question, top_k, threshold, query_embedding=embedding)
+
+
+def run_config(
+    retriever: RAGRetriever,
+    example_index: Dict[str, int],
+    queries: List[Dict],
+    backend: str,
+    top_k: int,
+    threshold: float,
+    repeats: int,
+) -> Dict:
+    """
+    Run one retriever configuration over all labelled queries
+
+    Latency and quality come from an untraced pass; peak Python allocation is measured
+    in a separate pass under tracemalloc, whose hooks would otherwise slow the timed calls.
+    One untimed warm-up query runs first so one-off costs (loading the hybrid corpus,
+    model warm-up) do not land in the first timed sample.
+    """
+    encode_ms: List[float] = []
+    search_ms: List[float] = []
+    recalls: List[float] = []
+    reciprocal_ranks: List[float] = []
+    hits = 0
+
+    if queries:
+        warmup = queries[0]["question"]
+        _retrieve(retriever, backend, warmup, top_k, threshold, retriever.encode_query(warmup))
+
+    for query in queries:
+        for attempt in range(repeats):
+            t0 = time.perf_counter()
+            embedding = retriever.encode_query(query["question"])
+            t1 = time.perf_counter()
+            results = _retrieve(retriever, backend, query["question"], top_k, threshold, embedding)
+            t2 = time.perf_counter()
+            encode_ms.append((t1 - t0) * 1000)
+            search_ms.append((t2 - t1) * 1000)
+
+            if attempt > 0:
+                continue
+            retrieved = [example_index.get(r["question"].strip().lower(), -1) for r in results[:top_k]]
+            relevant = set(query["relevant"])
+            found = [rank for rank, idx in enumerate(retrieved, 1) if idx in relevant]
+            recalls.append(len(set(retrieved) & relevant) / len(relevant))
+            reciprocal_ranks.append(1.0 / found[0] if found else 0.0)
+            hits += 1 if found else 0
+
+    tracemalloc.start()
+    try:
+        for query in queries:
+            embedding = retriever.encode_query(query["question"])
+            _retrieve(retriever, backend, query["question"], top_k, threshold, embedding)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    n = len(queries) or 1
+    return {
+        "backend": backend,
+        "top_k": top_k,
+        "threshold": threshold,
+        f"recall@{top_k}": round(float(np.mean(recalls)) if recalls else 0.0, 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)) if reciprocal_ranks else 0.0, 4),
+        "hit_rate": round(hits / n, 4),
+        "encode_latency_ms": _percentiles(encode_ms),
+        "search_latency_ms": _percentiles(search_ms),
+        "python_peak_alloc_mb": round(peak_bytes / (1024 * 1024), 3),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> bool:
+    parser = argparse.ArgumentParser(description="Benchmark RAG retrieval quality and latency")
+    parser.add_argument("--test-set", default="data/test_set.jsonl")
+    parser.add_argument("--examples", default="data/examples.jsonl")
+    parser.add_argument("--top-k", type=int, nargs="+", default=sorted({1, RAG_TOP_K, 3}))
+    parser.add_argument("--threshold", type=float, nargs="+", default=[0.0, RAG_SIMILARITY_THRESHOLD])
+    parser.add_argument("--backend", nargs="+", choices=["dense", "hybrid"], default=["dense", "hybrid"])
+    parser.add_argument("--model", nargs="+", default=[RAG_EMBEDDING_MODEL])
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per query")
+    parser.add_argument("--output", default=None, help="JSON output path (default: data/benchmarks/rag_retrieval_<ts>.json)")
+    args = parser.parse_args(argv)
+
+    for path in (args.test_set, args.examples):
+        if not os.path.exists(path):
+            print(f"❌ File not found: {path}")
+            return False
+
+    queries = build_labelled_queries(args.test_set, args.examples)
+    if not queries:
+        print("❌ No labelled queries could be matched to examples")
+        return False
+    print(f"📋 {len(queries)} labelled queries")
+
+    results: List[Dict] = []
+    for model in args.model:
+        # Isolated index per model so embedding dimensions never mix with the app index
+        persist_dir = tempfile.mkdtemp(prefix="rag_bench_")
+        try:
+            rss_before = _max_rss_mb()
+            t0 = time.perf_counter()
+            retriever = RAGRetriever(
+                collection_name="bench_examples", model_name=model, persist_directory=persist_dir
+            )
+            build = retriever.build_index_from_examples(args.examples, force_rebuild=True)
+            t1 = time.perf_counter()
+            if not build["success"]:
+                print(f"❌ [{model}] index build failed: {build['error']}")
+                continue
+
+            example_index = {q.strip().lower(): i for i, q in enumerate(ex["question"] for ex in load_jsonl(args.examples))}
+            for backend, top_k, threshold in itertools.product(args.backend, args.top_k, args.threshold):
+                result = run_config(retriever, example_index, queries, backend, top_k, threshold, args.repeats)
+                result.update({
+                    "model": model,
+                    "index_build_s": round(t1 - t0, 3),
+                    "max_rss_mb": _max_rss_mb(),
+                    "rss_before_model_mb": rss_before,
+                })
+                results.append(result)
+                print(
+                    f"   {model} | {backend:6s} | k={top_k} | thr={threshold:.2f} | "
+                    f"recall={result[f'recall@{top_k}']:.3f} | mrr={result['mrr']:.3f} | "
+                    f"encode p95={result['encode_latency_ms']['p95']:.1f}ms | "
+                    f"search p95={result['search_latency_ms']['p95']:.1f}ms"
+                )
+        finally:
+            shutil.rmtree(persist_dir, ignore_errors=True)
+
+    output = args.output or f"data/benchmarks/rag_retrieval_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "timestamp": time.time(),
+            "test_set": args.test_set,
+            "examples": args.examples,
+            "num_queries": len(queries),
+            "repeats": args.repeats,
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ Results written to {output}")
+    return bool(results)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("📏 RAG Retrieval Benchmark")
+    print("=" * 60)
+    if not main():
+        sys.exit(1)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Stockout Simulation Benchmark
+Times the Monte Carlo stockout probability (bootstrapped demand × random lead time)
+on synthetic sparse demand for increasing numbers of (sku, warehouse) series
+
+Usage:
+    python -m benchmarks.stockout_simulation --series 300 3000 --trials 10000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from configs.settings import FORECAST_HISTORY_DAYS, STOCKOUT_SIMULATION_BLOCK_DAYS
+from agents.stockout_simulation import simulate_stockout
+
+
+def make_inputs(num_series: int, history_days: int, sale_rate: float, seed: int = 42):
+    """Synthetic on-hand, sparse daily demand matrix and lead times (15-120 days)"""
+    rng = np.random.default_rng(seed)
+    sold = rng.random((history_days, num_series)) < sale_rate
+    demand = np.where(sold, rng.poisson(20, (history_days, num_series)), 0).astype(np.float64)
+    avg_lead = rng.choice([15.0, 30.0, 45.0, 60.0, 90.0, 120.0], num_series)
+    max_lead = avg_lead * rng.uniform(1.2, 1.6, num_series)
+    on_hand = rng.gamma(2.0, 200.0, num_series).round()
+    return on_hand, demand, avg_lead, max_lead
+
+
+def run(series_counts: List[int], trials: int, history_days: int, sale_rate: float) -> List[Dict]:
+    results: List[Dict] = []
+    for num_series in series_counts:
+        on_hand, demand, avg_lead, max_lead = make_inputs(num_series, history_days, sale_rate)
+        t0 = time.perf_counter()
+        simulated = simulate_stockout(
+            on_hand, demand, avg_lead, max_lead,
+            trials=trials, block_days=STOCKOUT_SIMULATION_BLOCK_DAYS, seed=0,
+        )
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        at_risk = int((simulated["stockout_probability"] >= 0.5).sum())
+        results.append({"series": num_series, "trials": trials, "sim_ms": round(elapsed_ms, 2), "at_risk": at_risk})
+        print(f"   {num_series:>7,d} series | {trials:>7,d} trials | simulate {elapsed_ms:9.1f}ms | {at_risk} with P(stockout) >= 50%")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> bool:
+    parser = argparse.ArgumentParser(description="Benchmark Monte Carlo stockout simulation")
+    parser.add_argument("--series", type=int, nargs="+", default=[300, 3_000])
+    parser.add_argument("--trials", type=int, default=10_000)
+    parser.add_argument("--history-days", type=int, default=FORECAST_HISTORY_DAYS)
+    parser.add_argument("--sale-rate", type=float, default=0.1, help="Probability a series sells on a given day")
+    args = parser.parse_args(argv)
+
+    results = run(args.series, args.trials, args.history_days, args.sale_rate)
+    return bool(results)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("🎲 Stockout Simulation Benchmark")
+    print("=" * 60)
+    if not main():
+        sys.exit(1)
@@ -14,6 +14,65 @@ USE_SEMANTIC_SEARCH = os.getenv("INV_USE_SEMANTIC_SEARCH", "true").lower() == "t
 RAG_SIMILARITY_THRESHOLD = float(os.getenv("INV_RAG_SIMILARITY_THRESHOLD", "0.3"))
 RAG_EMBEDDING_MODEL = os.getenv("INV_RAG_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 CHROMA_PERSIST_DIR = os.getenv("INV_CHROMA_PERSIST_DIR", "data/chroma_db")
+# Hybrid retrieval: "hybrid" (BM25 + dense + MMR) or "dense" (ChromaDB cosine only)
+RAG_RETRIEVAL_MODE = os.getenv("INV_RAG_RETRIEVAL_MODE", "hybrid").lower()
+RAG_HYBRID_ALPHA = float(os.getenv("INV_RAG_HYBRID_ALPHA", "0.6"))  # weight of dense score
+RAG_MMR_LAMBDA = float(os.getenv("INV_RAG_MMR_LAMBDA", "0.7"))  # 1.0 = relevance only
+RAG_HYBRID_CANDIDATES = int(os.getenv("INV_RAG_HYBRID_CANDIDATES", "20"))
+RAG_CORPUS_REFRESH_SECONDS = float(os.getenv("INV_RAG_CORPUS_REFRESH_SECONDS", "60"))  # how often hybrid mode re-checks the collection for external rebuilds
+
+# Analytics
+# Seconds an analytics snapshot (stock cover/turnover) is reused before re-querying
+ANALYTICS_SNAPSHOT_TTL_SECONDS = int(os.getenv("INV_ANALYTICS_SNAPSHOT_TTL", "300"))
+# Versioned Parquet snapshots written by analytics_snapshot_job.py and served when fresh enough
+ANALYTICS_SNAPSHOT_DIR = os.getenv("INV_ANALYTICS_SNAPSHOT_DIR", "data/analytics_snapshots")
+ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("INV_ANALYTICS_SNAPSHOT_MAX_AGE", "3600"))  # 0 = never read from disk
+ANALYTICS_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("INV_ANALYTICS_SNAPSHOT_INTERVAL", "900"))
+ANALYTICS_SNAPSHOT_KEEP = int(os.getenv("INV_ANALYTICS_SNAPSHOT_KEEP", "5"))
+# Run the snapshot job inside the Streamlit process instead of (or in addition to) cron
+ANALYTICS_SNAPSHOT_SCHEDULER = os.getenv("INV_ANALYTICS_SNAPSHOT_SCHEDULER", "false").lower() == "true"
+# Sales source for window analytics: "daily_sales_agg" (pre-aggregated per day) or "sales" (raw rows)
+ANALYTICS_SALES_SOURCE = os.getenv("INV_ANALYTICS_SALES_SOURCE", "daily_sales_agg")
+# Demand forecast (weekly-seasonal exponential smoothing) used for predicted stockout dates
+FORECAST_HISTORY_DAYS = int(os.getenv("INV_FORECAST_HISTORY_DAYS", "120"))
+FORECAST_HORIZON_DAYS = int(os.getenv("INV_FORECAST_HORIZON_DAYS", "90"))
+FORECAST_ALPHA = float(os.getenv("INV_FORECAST_ALPHA", "0.3"))  # level smoothing
+FORECAST_GAMMA = float(os.getenv("INV_FORECAST_GAMMA", "0.1"))  # weekly seasonal smoothing
+FORECAST_INTERMITTENT_ALPHA = float(os.getenv("INV_FORECAST_INTERMITTENT_ALPHA", "0.1"))  # Croston-SBA smoothing for sparse series
+# Safety stock / reorder point
+SAFETY_STOCK_SERVICE_LEVEL = float(os.getenv("INV_SAFETY_STOCK_SERVICE_LEVEL", "0.95"))
+REORDER_REVIEW_DAYS = int(os.getenv("INV_REORDER_REVIEW_DAYS", "30"))  # demand covered after reorder point
+# Monte Carlo stockout simulation (demand bootstrapped in blocks, lead time ~ U(average, maximum))
+STOCKOUT_SIMULATION_TRIALS = int(os.getenv("INV_STOCKOUT_SIMULATION_TRIALS", "10000"))
+STOCKOUT_SIMULATION_BLOCK_DAYS = int(os.getenv("INV_STOCKOUT_SIMULATION_BLOCK_DAYS", "7"))
+STOCKOUT_SIMULATION_SEED = int(os.getenv("INV_STOCKOUT_SIMULATION_SEED", "42"))
+
+# DuckDB (db_type="duckdb"): CSV sources are converted once to Parquet and queried in-process
+DUCKDB_CSV_DIR = os.getenv("INV_DUCKDB_CSV_DIR", "data")
+DUCKDB_PARQUET_DIR = os.getenv("INV_DUCKDB_PARQUET_DIR", "data/parquet")
+
+# Visualization: line series above the budget are downsampled (LTTB) before reaching Plotly
+VIZ_MAX_POINTS_PER_SERIES = int(os.getenv("INV_VIZ_MAX_POINTS_PER_SERIES", "1000"))
+VIZ_MAX_TOTAL_POINTS = int(os.getenv("INV_VIZ_MAX_TOTAL_POINTS", "20000"))
+# Scatter/line charts switch to WebGL traces (Scattergl) above this many points, scatter to a density heatmap above the second
+VIZ_WEBGL_MIN_POINTS = int(os.getenv("INV_VIZ_WEBGL_MIN_POINTS", "2000"))
+VIZ_DENSITY_MIN_POINTS = int(os.getenv("INV_VIZ_DENSITY_MIN_POINTS", "100000"))
+# Rule-based chart plans at or above this confidence skip the LLM planner
+VIZ_RULE_MIN_CONFIDENCE = float(os.getenv("INV_VIZ_RULE_MIN_CONFIDENCE", "0.8"))
+# Visualize results up to this many rows are fetched as-is; larger ones get the chart's GROUP BY pushed into SQL
+VIZ_SQL_PROBE_ROWS = int(os.getenv("INV_VIZ_SQL_PROBE_ROWS", "1000"))
+# Built figures (Plotly JSON) cached per (result fingerprint, chart spec), LRU-evicted above this size
+VIZ_FIGURE_CACHE_MB = int(os.getenv("INV_VIZ_FIGURE_CACHE_MB", "64"))
+# Saved charts: Plotly figure JSON (gzip), one file per figure hash, referenced from conversations/segments
+CHART_STORE_DIR = os.getenv("INV_CHART_STORE_DIR", "data/charts")
+# Background threads exporting chart PNGs (kaleido), only when a PNG is requested (download)
+CHART_EXPORT_WORKERS = int(os.getenv("INV_CHART_EXPORT_WORKERS", "1"))
+# Conversation history: one append-only JSONL log per conversation (one record per message), only the last N messages load on startup
+CONVERSATION_LOG_DIR = os.getenv("INV_CONVERSATION_LOG_DIR", "data/conversations")
+CONVERSATION_LOAD_MESSAGES = int(os.getenv("INV_CONVERSATION_LOAD_MESSAGES", "50"))
+# Every N appends the log is compacted (partial lines dropped); with MAX_MESSAGES > 0 older messages move to <log>.archive (0 = keep all in the log)
+CONVERSATION_COMPACT_EVERY = int(os.getenv("INV_CONVERSATION_COMPACT_EVERY", "100"))
+CONVERSATION_MAX_MESSAGES = int(os.getenv("INV_CONVERSATION_MAX_MESSAGES", "0"))
 
 # Safety/Policy
 SELECT_ONLY = True
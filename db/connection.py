@@ -1,7 +1,10 @@
+import logging
 import os
+import re
 import sqlite3
+import threading
 import pandas as pd
-from typing import Tuple, Optional, Union
+from typing import Tuple, Optional, Union, Dict, Any, List, Iterator
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
@@ -9,6 +12,8 @@ from langchain_community.utilities import SQLDatabase
 
 from utils.logger import traceable
 
+logger = logging.getLogger(__name__)
+
 
 def get_postgres_url() -> str:
 	"""Tạo PostgreSQL connection URL từ environment variables"""
@@ -20,6 +25,20 @@ def get_postgres_url() -> str:
 	return f"postgresql://{user}:{password}@{host}:{port}/{database}"
 
 
+def get_data_source_id(db_type: str) -> str:
+	"""Định danh nguồn dữ liệu (không chứa user/password), ví dụ để gắn vào analytics snapshot"""
+	db_type = db_type.lower()
+	if db_type == "postgresql":
+		host = os.getenv('DB_HOST', 'localhost')
+		port = os.getenv('DB_PORT', '5432')
+		database = os.getenv('DB_NAME', 'inventory_db')
+		return f"postgresql://{host}:{port}/{database}"
+	if db_type == "duckdb":
+		from configs.settings import DUCKDB_PARQUET_DIR
+		return f"duckdb:{os.path.abspath(DUCKDB_PARQUET_DIR)}"
+	return db_type
+
+
 def get_sqlalchemy_url(db_path: str, db_type: str = "sqlite") -> str:
 	"""Tạo SQLAlchemy URL cho SQLite hoặc PostgreSQL"""
 	if db_type.lower() == "postgresql":
@@ -78,14 +97,14 @@ def run_sql(db: SQLDatabase, sql: str) -> Tuple[pd.DataFrame, Optional[str]]:
 
 
 @traceable(name="sql.exec.sqlite")
-def run_sqlite(db_path: str, sql: str) -> Tuple[pd.DataFrame, Optional[str]]:
+def run_sqlite(db_path: str, sql: str, params: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, Optional[str]]:
 	first_token = sql.strip().lower()
 	if not (first_token.startswith("select") or first_token.startswith("with")):
 		return pd.DataFrame(), "Only SELECT statements are allowed for safety."
 	try:
 		conn = sqlite3.connect(db_path)
 		try:
-			df = pd.read_sql_query(sql, conn)
+			df = pd.read_sql_query(sql, conn, params=params)
 			return df, None
 		finally:
 			conn.close()
@@ -93,33 +112,193 @@ def run_sqlite(db_path: str, sql: str) -> Tuple[pd.DataFrame, Optional[str]]:
 		return pd.DataFrame(), str(e)
 
 
+# Pooled engine dùng chung cho mọi query PostgreSQL (tránh tạo engine/kết nối mới mỗi lần)
+_postgres_engine = None
+_postgres_engine_lock = threading.Lock()
+
+# :name bind placeholders (không bắt cast kiểu "::numeric")
+_BIND_PARAM = re.compile(r"(?<![:\w\\]):(\w+)")
+
+
+def get_postgres_engine():
+	"""SQLAlchemy engine (connection pool) dùng chung cho PostgreSQL"""
+	global _postgres_engine
+	if _postgres_engine is None:
+		with _postgres_engine_lock:
+			if _postgres_engine is None:
+				from sqlalchemy import create_engine
+				_postgres_engine = create_engine(get_postgres_url(), pool_pre_ping=True)
+	return _postgres_engine
+
+
+def to_positional_params(sql: str) -> Tuple[str, List[str]]:
+	"""
+	Đổi placeholder :name sang $1, $2... cho PREPARE
+
+	Returns:
+		(sql với $n, danh sách tên tham số theo thứ tự $n)
+	"""
+	names: List[str] = []
+
+	def _replace(match: "re.Match") -> str:
+		name = match.group(1)
+		if name not in names:
+			names.append(name)
+		return f"${names.index(name) + 1}"
+
+	return _BIND_PARAM.sub(_replace, sql), names
+
+
+def _read_prepared(conn, statement_name: str, sql: str, params: Dict[str, Any]) -> pd.DataFrame:
+	"""
+	Chạy query qua server-side prepared statement gắn với kết nối trong pool
+
+	PREPARE chỉ chạy lần đầu trên mỗi kết nối (ghi nhớ trong conn.info, tồn tại
+	qua các lần checkout), các lần sau chỉ EXECUTE nên server bỏ qua parse/plan.
+	"""
+	from sqlalchemy import text
+
+	positional_sql, names = to_positional_params(sql)
+	prepared = conn.info.setdefault("prepared_statements", {})
+	if prepared.get(statement_name) != sql:
+		dbapi_conn = conn.connection.dbapi_connection
+		with dbapi_conn.cursor() as cur:
+			if statement_name in prepared:
+				cur.execute(f"DEALLOCATE {statement_name}")
+				prepared.pop(statement_name, None)
+			cur.execute(f"PREPARE {statement_name} AS {positional_sql}")
+		prepared[statement_name] = sql
+
+	args = ", ".join(f":{name}" for name in names)
+	execute_sql = f"EXECUTE {statement_name}({args})" if names else f"EXECUTE {statement_name}"
+	return pd.read_sql_query(text(execute_sql), conn, params={name: params.get(name) for name in names})
+
+
+def _deallocate_prepared(conn, statement_name: str) -> None:
+	"""
+	DEALLOCATE prepared statement trên server rồi quên tên trong conn.info
+
+	Prepared statement không bị rollback xóa; nếu không DEALLOCATE, PREPARE lần sau
+	trên kết nối này sẽ lỗi "already exists". Bỏ qua nếu statement chưa từng được PREPARE.
+	"""
+	conn.info.get("prepared_statements", {}).pop(statement_name, None)
+	try:
+		conn.exec_driver_sql(f"DEALLOCATE {statement_name}")
+	except Exception:
+		conn.rollback()
+
+
 @traceable(name="sql.exec.postgres")
-def run_postgres(sql: str) -> Tuple[pd.DataFrame, Optional[str]]:
-    """Chạy SQL query trên PostgreSQL database"""
+def run_postgres(
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    statement_name: Optional[str] = None,
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Chạy SQL query trên PostgreSQL database
+
+    Args:
+        sql: SELECT/WITH query, có thể chứa bind params dạng :name
+        params: Giá trị bind params
+        statement_name: Tên prepared statement để tái sử dụng plan trên mỗi kết nối pool
+    """
     first_token = sql.strip().lower()
     if not (first_token.startswith("select") or first_token.startswith("with")):
         return pd.DataFrame(), "Only SELECT statements are allowed for safety."
     
     try:
-        # Sử dụng biến môi trường để hỗ trợ Docker
-        host = os.getenv('DB_HOST', 'localhost')
-        port = os.getenv('DB_PORT', '5432')
-        database = os.getenv('DB_NAME', 'inventory_db')
-        user = os.getenv('DB_USER', 'inventory_user')
-        password = os.getenv('DB_PASSWORD', 'inventory_pass')
-        
-        # Sử dụng SQLAlchemy thay vì psycopg2 trực tiếp
-        from sqlalchemy import create_engine
-        engine = create_engine(f"postgresql://{user}:{password}@{host}:{port}/{database}")
-        df = pd.read_sql_query(sql, engine)
+        from sqlalchemy import text
+        engine = get_postgres_engine()
+        with engine.connect() as conn:
+            if statement_name:
+                try:
+                    return _read_prepared(conn, statement_name, sql, params or {}), None
+                except Exception as prepare_error:
+                    # Ví dụ: pooler không hỗ trợ PREPARE -> chạy query tham số hóa bình thường
+                    logger.warning(f"⚠️ Prepared statement '{statement_name}' failed, running unprepared: {prepare_error}")
+                    conn.rollback()
+                    _deallocate_prepared(conn, statement_name)
+            if params:
+                df = pd.read_sql_query(text(sql), conn, params=params)
+            else:
+                df = pd.read_sql_query(sql, conn)
         return df, None
     except Exception as e:
         return pd.DataFrame(), str(e)
 
 
-def run_sql_unified(sql: str, db_type: str = "postgresql") -> Tuple[pd.DataFrame, Optional[str]]:
-	"""Chạy SQL query trên database được chỉ định"""
+@traceable(name="sql.exec.duckdb")
+def run_duckdb(sql: str, params: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, Optional[str]]:
+	"""
+	Chạy SQL query trên DuckDB (các bảng là view trên Parquet chuyển từ CSV)
+
+	Bind params dạng :name được đổi sang $name của DuckDB.
+	"""
+	first_token = sql.strip().lower()
+	if not (first_token.startswith("select") or first_token.startswith("with")):
+		return pd.DataFrame(), "Only SELECT statements are allowed for safety."
+	try:
+		from db.duckdb_engine import run_duckdb_query
+
+		names = set(_BIND_PARAM.findall(sql))
+		duck_sql = _BIND_PARAM.sub(lambda m: f"${m.group(1)}", sql)
+		duck_params = {name: value for name, value in (params or {}).items() if name in names}
+		return run_duckdb_query(duck_sql, duck_params or None), None
+	except Exception as e:
+		return pd.DataFrame(), str(e)
+
+
+def run_sql_unified(
+	sql: str,
+	db_type: str = "postgresql",
+	params: Optional[Dict[str, Any]] = None,
+	statement_name: Optional[str] = None,
+) -> Tuple[pd.DataFrame, Optional[str]]:
+	"""
+	Chạy SQL query trên database được chỉ định
+
+	Args:
+		sql: SELECT/WITH query, bind params dạng :name
+		db_type: "postgresql", "duckdb" hoặc "sqlite"
+		params: Giá trị bind params
+		statement_name: (PostgreSQL) tên prepared statement để tái sử dụng
+	"""
 	if db_type.lower() == "postgresql":
-		return run_postgres(sql)
+		return run_postgres(sql, params=params, statement_name=statement_name)
+	elif db_type.lower() == "duckdb":
+		return run_duckdb(sql, params=params)
 	else:
-		return run_sqlite("data/inventory.db", sql)
+		return run_sqlite("data/inventory.db", sql, params=params)
+
+
+def iter_sql_unified(sql: str, db_type: str = "postgresql", chunk_rows: int = 1000) -> Iterator[pd.DataFrame]:
+	"""
+	Chạy SQL một lần và trả kết quả theo từng khối (generator)
+
+	Người gọi có thể dừng sớm (close()) khi đã đủ dữ liệu, query không bị chạy lại để lấy
+	phần còn lại. Khối đầu tiên luôn được trả (kể cả khi rỗng) để biết tên cột; lỗi SQL
+	được raise khi lấy khối đầu tiên.
+
+	Args:
+		sql: SELECT/WITH query (không có bind params)
+		db_type: "postgresql", "duckdb" hoặc "sqlite"
+		chunk_rows: Số dòng mỗi khối (PostgreSQL / SQLite; DuckDB dùng khối 2048 dòng)
+	"""
+	first_token = sql.strip().lower()
+	if not (first_token.startswith("select") or first_token.startswith("with")):
+		raise ValueError("Only SELECT statements are allowed for safety.")
+	if db_type.lower() == "duckdb":
+		from db.duckdb_engine import iter_duckdb_query
+		yield from iter_duckdb_query(sql)
+		return
+	if db_type.lower() == "postgresql":
+		# Server-side cursor: các dòng chưa đọc không bị tải về khi dừng sớm
+		with get_postgres_engine().connect().execution_options(stream_results=True) as conn:
+			yield from pd.read_sql_query(sql, conn, chunksize=chunk_rows)
+		return
+	conn = sqlite3.connect("data/inventory.db")
+	try:
+		yield from pd.read_sql_query(sql, conn, chunksize=chunk_rows)
+	finally:
+		conn.close()
+
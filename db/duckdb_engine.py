@@ -0,0 +1,198 @@
+"""
+DuckDB Engine - Chạy analytics SQL trực tiếp trên dữ liệu CSV (chuyển sang Parquet một lần)
+Không cần PostgreSQL: mỗi bảng của schema PostgreSQL là một view trên file Parquet
+"""
+
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from configs.settings import DUCKDB_CSV_DIR, DUCKDB_PARQUET_DIR
+
+
+# Bảng -> (file CSV, {cột CSV: cột bảng}); tên cột giống hệt schema trong init.sql
+TABLE_SPECS: Dict[str, Tuple[str, Dict[str, str]]] = {
+    "warehouses": ("warehouse.csv", {
+        "Warehouse Code": "warehouse_code",
+        "City": "city",
+        "Province": "province",
+        "Country": "country",
+        "Latitude": "latitude",
+        "Longitude": "longitude",
+    }),
+    "skus": ("sku.csv", {
+        "SKU ID": "sku_id",
+        "SKU Name": "sku_name",
+    }),
+    "inventory": ("inventory.csv", {
+        "SKU ID": "sku_id",
+        "Vendor Name": "vendor_name",
+        "Warehouse ID": "warehouse_id",
+        "Current Inventory Quantity": "current_inventory_quantity",
+        "Cost per SKU": "cost_per_sku",
+        "Total Value": "total_value",
+        "Units (Nos/Kg)": "units",
+        "Average Lead Time (days)": "average_lead_time_days",
+        "Maximum Lead Time (days)": "maximum_lead_time_days",
+        "Unit Price": "unit_price",
+    }),
+    "sales": ("sales.csv", {
+        "Order Number ": "order_number",  # Có space thừa trong tên cột
+        "Order Date": "order_date",
+        "SKU ID": "sku_id",
+        "Warehouse ID": "warehouse_id",
+        "Customer Type": "customer_type",
+        "Order Quantity": "order_quantity",
+        "Unit Sale Price": "unit_sale_price",
+        "Revenue": "revenue",
+    }),
+}
+
+# Bảng dẫn xuất từ sales, giữ cùng định nghĩa với daily_sales_agg trong init.sql
+DAILY_SALES_AGG_SQL = """
+SELECT sku_id, warehouse_id, order_date,
+       SUM(order_quantity) AS qty, SUM(revenue) AS revenue, CAST(COUNT(*) AS INTEGER) AS orders
+FROM read_parquet('{sales_path}')
+GROUP BY sku_id, warehouse_id, order_date
+"""
+
+VIEW_SQL = {
+    "inventory_summary": """
+        SELECT i.sku_id, s.sku_name, i.warehouse_id, w.city, w.province, i.vendor_name,
+               i.current_inventory_quantity, i.cost_per_sku, i.total_value, i.unit_price
+        FROM inventory i
+        JOIN skus s ON i.sku_id = s.sku_id
+        JOIN warehouses w ON i.warehouse_id = w.warehouse_code
+    """,
+    "sales_summary": """
+        SELECT sa.order_date, sa.sku_id, s.sku_name, sa.warehouse_id, w.city, w.province,
+               sa.customer_type, sa.order_quantity, sa.unit_sale_price, sa.revenue
+        FROM sales sa
+        JOIN skus s ON sa.sku_id = s.sku_id
+        JOIN warehouses w ON sa.warehouse_id = w.warehouse_code
+    """,
+}
+
+_duckdb_conn = None
+_duckdb_lock = threading.Lock()
+
+
+def _is_stale(target: str, sources: List[str]) -> bool:
+    if not os.path.exists(target):
+        return True
+    target_mtime = os.path.getmtime(target)
+    return any(os.path.getmtime(src) > target_mtime for src in sources)
+
+
+def export_csv_to_parquet(
+    csv_dir: str = DUCKDB_CSV_DIR,
+    parquet_dir: str = DUCKDB_PARQUET_DIR,
+    force: bool = False,
+) -> Dict[str, str]:
+    """
+    Chuyển các file CSV sang Parquet (chỉ khi CSV mới hơn Parquet hoặc force=True)
+
+    Dữ liệu được chuẩn hóa giống migrate_to_postgres.py (strip chuỗi, order_date kiểu DATE).
+
+    Returns:
+        {tên bảng: đường dẫn Parquet}, gồm cả daily_sales_agg
+    """
+    import duckdb
+
+    os.makedirs(parquet_dir, exist_ok=True)
+    paths: Dict[str, str] = {}
+    con = duckdb.connect()
+    try:
+        for table, (csv_file, columns) in TABLE_SPECS.items():
+            csv_path = os.path.join(csv_dir, csv_file)
+            parquet_path = os.path.join(parquet_dir, f"{table}.parquet")
+            paths[table] = parquet_path
+            if not force and not _is_stale(parquet_path, [csv_path]):
+                continue
+
+            df = pd.read_csv(csv_path)[list(columns)].rename(columns=columns)
+            # pandas 3 reads text as the "str" dtype, which select_dtypes(include=["object"]) will stop matching
+            for col in df.columns:
+                if pd.api.types.is_string_dtype(df[col]):
+                    df[col] = df[col].str.strip()
+            if "order_date" in df.columns:
+                df["order_date"] = pd.to_datetime(df["order_date"]).dt.date
+
+            con.register("csv_frame", df)
+            con.execute(f"COPY (SELECT * FROM csv_frame) TO '{parquet_path}' (FORMAT PARQUET)")
+            con.unregister("csv_frame")
+            print(f"✅ {csv_path} -> {parquet_path} ({len(df)} rows)")
+
+        agg_path = os.path.join(parquet_dir, "daily_sales_agg.parquet")
+        paths["daily_sales_agg"] = agg_path
+        if force or _is_stale(agg_path, [paths["sales"]]):
+            con.execute(
+                f"COPY ({DAILY_SALES_AGG_SQL.format(sales_path=paths['sales'])}) "
+                f"TO '{agg_path}' (FORMAT PARQUET)"
+            )
+    finally:
+        con.close()
+    return paths
+
+
+def get_duckdb_connection():
+    """
+    Kết nối DuckDB in-memory dùng chung, mỗi bảng là view trên file Parquet
+
+    Lần đầu gọi sẽ tạo/cập nhật file Parquet từ CSV.
+    """
+    global _duckdb_conn
+    if _duckdb_conn is None:
+        with _duckdb_lock:
+            if _duckdb_conn is None:
+                import duckdb
+
+                paths = export_csv_to_parquet()
+                con = duckdb.connect()
+                for table, path in paths.items():
+                    con.execute(f"CREATE OR REPLACE VIEW {table} AS SELECT * FROM read_parquet('{path}')")
+                for view, sql in VIEW_SQL.items():
+                    con.execute(f"CREATE OR REPLACE VIEW {view} AS {sql}")
+                _duckdb_conn = con
+    return _duckdb_conn
+
+
+def reset_duckdb_connection() -> None:
+    """Đóng kết nối dùng chung (lần gọi sau sẽ kiểm tra lại CSV và tạo lại view)"""
+    global _duckdb_conn
+    with _duckdb_lock:
+        if _duckdb_conn is not None:
+            _duckdb_conn.close()
+            _duckdb_conn = None
+
+
+def run_duckdb_query(sql: str, params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Chạy query trên DuckDB; bind params dạng $name (mỗi thread dùng cursor riêng)
+    """
+    cursor = get_duckdb_connection().cursor()
+    try:
+        if params:
+            return cursor.execute(sql, params).df()
+        return cursor.execute(sql).df()
+    finally:
+        cursor.close()
+
+
+def iter_duckdb_query(sql: str) -> Iterator[pd.DataFrame]:
+    """
+    Chạy query một lần và trả kết quả theo từng khối (2048 dòng mỗi khối, khối đầu luôn có tên cột)
+    """
+    cursor = get_duckdb_connection().cursor()
+    try:
+        cursor.execute(sql)
+        chunk = cursor.fetch_df_chunk()
+        yield chunk
+        while len(chunk):
+            chunk = cursor.fetch_df_chunk()
+            if len(chunk):
+                yield chunk
+    finally:
+        cursor.close()
@@ -50,6 +50,8 @@ run_migration() {
         fi
     else
         echo "✅ Data already exists ($data_count warehouses found). Skipping migration."
+        echo "🧮 Ensuring daily_sales_agg aggregate table..."
+        python migrate_to_postgres.py --agg-only || echo "⚠️ daily_sales_agg setup failed, analytics will read raw sales"
     fi
 }
 
@@ -63,6 +63,9 @@ CREATE TABLE IF NOT EXISTS sales (
     FOREIGN KEY (warehouse_id) REFERENCES warehouses(warehouse_code)
 );
 
+-- Bảng tổng hợp daily_sales_agg + triggers (nguồn DDL duy nhất, dùng chung với migrate_to_postgres.py)
+\ir sql/daily_sales_agg.sql
+
 -- Tạo indexes để tối ưu performance
 CREATE INDEX IF NOT EXISTS idx_inventory_sku_warehouse ON inventory(sku_id, warehouse_id);
 CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(order_date);
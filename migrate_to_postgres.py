@@ -7,6 +7,7 @@ import pandas as pd
 import psycopg2
 from psycopg2.extras import execute_values
 import os
+import argparse
 from typing import List, Dict, Any
 import logging
 
@@ -23,6 +24,10 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', 'inventory_pass')
 }
 
+# DDL cho bảng tổng hợp daily_sales_agg + triggers (cùng file init.sql include)
+# Chạy lại được nhiều lần, dùng cho database đã khởi tạo trước khi có bảng này
+DAILY_SALES_AGG_DDL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "daily_sales_agg.sql")
+
 def connect_to_db():
     """Kết nối đến PostgreSQL database"""
     try:
@@ -150,8 +155,9 @@ def load_sales(conn):
     
     # Insert vào database (batch processing cho file lớn)
     with conn.cursor() as cur:
-        # Xóa dữ liệu cũ
-        cur.execute("DELETE FROM sales")
+        # Xóa dữ liệu cũ: TRUNCATE không dựng transition table cho cả bảng như DELETE,
+        # trigger TRUNCATE làm rỗng daily_sales_agg, các batch INSERT bên dưới cộng dồn lại
+        cur.execute("TRUNCATE sales")
         
         # Insert dữ liệu mới theo batch
         batch_size = 1000
@@ -179,13 +185,66 @@ def load_sales(conn):
         
     logger.info(f"✅ Đã load {len(df)} sales records vào database")
 
+def ensure_daily_sales_agg(conn):
+    """Tạo bảng daily_sales_agg và triggers nếu chưa có"""
+    logger.info("🧮 Đang kiểm tra bảng daily_sales_agg...")
+    with conn.cursor() as cur:
+        with open(DAILY_SALES_AGG_DDL_PATH, "r", encoding="utf-8") as f:
+            cur.execute(f.read())
+    conn.commit()
+
+# Tổng số đơn / qty / revenue và checksum theo key (sku, warehouse, ngày) của sales và của daily_sales_agg
+# Checksum bắt được cả đơn bị dời sang ngày/sku khác mà tổng không đổi
+DAILY_SALES_AGG_CHECK_SQL = """
+SELECT
+    (SELECT ROW(COUNT(*), COALESCE(SUM(order_quantity), 0), COALESCE(SUM(revenue), 0),
+                COALESCE(SUM(hashtext(sku_id || '|' || warehouse_id || '|' || order_date)::bigint), 0))
+     FROM sales)::text,
+    (SELECT ROW(COALESCE(SUM(orders), 0), COALESCE(SUM(qty), 0), COALESCE(SUM(revenue), 0),
+                COALESCE(SUM(hashtext(sku_id || '|' || warehouse_id || '|' || order_date)::bigint * orders), 0))
+     FROM daily_sales_agg)::text
+"""
+
+def daily_sales_agg_is_consistent(conn) -> bool:
+    """daily_sales_agg khớp với sales (số đơn, qty, revenue, checksum theo key)"""
+    with conn.cursor() as cur:
+        cur.execute(DAILY_SALES_AGG_CHECK_SQL)
+        from_sales, from_agg = cur.fetchone()
+    return from_sales == from_agg
+
+def refresh_daily_sales_agg(conn, only_if_stale: bool = True):
+    """
+    Tính lại toàn bộ daily_sales_agg từ bảng sales
+
+    Args:
+        only_if_stale: Chỉ backfill khi bảng tổng hợp không khớp với sales (ví dụ rỗng, hoặc sales
+            bị sửa trước khi có triggers); khớp rồi thì triggers đã cập nhật tăng dần
+    """
+    if only_if_stale and daily_sales_agg_is_consistent(conn):
+        conn.commit()
+        logger.info("✅ daily_sales_agg khớp với sales, bỏ qua backfill")
+        return
+    
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM daily_sales_agg")
+        cur.execute("""
+        INSERT INTO daily_sales_agg (sku_id, warehouse_id, order_date, qty, revenue, orders)
+        SELECT sku_id, warehouse_id, order_date, SUM(order_quantity), SUM(revenue), COUNT(*)
+        FROM sales
+        GROUP BY sku_id, warehouse_id, order_date
+        """)
+        rows = cur.rowcount
+        conn.commit()
+    
+    logger.info(f"✅ Đã tổng hợp {rows:,} dòng vào daily_sales_agg")
+
 def verify_data(conn):
     """Kiểm tra dữ liệu đã load"""
     logger.info("🔍 Đang kiểm tra dữ liệu...")
     
     with conn.cursor() as cur:
         # Đếm records trong mỗi bảng
-        tables = ['warehouses', 'skus', 'inventory', 'sales']
+        tables = ['warehouses', 'skus', 'inventory', 'sales', 'daily_sales_agg']
         for table in tables:
             cur.execute(f"SELECT COUNT(*) FROM {table}")
             count = cur.fetchone()[0]
@@ -224,12 +283,25 @@ def verify_data(conn):
 
 def main():
     """Hàm main để chạy migration"""
+    parser = argparse.ArgumentParser(description="Migrate CSV data to PostgreSQL")
+    parser.add_argument("--agg-only", action="store_true",
+                        help="Chỉ tạo daily_sales_agg và backfill nếu không khớp với sales, không load lại CSV")
+    args = parser.parse_args()
+    
     logger.info("🚀 Bắt đầu migration dữ liệu sang PostgreSQL...")
     
     try:
         # Kết nối database
         conn = connect_to_db()
         
+        # Bảng tổng hợp + triggers phải có trước khi load sales
+        ensure_daily_sales_agg(conn)
+        
+        if args.agg_only:
+            refresh_daily_sales_agg(conn, only_if_stale=True)
+            logger.info("🎉 daily_sales_agg đã sẵn sàng!")
+            return
+        
         # Load dữ liệu theo thứ tự (để tránh lỗi foreign key)
         load_warehouses(conn)
         load_skus(conn)
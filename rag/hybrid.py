@@ -0,0 +1,184 @@
+"""
+Hybrid retrieval utilities - BM25 keyword scoring, score fusion and MMR re-ranking
+Used by RAGRetriever to combine exact keyword matches (SKU IDs, column names)
+with dense semantic similarity and to pick diverse few-shot examples
+"""
+
+import math
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+# Very common words carry no signal for example selection
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "at", "to", "by", "with", "and", "or",
+    "is", "are", "was", "what", "which", "who", "how", "show", "me", "all", "each",
+    "select", "from", "where", "as", "order", "group",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenize text for keyword matching
+
+    Keeps identifiers such as SKU IDs ("1009aa") and column names ("warehouse_id")
+    as whole tokens and also indexes their snake_case parts.
+    """
+    tokens: List[str] = []
+    for token in _TOKEN_PATTERN.findall((text or "").lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part and part not in _STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory BM25 (Okapi) index built on an inverted index of postings
+    """
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        """
+        Build BM25 index
+
+        Args:
+            documents: Raw document texts (question + SQL of each example)
+            k1: Term frequency saturation parameter
+            b: Document length normalization parameter
+        """
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(documents)
+
+        # term -> (doc indices, term frequencies)
+        postings: Dict[str, Dict[int, int]] = {}
+        doc_lengths = np.zeros(self.num_docs, dtype=np.float64)
+        for doc_idx, doc in enumerate(documents):
+            tokens = tokenize(doc)
+            doc_lengths[doc_idx] = len(tokens)
+            for token in tokens:
+                term_postings = postings.setdefault(token, {})
+                term_postings[doc_idx] = term_postings.get(doc_idx, 0) + 1
+
+        self.doc_lengths = doc_lengths
+        self.avg_doc_length = float(doc_lengths.mean()) if self.num_docs else 0.0
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            term: (
+                np.fromiter(docs.keys(), dtype=np.int64, count=len(docs)),
+                np.fromiter(docs.values(), dtype=np.float64, count=len(docs)),
+            )
+            for term, docs in postings.items()
+        }
+        self.idf: Dict[str, float] = {
+            term: math.log(1 + (self.num_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            for term, (doc_ids, _) in self.postings.items()
+        }
+
+    def score(self, query: str) -> np.ndarray:
+        """
+        Score every document against the query
+
+        Returns:
+            Array of BM25 scores aligned with the indexed documents
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float64)
+        if not self.num_docs or self.avg_doc_length == 0:
+            return scores
+
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / self.avg_doc_length)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            doc_ids, tfs = self.postings[term]
+            scores[doc_ids] += self.idf[term] * tfs * (self.k1 + 1) / (tfs + length_norm[doc_ids])
+        return scores
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize embedding rows so that dot products are cosine similarities"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def fuse_scores(dense_scores: np.ndarray, bm25_scores: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    Fuse dense cosine similarity with BM25 scores
+
+    BM25 is scaled to [0, 1] by its maximum, so the best keyword match always gains
+    (1 - alpha); the fused score ranks candidates but is not a similarity to threshold on.
+
+    Args:
+        dense_scores: Cosine similarity per document
+        bm25_scores: Raw BM25 score per document
+        alpha: Weight of dense similarity (1.0 = dense only, 0.0 = BM25 only)
+    """
+    max_bm25 = float(bm25_scores.max()) if bm25_scores.size else 0.0
+    bm25_norm = bm25_scores / max_bm25 if max_bm25 > 0 else np.zeros_like(bm25_scores)
+    return alpha * dense_scores + (1 - alpha) * bm25_norm
+
+
+def select_candidates(
+    dense_scores: np.ndarray, fused_scores: np.ndarray, similarity_threshold: float, pool_size: int
+) -> np.ndarray:
+    """
+    Candidate pool for MMR: documents whose dense cosine similarity passes the threshold,
+    ordered by fused score (best first) and capped at pool_size
+
+    The threshold applies to the dense component only, so it keeps its cosine meaning
+    regardless of how BM25 is scaled.
+    """
+    candidates = np.flatnonzero(dense_scores >= similarity_threshold)
+    order = np.argsort(-fused_scores[candidates], kind="stable")
+    return candidates[order][:pool_size]
+
+
+def mmr_select(
+    embeddings: np.ndarray, relevance: np.ndarray, top_k: int, mmr_lambda: float = 0.7
+) -> List[int]:
+    """
+    Maximal Marginal Relevance re-ranking
+
+    Greedily picks documents that are relevant but not redundant with already
+    selected ones. Pairwise similarities are computed once as a matrix and the
+    max-similarity-to-selected vector is updated incrementally.
+
+    Args:
+        embeddings: L2-normalized candidate embeddings (n x d)
+        relevance: Relevance score per candidate (n,)
+        top_k: Number of candidates to select
+        mmr_lambda: Trade-off between relevance (1.0) and diversity (0.0)
+
+    Returns:
+        Indices of selected candidates in selection order
+    """
+    num_candidates = len(relevance)
+    if num_candidates == 0 or top_k <= 0:
+        return []
+
+    similarity = embeddings @ embeddings.T
+    max_sim_to_selected = np.full(num_candidates, -np.inf)
+    available = np.ones(num_candidates, dtype=bool)
+    selected: List[int] = []
+
+    for _ in range(min(top_k, num_candidates)):
+        if selected:
+            mmr_scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_sim_to_selected
+        else:
+            mmr_scores = relevance.astype(np.float64)
+        mmr_scores = np.where(available, mmr_scores, -np.inf)
+        best = int(np.argmax(mmr_scores))
+        selected.append(best)
+        available[best] = False
+        max_sim_to_selected = np.maximum(max_sim_to_selected, similarity[best])
+
+    return selected
@@ -5,17 +5,33 @@ Provides semantic search capabilities for better example retrieval
 
 import os
 import json
+import time
 import chromadb
-from typing import List, Dict, Tuple
+import numpy as np
+from typing import List, Dict, Tuple, Optional
 from sentence_transformers import SentenceTransformer
 from utils.logger import traceable
+from rag.hybrid import BM25Index, normalize_rows, fuse_scores, mmr_select, select_candidates
 from configs.settings import (
     RAG_EMBEDDING_MODEL,
     CHROMA_PERSIST_DIR,
     RAG_TOP_K,
     RAG_SIMILARITY_THRESHOLD,
+    RAG_RETRIEVAL_MODE,
+    RAG_HYBRID_ALPHA,
+    RAG_MMR_LAMBDA,
+    RAG_HYBRID_CANDIDATES,
+    RAG_CORPUS_REFRESH_SECONDS,
 )
 
+# Cosine space so that `1 - distance` is the same cosine similarity hybrid mode thresholds on
+COLLECTION_METADATA = {"description": "SQL examples for RAG", "hnsw:space": "cosine"}
+
+
+def uses_cosine_space(collection) -> bool:
+    """Collections created before the cosine switch use Chroma's default L2 space"""
+    return (collection.metadata or {}).get("hnsw:space") == "cosine"
+
 
 class RAGRetriever:
     """
@@ -46,13 +62,19 @@ class RAGRetriever:
         # Initialize ChromaDB client
         self.client = chromadb.PersistentClient(path=persist_directory)
 
+        # In-memory corpus for hybrid retrieval (loaded lazily from the collection)
+        self._corpus: Optional[Dict] = None
+        self._corpus_checked_at = 0.0
+
         # Get or create collection
         try:
             self.collection = self.client.get_collection(name=collection_name)
             print(f"✅ Loaded existing ChromaDB collection: {collection_name}")
+            if not uses_cosine_space(self.collection):
+                print(f"⚠️ Collection {collection_name} uses L2 distance, it will be rebuilt with cosine space on the next index build")
         except Exception:
             self.collection = self.client.create_collection(
-                name=collection_name, metadata={"description": "SQL examples for RAG"}
+                name=collection_name, metadata=COLLECTION_METADATA
             )
             print(f"🆕 Created new ChromaDB collection: {collection_name}")
 
@@ -85,7 +107,7 @@ class RAGRetriever:
                     # Count examples in file
                     file_count = self._count_examples_in_file(examples_path)
 
-                    if existing_count == file_count and existing_count > 0:
+                    if existing_count == file_count and existing_count > 0 and uses_cosine_space(existing_collection):
                         print(
                             f"✅ ChromaDB collection is up to date ({existing_count} examples)"
                         )
@@ -102,10 +124,11 @@ class RAGRetriever:
             print(f"🔄 Building ChromaDB index from {examples_path}...")
 
             # Clear existing collection
+            self._corpus = None
             try:
                 self.client.delete_collection(self.collection_name)
                 self.collection = self.client.create_collection(
-                    name=self.collection_name, metadata={"description": "SQL examples for RAG"}
+                    name=self.collection_name, metadata=COLLECTION_METADATA
                 )
             except Exception:
                 pass
@@ -153,6 +176,8 @@ class RAGRetriever:
                 ],
                 ids=ids,
             )
+            # Drop any corpus loaded while the rebuild was in progress
+            self._corpus = None
 
             print(f"✅ Successfully indexed {len(examples)} examples in ChromaDB")
 
@@ -189,9 +214,17 @@ class RAGRetriever:
             pass
         return count
 
+    def encode_query(self, query: str) -> np.ndarray:
+        """Encode a query into an L2-normalized embedding vector"""
+        return normalize_rows(self.embedding_model.encode([query]))[0]
+
     @traceable(name="rag.retrieve")
     def retrieve_similar_examples(
-        self, query: str, top_k: int = RAG_TOP_K, similarity_threshold: float = RAG_SIMILARITY_THRESHOLD
+        self,
+        query: str,
+        top_k: int = RAG_TOP_K,
+        similarity_threshold: float = RAG_SIMILARITY_THRESHOLD,
+        query_embedding: Optional[np.ndarray] = None,
     ) -> List[Dict]:
         """
         Retrieve similar examples using semantic search
@@ -200,35 +233,41 @@ class RAGRetriever:
             query: User question to find similar examples for
             top_k: Number of similar examples to retrieve
             similarity_threshold: Minimum similarity score threshold
+            query_embedding: Pre-computed query embedding (skips encoding)
 
         Returns:
             List of similar examples with metadata
         """
         try:
             # Generate embedding for query
-            query_embedding = self.embedding_model.encode([query]).tolist()
+            if query_embedding is None:
+                query_embedding = self.embedding_model.encode([query])
+            query_embedding = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
 
             # Search in ChromaDB
+            cosine_space = uses_cosine_space(self.collection)
             results = self.collection.query(
-                query_embeddings=query_embedding,
+                query_embeddings=query_embedding.tolist(),
                 n_results=top_k,
-                include=["documents", "metadatas", "distances"],
+                include=["documents", "metadatas", "distances"] + ([] if cosine_space else ["embeddings"]),
             )
+            if cosine_space:
+                similarities = [1 - distance for distance in results["distances"][0]]
+            elif results["documents"] and results["documents"][0]:
+                # Legacy L2 collection: score with cosine on the embeddings, as hybrid mode does
+                similarities = (normalize_rows(results["embeddings"][0]) @ normalize_rows(query_embedding)[0]).tolist()
 
             # Process results
             similar_examples: List[Dict] = []
 
             if results["documents"] and results["documents"][0]:
-                for i, (doc, metadata, distance) in enumerate(
+                for i, (doc, metadata, similarity) in enumerate(
                     zip(
                         results["documents"][0],
                         results["metadatas"][0],
-                        results["distances"][0],
+                        similarities,
                     )
                 ):
-                    # Convert distance to similarity score (ChromaDB uses cosine distance)
-                    similarity = 1 - distance
-
                     if similarity >= similarity_threshold:
                         similar_examples.append(
                             {
@@ -245,9 +284,110 @@ class RAGRetriever:
             print(f"❌ Error retrieving examples: {str(e)}")
             return []
 
+    def _load_corpus(self) -> Dict:
+        """
+        Load all indexed examples and their embeddings into memory and build BM25
+
+        Rebuilds in this process drop the cached corpus directly. Rebuilds from another
+        process (new collection id or size) are picked up by re-checking the collection
+        at most every RAG_CORPUS_REFRESH_SECONDS, so queries reuse the cached handle.
+        """
+        now = time.monotonic()
+        if self._corpus is not None and now - self._corpus_checked_at < RAG_CORPUS_REFRESH_SECONDS:
+            return self._corpus
+        self._corpus_checked_at = now
+
+        collection = self.client.get_collection(name=self.collection_name)
+        version = (str(collection.id), collection.count())
+        if self._corpus is not None and self._corpus["version"] == version:
+            return self._corpus
+        self.collection = collection
+
+        data = self.collection.get(include=["embeddings", "documents", "metadatas"])
+        questions = list(data.get("documents") or [])
+        metadatas = list(data.get("metadatas") or [])
+        sqls = [meta.get("sql", "") for meta in metadatas]
+        embeddings = data.get("embeddings")
+        if embeddings is None or len(questions) == 0:
+            embeddings = np.zeros((0, 1), dtype=np.float32)
+
+        self._corpus = {
+            "version": version,
+            "questions": questions,
+            "sqls": sqls,
+            "embeddings": normalize_rows(embeddings) if len(questions) else np.zeros((0, 1), dtype=np.float32),
+            # Index question and SQL so exact identifiers/column names can match
+            "bm25": BM25Index([f"{q} {sql}" for q, sql in zip(questions, sqls)]),
+        }
+        return self._corpus
+
+    @traceable(name="rag.retrieve_hybrid")
+    def retrieve_hybrid_examples(
+        self,
+        query: str,
+        top_k: int = RAG_TOP_K,
+        similarity_threshold: float = RAG_SIMILARITY_THRESHOLD,
+        alpha: float = RAG_HYBRID_ALPHA,
+        mmr_lambda: float = RAG_MMR_LAMBDA,
+        candidate_pool: int = RAG_HYBRID_CANDIDATES,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> List[Dict]:
+        """
+        Retrieve examples with hybrid BM25 + dense scoring and MMR diversity re-ranking
+
+        Args:
+            query: User question to find similar examples for
+            top_k: Number of examples to retrieve
+            similarity_threshold: Minimum dense (cosine) similarity; the fused score only ranks
+            alpha: Weight of dense similarity in the fused score
+            mmr_lambda: Relevance/diversity trade-off for MMR
+            candidate_pool: Number of top fused candidates passed to MMR
+            query_embedding: Pre-computed normalized query embedding (skips encoding)
+
+        Returns:
+            List of selected examples with scores
+        """
+        try:
+            corpus = self._load_corpus()
+            if not corpus["questions"]:
+                return []
+
+            if query_embedding is None:
+                query_embedding = self.encode_query(query)
+            dense_scores = corpus["embeddings"] @ np.asarray(query_embedding, dtype=np.float32)
+            bm25_scores = corpus["bm25"].score(query)
+            fused = fuse_scores(dense_scores, bm25_scores, alpha)
+
+            # Candidate pool: dense similarity above threshold, ranked by fused score
+            candidates = select_candidates(dense_scores, fused, similarity_threshold, max(candidate_pool, top_k))
+            if candidates.size == 0:
+                return []
+
+            picked = mmr_select(corpus["embeddings"][candidates], fused[candidates], top_k, mmr_lambda)
+
+            return [
+                {
+                    "question": corpus["questions"][idx],
+                    "sql": corpus["sqls"][idx],
+                    "similarity": float(dense_scores[idx]),
+                    "bm25_score": float(bm25_scores[idx]),
+                    "hybrid_score": float(fused[idx]),
+                    "rank": rank + 1,
+                }
+                for rank, idx in enumerate(candidates[picked])
+            ]
+
+        except Exception as e:
+            print(f"❌ Error retrieving hybrid examples: {str(e)}")
+            return []
+
     @traceable(name="rag.build_fewshot_prompt")
     def build_fewshot_prompt(
-        self, query: str, top_k: int = RAG_TOP_K, similarity_threshold: float = RAG_SIMILARITY_THRESHOLD
+        self,
+        query: str,
+        top_k: int = RAG_TOP_K,
+        similarity_threshold: float = RAG_SIMILARITY_THRESHOLD,
+        mode: str = RAG_RETRIEVAL_MODE,
     ) -> Tuple[str, Dict]:
         """
         Build few-shot prompt with semantically similar examples
@@ -256,12 +396,18 @@ class RAGRetriever:
             query: User question
             top_k: Number of examples to retrieve
             similarity_threshold: Minimum similarity threshold
+            mode: "hybrid" (BM25 + dense + MMR) or "dense"
 
         Returns:
             Tuple of (fewshot_text, metadata)
         """
         # Retrieve similar examples
-        similar_examples = self.retrieve_similar_examples(query, top_k, similarity_threshold)
+        if mode == "hybrid":
+            similar_examples = self.retrieve_hybrid_examples(query, top_k, similarity_threshold)
+            retrieval_method = "hybrid_bm25_mmr"
+        else:
+            similar_examples = self.retrieve_similar_examples(query, top_k, similarity_threshold)
+            retrieval_method = "semantic_search"
 
         if not similar_examples:
             return "", {"selected_examples": [], "similarity_scores": []}
@@ -278,9 +424,11 @@ class RAGRetriever:
         metadata = {
             "selected_examples": [ex["question"] for ex in similar_examples],
             "similarity_scores": [ex["similarity"] for ex in similar_examples],
-            "retrieval_method": "semantic_search",
+            "retrieval_method": retrieval_method,
             "model_name": self.model_name,
         }
+        if mode == "hybrid":
+            metadata["hybrid_scores"] = [ex["hybrid_score"] for ex in similar_examples]
 
         return fewshot_text, metadata
 
@@ -299,10 +447,11 @@ class RAGRetriever:
 
     def clear_collection(self) -> bool:
         """Clear all examples from the collection"""
+        self._corpus = None
         try:
             self.client.delete_collection(self.collection_name)
             self.collection = self.client.create_collection(
-                name=self.collection_name, metadata={"description": "SQL examples for RAG"}
+                name=self.collection_name, metadata=COLLECTION_METADATA
             )
             print(f"🗑️ Cleared collection: {self.collection_name}")
             return True
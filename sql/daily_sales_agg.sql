@@ -0,0 +1,115 @@
+-- Bảng tổng hợp doanh số theo ngày (sku, warehouse, ngày) cho các phân tích theo cửa sổ thời gian
+-- Nguồn DDL duy nhất: init.sql include file này (\ir), migrate_to_postgres.py đọc và chạy lại (idempotent)
+-- Được cập nhật tăng dần bởi statement-level triggers trên bảng sales: INSERT / UPDATE / DELETE / TRUNCATE
+CREATE TABLE IF NOT EXISTS daily_sales_agg (
+    sku_id VARCHAR(10) NOT NULL,
+    warehouse_id VARCHAR(10) NOT NULL,
+    order_date DATE NOT NULL,
+    qty DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    revenue DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    orders INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (sku_id, warehouse_id, order_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_daily_sales_agg_date ON daily_sales_agg(order_date);
+
+CREATE OR REPLACE FUNCTION daily_sales_agg_on_insert() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO daily_sales_agg (sku_id, warehouse_id, order_date, qty, revenue, orders)
+    SELECT sku_id, warehouse_id, order_date, SUM(order_quantity), SUM(revenue), COUNT(*)
+    FROM new_rows
+    GROUP BY sku_id, warehouse_id, order_date
+    ON CONFLICT (sku_id, warehouse_id, order_date) DO UPDATE SET
+        qty = daily_sales_agg.qty + EXCLUDED.qty,
+        revenue = daily_sales_agg.revenue + EXCLUDED.revenue,
+        orders = daily_sales_agg.orders + EXCLUDED.orders;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION daily_sales_agg_on_delete() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE daily_sales_agg a SET
+        qty = a.qty - d.qty,
+        revenue = a.revenue - d.revenue,
+        orders = a.orders - d.orders
+    FROM (
+        SELECT sku_id, warehouse_id, order_date,
+               SUM(order_quantity) AS qty, SUM(revenue) AS revenue, COUNT(*) AS orders
+        FROM old_rows
+        GROUP BY sku_id, warehouse_id, order_date
+    ) d
+    WHERE a.sku_id = d.sku_id AND a.warehouse_id = d.warehouse_id AND a.order_date = d.order_date;
+    -- Chỉ xóa các key vừa bị trừ mà không còn đơn nào (không quét cả bảng tổng hợp)
+    DELETE FROM daily_sales_agg a
+    USING (SELECT DISTINCT sku_id, warehouse_id, order_date FROM old_rows) d
+    WHERE a.sku_id = d.sku_id AND a.warehouse_id = d.warehouse_id AND a.order_date = d.order_date
+      AND a.orders <= 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- UPDATE (sửa quantity/revenue, đổi order_date/sku_id/warehouse_id): trừ các dòng cũ, cộng các dòng mới
+CREATE OR REPLACE FUNCTION daily_sales_agg_on_update() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE daily_sales_agg a SET
+        qty = a.qty - d.qty,
+        revenue = a.revenue - d.revenue,
+        orders = a.orders - d.orders
+    FROM (
+        SELECT sku_id, warehouse_id, order_date,
+               SUM(order_quantity) AS qty, SUM(revenue) AS revenue, COUNT(*) AS orders
+        FROM old_rows
+        GROUP BY sku_id, warehouse_id, order_date
+    ) d
+    WHERE a.sku_id = d.sku_id AND a.warehouse_id = d.warehouse_id AND a.order_date = d.order_date;
+
+    INSERT INTO daily_sales_agg (sku_id, warehouse_id, order_date, qty, revenue, orders)
+    SELECT sku_id, warehouse_id, order_date, SUM(order_quantity), SUM(revenue), COUNT(*)
+    FROM new_rows
+    GROUP BY sku_id, warehouse_id, order_date
+    ON CONFLICT (sku_id, warehouse_id, order_date) DO UPDATE SET
+        qty = daily_sales_agg.qty + EXCLUDED.qty,
+        revenue = daily_sales_agg.revenue + EXCLUDED.revenue,
+        orders = daily_sales_agg.orders + EXCLUDED.orders;
+
+    -- Chỉ xóa các key vừa bị trừ mà không còn đơn nào (không quét cả bảng tổng hợp)
+    DELETE FROM daily_sales_agg a
+    USING (SELECT DISTINCT sku_id, warehouse_id, order_date FROM old_rows) d
+    WHERE a.sku_id = d.sku_id AND a.warehouse_id = d.warehouse_id AND a.order_date = d.order_date
+      AND a.orders <= 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- TRUNCATE sales: bảng tổng hợp cũng rỗng (TRUNCATE không có transition table)
+CREATE OR REPLACE FUNCTION daily_sales_agg_on_truncate() RETURNS TRIGGER AS $$
+BEGIN
+    TRUNCATE daily_sales_agg;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level triggers: một lần cập nhật cho mỗi batch INSERT/UPDATE/DELETE
+DROP TRIGGER IF EXISTS trg_daily_sales_agg_insert ON sales;
+CREATE TRIGGER trg_daily_sales_agg_insert
+    AFTER INSERT ON sales
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_agg_on_insert();
+
+DROP TRIGGER IF EXISTS trg_daily_sales_agg_update ON sales;
+CREATE TRIGGER trg_daily_sales_agg_update
+    AFTER UPDATE ON sales
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_agg_on_update();
+
+DROP TRIGGER IF EXISTS trg_daily_sales_agg_delete ON sales;
+CREATE TRIGGER trg_daily_sales_agg_delete
+    AFTER DELETE ON sales
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_agg_on_delete();
+
+DROP TRIGGER IF EXISTS trg_daily_sales_agg_truncate ON sales;
+CREATE TRIGGER trg_daily_sales_agg_truncate
+    AFTER TRUNCATE ON sales
+    FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_agg_on_truncate();
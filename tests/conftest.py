@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+@pytest.fixture
+def duckdb_tables(monkeypatch):
+    """
+    Kết nối DuckDB in-memory thay cho kết nối dùng chung (không đọc CSV / Parquet)
+
+    Returns:
+        hàm load(table, DataFrame) tạo bảng từ DataFrame
+    """
+    duckdb = pytest.importorskip("duckdb")
+    from db import duckdb_engine
+
+    con = duckdb.connect()
+    monkeypatch.setattr(duckdb_engine, "_duckdb_conn", con)
+
+    def load(table, frame):
+        con.register("frame", frame)
+        con.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM frame")
+        con.unregister("frame")
+
+    yield load
+    con.close()
@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from agents.analytics_agent import AnalyticsAgent
+
+LATEST = date(2023, 12, 31)
+
+
+@pytest.fixture
+def agent(monkeypatch, duckdb_tables):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    analytics = AnalyticsAgent(db_type="duckdb")
+    analytics.sales_source = "daily_sales_agg"
+
+    def load(sales_rows):
+        sales = pd.DataFrame(sales_rows, columns=["sku_id", "warehouse_id", "order_date", "qty", "revenue"])
+        sales["orders"] = 1
+        series = sales[["sku_id", "warehouse_id"]].drop_duplicates()
+        inventory = pd.concat([series, pd.DataFrame({"sku_id": ["NOSALE"], "warehouse_id": ["W1"]})])
+        duckdb_tables("daily_sales_agg", sales)
+        duckdb_tables("inventory", inventory.assign(current_inventory_quantity=10.0))
+        duckdb_tables("skus", pd.DataFrame({"sku_id": inventory["sku_id"].unique(), "sku_name": "x"}))
+        return analytics
+
+    return load
+
+
+def days_ago(n):
+    return LATEST - timedelta(days=n)
+
+
+def classes(df, column):
+    return dict(zip(df["sku_id"], df[column]))
+
+
+def test_abc_thresholds_follow_cumulative_revenue_share(agent):
+    # Revenue 70 / 15 / 10 / 5: the item that crosses 80% is still A, the one crossing 95% is still B
+    analytics = agent([
+        ("A1", "W1", LATEST, 1, 70.0),
+        ("A2", "W1", LATEST, 1, 15.0),
+        ("B1", "W1", LATEST, 1, 10.0),
+        ("C1", "W1", LATEST, 1, 5.0),
+    ])
+    df = analytics.calculate_abc_xyz()
+
+    assert classes(df, "abc_class") == {"A1": "A", "A2": "A", "B1": "B", "C1": "C", "NOSALE": "C"}
+
+
+def test_xyz_thresholds_follow_demand_cv(agent):
+    rows = [("DAILY", "W1", days_ago(d), 1, 1.0) for d in range(365)]
+    # Alternating 1 / 3 per 30-day bucket: CV = sqrt(12 / 11) / 2 ~ 0.52
+    rows += [("ALT", "W1", days_ago(30 * b), 1 if b % 2 == 0 else 3, 1.0) for b in range(12)]
+    # Mostly 2 per bucket with one 4: CV ~ 0.28
+    rows += [("STEADY", "W1", days_ago(30 * b), 4 if b == 0 else 2, 1.0) for b in range(12)]
+    rows += [("ONCE", "W1", LATEST, 5, 1.0)]
+    df = agent(rows).calculate_abc_xyz(period_days=365, bucket_days=30)
+
+    assert classes(df, "xyz_class") == {"DAILY": "X", "STEADY": "X", "ALT": "Y", "ONCE": "Z", "NOSALE": "Z"}
+    cv = classes(df, "demand_cv")
+    # 365 / 30 uses 12 whole buckets; the 5 leftover days do not make a short bucket
+    assert cv["DAILY"] == 0
+    assert cv["ALT"] == pytest.approx((12 / 11) ** 0.5 / 2, abs=1e-3)
+    assert cv["ONCE"] == pytest.approx(12 ** 0.5, abs=1e-3)
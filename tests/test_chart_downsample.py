@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agents.chart_downsample import downsample_series, lttb_indices
+
+
+def noisy_series(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=np.float64)
+    return x, np.sin(x / 50) + rng.normal(0, 0.1, n)
+
+
+@pytest.mark.parametrize("n, threshold", [(10_000, 500), (1_001, 3), (257, 100)])
+def test_lttb_keeps_endpoints_and_respects_threshold(n, threshold):
+    x, y = noisy_series(n)
+
+    keep = lttb_indices(x, y, threshold)
+
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert len(keep) <= threshold
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_lttb_returns_all_points_when_no_reduction_is_needed():
+    x, y = noisy_series(50)
+
+    assert np.array_equal(lttb_indices(x, y, 50), np.arange(50))
+    assert np.array_equal(lttb_indices(x, y, 2), np.arange(50))
+
+
+def test_lttb_keeps_a_single_spike():
+    x, y = noisy_series(10_000)
+    y[6_543] = 100.0
+
+    assert 6_543 in lttb_indices(x, y, 200)
+
+
+def test_downsample_series_sorts_by_x_and_keeps_each_columns_extremes():
+    n = 5_000
+    dates = pd.date_range("2024-01-01", periods=n, freq="h")
+    _, noise = noisy_series(n)
+    df = pd.DataFrame({"order_date": dates, "qty": noise, "revenue": noise * 10})
+    df.loc[1_234, "qty"] = 50.0
+    df.loc[3_210, "revenue"] = -500.0
+    shuffled = df.sample(frac=1, random_state=0)
+
+    result = downsample_series(shuffled, "order_date", ["qty", "revenue"], 300)
+
+    assert result["order_date"].is_monotonic_increasing
+    assert len(result) <= 300 * 2
+    assert result["order_date"].iloc[0] == dates[0] and result["order_date"].iloc[-1] == dates[-1]
+    assert {1_234, 3_210} <= set(result.index)
+
+
+def test_downsample_series_leaves_small_frames_untouched():
+    df = pd.DataFrame({"x": [3, 1, 2], "y": [1.0, 2.0, 3.0]})
+
+    assert downsample_series(df, "x", ["y"], 10) is df
@@ -0,0 +1,98 @@
+import os
+import threading
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from utils.chart_export import ChartExporter, chart_png_path, load_chart_spec, save_chart_spec
+
+
+def test_png_is_exported_only_on_request_and_memoized(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_to_image(fig, **kwargs):
+        calls.append(fig)
+        return b"png-bytes"
+
+    monkeypatch.setattr(pio, "to_image", fake_to_image)
+    directory = str(tmp_path)
+    key = save_chart_spec(go.Figure(go.Bar(x=["a", "b"], y=[1, 2])), directory)
+    exporter = ChartExporter(directory)
+
+    assert exporter.status(key) is None
+    assert exporter.get(key) is None
+    assert calls == []
+
+    exporter.submit(key)
+    assert exporter.get(key, timeout=None) == b"png-bytes"
+    assert os.path.exists(chart_png_path(key, directory))
+
+    exporter.submit(key)
+    assert len(calls) == 1
+
+    # A new process finds the PNG next to the sidecar without exporting again
+    restarted = ChartExporter(directory)
+    assert restarted.status(key) == "done"
+    assert restarted.get(key) == b"png-bytes"
+    assert len(calls) == 1
+
+
+def test_failed_export_can_be_retried(tmp_path, monkeypatch):
+    def broken_to_image(fig, **kwargs):
+        raise RuntimeError("kaleido is not installed")
+
+    monkeypatch.setattr(pio, "to_image", broken_to_image)
+    directory = str(tmp_path)
+    key = save_chart_spec(go.Figure(go.Bar(x=["a"], y=[1])), directory)
+    exporter = ChartExporter(directory)
+
+    exporter.submit(key)
+    assert exporter.get(key, timeout=None) is None
+    assert exporter.status(key) == "failed"
+
+    monkeypatch.setattr(pio, "to_image", lambda fig, **kwargs: b"png-bytes")
+    exporter.submit(key)
+    assert exporter.get(key, timeout=None) == b"png-bytes"
+
+
+def test_failed_export_is_logged_without_blocking_rendering(tmp_path, monkeypatch, capsys):
+    release = threading.Event()
+
+    def slow_broken_to_image(fig, **kwargs):
+        release.wait(5)
+        raise ValueError("orca/chrome not found")
+
+    monkeypatch.setattr(pio, "to_image", slow_broken_to_image)
+    directory = str(tmp_path)
+    key = save_chart_spec(go.Figure(go.Bar(x=["a"], y=[1])), directory)
+    exporter = ChartExporter(directory)
+
+    exporter.submit(key)
+    # The export is still running: callers get no PNG and the chart renders from its sidecar
+    assert exporter.get(key) is None
+    assert exporter.status(key) == "pending"
+    assert load_chart_spec(key, directory) is not None
+
+    release.set()
+    assert exporter.get(key, timeout=None) is None
+    assert exporter.status(key) == "failed"
+    assert "Chart PNG export failed: orca/chrome not found" in capsys.readouterr().out
+    # No PNG (or leftover temp file) is written for a failed export
+    assert os.listdir(tmp_path) == [f"{key}.json.gz"]
+
+
+def test_export_path_is_deterministic(tmp_path, monkeypatch):
+    monkeypatch.setattr(pio, "to_image", lambda fig, **kwargs: b"png-bytes")
+    first, second = str(tmp_path / "a"), str(tmp_path / "b")
+
+    key = save_chart_spec(go.Figure(go.Bar(x=["a", "b"], y=[1, 2])), first)
+    assert save_chart_spec(go.Figure(go.Bar(x=["a", "b"], y=[1, 2])), second) == key
+    assert save_chart_spec(go.Figure(go.Bar(x=["a", "b"], y=[1, 3])), first) != key
+
+    exporter = ChartExporter(first)
+    exporter.submit(key)
+    exporter.get(key, timeout=None)
+
+    assert chart_png_path(key, first) == os.path.join(first, f"{key}.png")
+    assert {f"{key}.json.gz", f"{key}.png"} <= set(os.listdir(first))
+    assert not any(name.endswith(".tmp") for name in os.listdir(first))
@@ -0,0 +1,79 @@
+from utils.conversation_store import (
+    ConversationStore, conversation_log_path, legacy_conversation_records, list_conversations,
+)
+
+
+def message_records(start, stop):
+    return [{"message": {"role": "user", "content": f"q{i}"}, "chart": None} for i in range(start, stop)]
+
+
+def contents(records):
+    return [record["message"]["content"] for record in records]
+
+
+def test_compaction_never_deletes_history(tmp_path):
+    store = ConversationStore(str(tmp_path / "c.jsonl"), compact_every=1)
+    store.append(message_records(0, 5))
+    with open(store.path, "ab") as f:
+        f.write(b'{"message": {"role": "us')  # Interrupted write
+    store.append(message_records(5, 8))
+
+    records, has_more = store.load_recent(100)
+    assert contents(records) == [f"q{i}" for i in range(8)]
+    assert not has_more
+
+
+def test_compaction_moves_old_messages_to_the_archive(tmp_path):
+    store = ConversationStore(str(tmp_path / "c.jsonl"), max_messages=3, compact_every=1)
+    for i in range(10):
+        store.append(message_records(i, i + 1))
+
+    records, has_more = store.load_recent(3)
+    assert contents(records) == ["q7", "q8", "q9"]
+    assert has_more
+
+    # "Load earlier messages" reaches into the archive
+    records, has_more = store.load_recent(10)
+    assert contents(records) == [f"q{i}" for i in range(10)]
+    assert not has_more
+
+
+def test_each_conversation_has_its_own_log(tmp_path):
+    first = ConversationStore(conversation_log_path(str(tmp_path), "a"))
+    second = ConversationStore(conversation_log_path(str(tmp_path), "b"))
+    first.append(message_records(0, 2))
+    second.rewrite(message_records(5, 6))
+
+    assert contents(first.load_recent(10)[0]) == ["q0", "q1"]
+    assert contents(second.load_recent(10)[0]) == ["q5"]
+    assert sorted(list_conversations(str(tmp_path))) == ["a", "b"]
+
+
+def test_migrated_charts_stay_attached_to_their_messages():
+    # The old format dropped charts whose PNG export failed, shifting later chart_index values
+    data = {
+        "messages": [
+            {"role": "user", "content": "sales trend"},
+            {"role": "assistant", "content": "a1", "chart_index": 0},
+            {"role": "user", "content": "stock by warehouse"},
+            {"role": "assistant", "content": "a2", "chart_index": 1},
+            {"role": "user", "content": "top vendors"},
+            {"role": "assistant", "content": "a3", "chart_index": 2},
+            {"role": "user", "content": "no chart here"},
+            {"role": "assistant", "content": "a4"},
+        ],
+        "charts": [
+            {"question": "sales trend", "chart_png_base64": "AAA"},
+            {"question": "top vendors", "chart_png_base64": "CCC"},
+        ],
+    }
+    records = legacy_conversation_records(data)
+
+    charts = {r["message"]["content"]: (r["chart"] or {}).get("chart_png_base64") for r in records}
+    assert charts == {
+        "sales trend": None, "a1": "AAA",
+        "stock by warehouse": None, "a2": None,
+        "top vendors": None, "a3": "CCC",
+        "no chart here": None, "a4": None,
+    }
+    assert all("chart_index" not in r["message"] for r in records)
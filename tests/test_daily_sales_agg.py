@@ -0,0 +1,141 @@
+"""
+Triggers / backfill của daily_sales_agg trên PostgreSQL thật
+Chạy khi có INV_TEST_POSTGRES_DSN (mỗi test dùng một schema tạm riêng)
+"""
+
+import os
+import uuid
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+import migrate_to_postgres
+from migrate_to_postgres import daily_sales_agg_is_consistent, ensure_daily_sales_agg, refresh_daily_sales_agg
+
+DSN = os.getenv("INV_TEST_POSTGRES_DSN")
+pytestmark = pytest.mark.skipif(not DSN, reason="INV_TEST_POSTGRES_DSN not set")
+
+SALES_DDL = """
+CREATE TABLE sales (
+    id SERIAL PRIMARY KEY,
+    order_number VARCHAR(50) NOT NULL,
+    order_date DATE NOT NULL,
+    sku_id VARCHAR(10) NOT NULL,
+    warehouse_id VARCHAR(10) NOT NULL,
+    order_quantity DECIMAL(15, 2) NOT NULL,
+    revenue DECIMAL(15, 2) NOT NULL
+)
+"""
+
+MISMATCHES_SQL = """
+SELECT COUNT(*) FROM (
+    (SELECT sku_id, warehouse_id, order_date, qty, revenue, orders FROM daily_sales_agg
+     EXCEPT
+     SELECT sku_id, warehouse_id, order_date, SUM(order_quantity), SUM(revenue), COUNT(*) FROM sales GROUP BY 1, 2, 3)
+    UNION ALL
+    (SELECT sku_id, warehouse_id, order_date, SUM(order_quantity), SUM(revenue), COUNT(*) FROM sales GROUP BY 1, 2, 3
+     EXCEPT
+     SELECT sku_id, warehouse_id, order_date, qty, revenue, orders FROM daily_sales_agg)
+) d
+"""
+
+
+@pytest.fixture
+def conn():
+    connection = psycopg2.connect(DSN)
+    schema = f"test_agg_{uuid.uuid4().hex[:8]}"
+    with connection.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}")
+        cur.execute(SALES_DDL)
+    connection.commit()
+    ensure_daily_sales_agg(connection)
+    try:
+        yield connection
+    finally:
+        connection.rollback()
+        with connection.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        connection.commit()
+        connection.close()
+
+
+def execute(conn, sql, params=None):
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+    conn.commit()
+
+
+def fetch_one(conn, sql):
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchone()
+
+
+def insert_sales(conn, rows):
+    with conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO sales (order_number, order_date, sku_id, warehouse_id, order_quantity, revenue) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            rows,
+        )
+    conn.commit()
+
+
+SAMPLE = [
+    ("O1", "2023-04-01", "S1", "W1", 2, 20),
+    ("O2", "2023-04-01", "S1", "W1", 3, 30),
+    ("O3", "2023-04-02", "S1", "W1", 1, 10),
+    ("O4", "2023-04-01", "S2", "W1", 5, 50),
+]
+
+
+def test_triggers_keep_aggregate_in_sync(conn):
+    steps = [
+        lambda: insert_sales(conn, SAMPLE),
+        lambda: execute(conn, "UPDATE sales SET order_quantity = order_quantity * 2, revenue = revenue + 1 WHERE sku_id = 'S1'"),
+        lambda: execute(conn, "UPDATE sales SET order_date = '2023-04-05' WHERE order_number = 'O3'"),
+        lambda: execute(conn, "UPDATE sales SET sku_id = 'S1' WHERE sku_id = 'S2'"),
+        lambda: execute(conn, "DELETE FROM sales WHERE order_number IN ('O1', 'O2')"),
+        lambda: execute(conn, "TRUNCATE sales"),
+        lambda: insert_sales(conn, SAMPLE[:2]),
+    ]
+    for step in steps:
+        step()
+        assert fetch_one(conn, MISMATCHES_SQL)[0] == 0
+        assert fetch_one(conn, "SELECT COUNT(*) FROM daily_sales_agg WHERE orders <= 0")[0] == 0
+        assert daily_sales_agg_is_consistent(conn)
+
+
+def test_cleanup_only_touches_keys_of_the_changed_rows(conn):
+    insert_sales(conn, SAMPLE)
+    # An empty row for an unrelated key is outside the statement's transition table
+    execute(conn, "INSERT INTO daily_sales_agg VALUES ('S9', 'W9', '2020-01-01', 0, 0, 0)")
+    execute(conn, "DELETE FROM sales WHERE order_number = 'O4'")
+
+    assert fetch_one(conn, "SELECT COUNT(*) FROM daily_sales_agg WHERE sku_id = 'S9'")[0] == 1
+    assert fetch_one(conn, "SELECT COUNT(*) FROM daily_sales_agg WHERE sku_id = 'S2'")[0] == 0
+
+
+def test_backfill_repairs_an_aggregate_left_stale_without_triggers(conn):
+    insert_sales(conn, SAMPLE)
+    execute(conn, "ALTER TABLE sales DISABLE TRIGGER USER")
+    # Moving an order keeps every total the same; only the per-key checksum changes
+    execute(conn, "UPDATE sales SET order_date = '2023-04-09' WHERE order_number = 'O3'")
+    execute(conn, "ALTER TABLE sales ENABLE TRIGGER USER")
+    assert not daily_sales_agg_is_consistent(conn)
+
+    refresh_daily_sales_agg(conn, only_if_stale=True)
+    assert fetch_one(conn, MISMATCHES_SQL)[0] == 0
+    assert daily_sales_agg_is_consistent(conn)
+
+
+def test_backfill_skips_a_consistent_aggregate(conn, monkeypatch):
+    insert_sales(conn, SAMPLE)
+    execute(conn, "UPDATE daily_sales_agg SET orders = orders")  # No-op, still consistent
+    messages = []
+    monkeypatch.setattr(migrate_to_postgres.logger, "info", messages.append)
+
+    refresh_daily_sales_agg(conn, only_if_stale=True)
+    assert any("bỏ qua backfill" in message for message in messages)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from agents.demand_forecast import forecast_seasonal, forecast_stock_cover
+
+HISTORY_DAYS = 120
+AS_OF = pd.Timestamp("2024-06-30")
+
+
+def run_forecast(demand: np.ndarray, on_hand: float = 500.0) -> pd.DataFrame:
+    num_series = demand.shape[1]
+    stock_cover = pd.DataFrame({
+        "sku_id": [f"S{i}" for i in range(num_series)],
+        "warehouse_id": "W1",
+        "current_inventory_quantity": on_hand,
+    })
+    daily_sales = pd.DataFrame(columns=["sku_id", "warehouse_id", "order_date", "qty"])
+    return forecast_stock_cover(
+        stock_cover, daily_sales, history_days=HISTORY_DAYS, horizon_days=90, as_of=AS_OF, demand=demand
+    )
+
+
+def intermittent_demand(sale_rate: float, num_series: int = 2000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    sold = rng.random((HISTORY_DAYS, num_series)) < sale_rate
+    return np.where(sold, rng.poisson(20, (HISTORY_DAYS, num_series)), 0).astype(np.float64)
+
+
+def test_intermittent_series_are_not_biased_upward():
+    for sale_rate in (0.02, 0.1, 0.4):
+        demand = intermittent_demand(sale_rate)
+        forecast = run_forecast(demand)["forecast_daily_demand"].to_numpy()
+        history_mean = demand.mean(axis=0)
+        sold = history_mean > 0
+
+        assert forecast[sold].sum() / history_mean[sold].sum() <= 1.05
+        assert forecast[sold].sum() / history_mean[sold].sum() >= 0.85
+        assert np.percentile(forecast[sold] / history_mean[sold], 99) <= 1.75
+
+
+def test_single_large_sale_does_not_invent_demand():
+    # One 1680-unit sale in 120 days: the forecast must not exceed the 14/day history mean
+    demand = np.zeros((HISTORY_DAYS, 1))
+    demand[HISTORY_DAYS - 83, 0] = 1680.0
+    result = run_forecast(demand, on_hand=509.0)
+
+    assert result["forecast_daily_demand"].iloc[0] <= 1680.0 / HISTORY_DAYS
+    assert result["forecast_cover_days"].iloc[0] >= 509.0 / (1680.0 / HISTORY_DAYS)
+
+
+def test_series_without_recent_sales_decay():
+    demand = intermittent_demand(0.2, num_series=500, seed=1)
+    demand[40:] = 0.0  # No sales in the last 80 days
+    forecast = run_forecast(demand)["forecast_daily_demand"].to_numpy()
+    history_mean = demand.mean(axis=0)
+    sold = history_mean > 0
+
+    assert np.all(forecast[sold] <= 1.05 * history_mean[sold])
+    assert forecast[sold].sum() / history_mean[sold].sum() <= 0.5
+
+
+def test_seasonal_forecast_keeps_weekly_mean_at_level():
+    seasonal = np.array([[6.0], [-8.0], [4.0], [-4.0], [2.0], [0.0], [0.0]])
+
+    # Level ~ 0: positive seasonal indices must not survive as demand
+    assert np.allclose(forecast_seasonal(np.zeros(1), seasonal, start=0, horizon_days=14), 0.0)
+
+    # Clipping the negative day must not raise the weekly mean above the level
+    forecast = forecast_seasonal(np.array([5.0]), seasonal, start=0, horizon_days=7)
+    assert np.all(forecast >= 0)
+    assert np.isclose(forecast.mean(), 5.0)
+
+
+def test_dense_seasonal_series_track_demand():
+    rng = np.random.default_rng(2)
+    weekly = np.array([0.2, 0.5, 1.0, 1.0, 1.3, 1.8, 1.2])
+    rates = rng.uniform(10, 40, 300)
+    days = np.arange(HISTORY_DAYS) % 7
+    demand = rng.poisson(rates[np.newaxis, :] * weekly[days][:, np.newaxis]).astype(np.float64)
+    forecast = run_forecast(demand)["forecast_daily_demand"].to_numpy()
+
+    ratio = forecast / (rates * weekly.mean())
+    assert 0.9 <= ratio.mean() <= 1.1
@@ -0,0 +1,34 @@
+import warnings
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+from db.duckdb_engine import TABLE_SPECS, export_csv_to_parquet
+
+
+def write_csvs(csv_dir):
+    rows = {
+        "warehouses": [["HCM001 ", " Ho Chi Minh", "HCM", "VN", 10.8, 106.6]],
+        "skus": [[" 1009AA", "Widget "]],
+        "inventory": [["1009AA ", " Vendor A", "HCM001 ", 10, 2.0, 20.0, "Nos", 5, 9, 3.0]],
+        "sales": [["SO1", "2023-04-08", "1009AA ", " HCM001", "Retail", 4, 3.0, 12.0]],
+    }
+    for table, (csv_file, columns) in TABLE_SPECS.items():
+        pd.DataFrame(rows[table], columns=list(columns)).to_csv(csv_dir / csv_file, index=False)
+
+
+def test_export_strips_text_columns_of_every_string_dtype(tmp_path):
+    write_csvs(tmp_path)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")  # no deprecated select_dtypes(object) fallback
+        paths = export_csv_to_parquet(str(tmp_path), str(tmp_path / "parquet"), force=True)
+
+    inventory = pd.read_parquet(paths["inventory"])
+    assert inventory.loc[0, "sku_id"] == "1009AA"
+    assert inventory.loc[0, "warehouse_id"] == "HCM001"
+    assert inventory.loc[0, "vendor_name"] == "Vendor A"
+
+    agg = pd.read_parquet(paths["daily_sales_agg"])
+    assert list(agg[["sku_id", "warehouse_id"]].itertuples(index=False, name=None)) == [("1009AA", "HCM001")]
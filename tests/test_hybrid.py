@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")  # rag/__init__ imports the ChromaDB retriever
+
+from rag.hybrid import fuse_scores, select_candidates
+
+
+def test_threshold_applies_to_dense_similarity_not_fused_score():
+    dense = np.array([0.1, 0.5, 0.35, 0.2])
+    bm25 = np.array([9.0, 0.0, 1.0, 0.0])
+    fused = fuse_scores(dense, bm25, alpha=0.6)
+
+    # The top BM25 match gains +0.4 and would pass a 0.3 threshold on the fused score
+    assert fused[0] >= 0.3
+    picked = select_candidates(dense, fused, similarity_threshold=0.3, pool_size=10)
+    assert list(picked) == [1, 2]
+
+
+def test_candidates_are_ranked_by_fused_score_and_capped():
+    dense = np.array([0.4, 0.5, 0.45])
+    bm25 = np.array([5.0, 0.0, 1.0])
+    fused = fuse_scores(dense, bm25, alpha=0.6)
+
+    assert list(select_candidates(dense, fused, similarity_threshold=0.0, pool_size=2)) == [0, 2]
+    assert select_candidates(dense, fused, similarity_threshold=0.9, pool_size=2).size == 0
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from agents import orchestrator
+from agents.orchestrator import OrchestratorAgent
+from agents.viz_agent import VisualizationAgent
+
+PROBE_ROWS = 100
+ROWS = 5000
+
+
+@pytest.fixture
+def fetch(monkeypatch, duckdb_tables):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(orchestrator, "VIZ_SQL_PROBE_ROWS", PROBE_ROWS)
+    duckdb_tables("sales", pd.DataFrame({
+        "day": [i % 10 for i in range(ROWS)],
+        "warehouse": [f"W{i % 3}" for i in range(ROWS)],
+        "qty": [1.0] * ROWS,
+    }))
+    agent = OrchestratorAgent.__new__(OrchestratorAgent)
+    agent.viz_agent = VisualizationAgent()
+    executed = []
+    run_sql_unified = orchestrator.run_sql_unified
+    iter_sql_unified = orchestrator.iter_sql_unified
+
+    def record_run(sql, *args, **kwargs):
+        executed.append(sql)
+        return run_sql_unified(sql, *args, **kwargs)
+
+    def record_iter(sql, *args, **kwargs):
+        executed.append(sql)
+        return iter_sql_unified(sql, *args, **kwargs)
+
+    monkeypatch.setattr(orchestrator, "run_sql_unified", record_run)
+    monkeypatch.setattr(orchestrator, "iter_sql_unified", record_iter)
+
+    def run(sql, spec):
+        monkeypatch.setattr(agent.viz_agent, "plan_chart", lambda question, df: spec)
+        return agent._fetch_viz_data("chart", sql, "duckdb"), executed
+
+    return run
+
+
+def test_large_result_without_group_by_is_fetched_once(fetch):
+    (df, error, spec, aggregate_sql), executed = fetch("SELECT * FROM sales", {"x": "day", "y": ["qty"]})
+
+    assert error is None
+    assert aggregate_sql is None
+    assert spec == {"x": "day", "y": ["qty"]}
+    assert len(df) == ROWS
+    assert executed == ["SELECT * FROM sales"]
+
+
+def test_large_result_with_group_by_is_aggregated_in_database(fetch):
+    (df, error, _, aggregate_sql), executed = fetch(
+        "SELECT * FROM sales", {"x": "day", "y": ["qty"], "group_by": "warehouse"}
+    )
+
+    assert error is None
+    assert executed == ["SELECT * FROM sales", aggregate_sql]
+    assert len(df) == 30
+    assert df["qty"].sum() == ROWS
+
+
+def test_failed_aggregate_falls_back_to_the_streamed_result(fetch, monkeypatch):
+    monkeypatch.setattr(VisualizationAgent, "build_aggregate_sql", lambda self, sql, spec, sample: "SELECT nope")
+    (df, error, _, aggregate_sql), executed = fetch(
+        "SELECT * FROM sales", {"x": "day", "y": ["qty"], "group_by": "warehouse"}
+    )
+
+    assert error is None
+    assert aggregate_sql is None
+    assert len(df) == ROWS
+    assert executed == ["SELECT * FROM sales", "SELECT nope"]
+
+
+def test_small_result_is_not_planned(fetch):
+    (df, error, spec, aggregate_sql), executed = fetch("SELECT * FROM sales LIMIT 50", {"x": "day", "y": ["qty"]})
+
+    assert (len(df), error, spec, aggregate_sql) == (50, None, None, None)
+    assert executed == ["SELECT * FROM sales LIMIT 50"]
+
+
+def test_sql_errors_are_returned(fetch):
+    (df, error, _, _), _ = fetch("SELECT * FROM missing_table", {})
+
+    assert df.empty and "missing_table" in error
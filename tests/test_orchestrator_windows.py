@@ -0,0 +1,33 @@
+import pytest
+
+from agents.orchestrator import OrchestratorAgent
+
+
+@pytest.fixture
+def extract_windows():
+    return OrchestratorAgent.__new__(OrchestratorAgent)._extract_windows
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("compare 7, 30 and 90-day velocity", [7, 30, 90]),
+    ("sales velocity last week vs last month", [7, 30]),
+    ("weekly vs monthly sales velocity", [7, 30]),
+    ("revenue in the past 3 months", [90]),
+    ("top sellers this quarter", [90]),
+    ("2-week and 6-month demand", [14, 180]),
+    ("doanh số tuần qua so với 3 tháng gần nhất", [7, 90]),
+])
+def test_time_phrases_become_windows(extract_windows, question, expected):
+    assert extract_windows(question) == expected
+
+
+@pytest.mark.parametrize("question", [
+    "weekly report of warehouses",
+    "monthly vendor list",
+    "which vendors deliver quarterly",
+    "items with less than 2 weeks of cover",
+    "SKUs with stock cover under 30 days",
+    "show the quarterly stock report by month of arrival",
+])
+def test_period_words_outside_time_phrases_are_ignored(extract_windows, question):
+    assert extract_windows(question) == []
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agents.analytics_agent import AnalyticsAgent
+from agents.safety_stock import compute_reorder_policy
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    return AnalyticsAgent()
+
+
+def snapshot_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "sku_id": ["CRIT", "HEALTHY_BELOW", "OVER_DISPUTED", "OVER_AGREED", "NOSALES", "GOOD"],
+        "sku_name": "x",
+        "warehouse_id": "W1",
+        "vendor_name": "V",
+        "current_inventory_quantity": [10.0, 400.0, 1170.0, 1170.0, 50.0, 500.0],
+        "avg_daily_sales": [2.0, 8.0, 10.0, 10.0, 0.0, 10.0],
+        "stock_cover_days": [5.0, 50.0, 117.0, 117.0, np.nan, 50.0],
+        "forecast_daily_demand": [2.0, 8.0, 2.0, 200.0, 0.0, 10.0],
+        "forecast_cover_days": [5.0, 50.0, np.nan, 5.85, np.nan, 50.0],
+        "predicted_stockout_date": None,
+        "average_lead_time_days": [20.0, 30.0, 20.0, 20.0, 20.0, 20.0],
+        "maximum_lead_time_days": [30.0, 40.0, 30.0, 30.0, 30.0, 30.0],
+        "demand_mean_daily": [2.0, 8.0, 10.0, 10.0, 0.0, 10.0],
+        "demand_std_daily": 1.0,
+        "safety_stock": 0.0,
+        "reorder_point": [40.0, 450.0, 1200.0, 1200.0, 60.0, 200.0],
+        "order_up_to_level": [100.0, 700.0, 1500.0, 1500.0, 60.0, 500.0],
+        "below_reorder_point": [True, True, True, True, True, False],
+        "recommended_order_qty": [90.0, 300.0, 330.0, 330.0, 10.0, 0.0],
+        "stock_status": ["Critical", "Healthy", "Overstock", "Overstock", "No Sales", "Good"],
+    })
+
+
+def test_overstock_and_no_sales_rows_need_forecast_agreement(agent, monkeypatch):
+    monkeypatch.setattr(agent, "get_snapshot", lambda: SimpleNamespace(stock_cover=snapshot_frame()))
+
+    recommended = set(agent.get_restock_recommendations(urgency="all")["sku_id"])
+    assert recommended == {"CRIT", "HEALTHY_BELOW", "OVER_AGREED"}
+
+    below = set(agent.get_reorder_points(below_only=True)["sku_id"])
+    assert below == {"CRIT", "HEALTHY_BELOW", "OVER_AGREED"}
+
+
+def test_reorder_point_uses_status_demand_basis():
+    stock_cover = pd.DataFrame({
+        "current_inventory_quantity": [100.0, 100.0],
+        "average_lead_time_days": [20.0, 20.0],
+        "maximum_lead_time_days": [30.0, 30.0],
+    })
+    # 120-day history is busy, but the status basis (recent average) shows no sales
+    demand = np.full((120, 2), 10.0)
+    policy = compute_reorder_policy(stock_cover, demand, daily_mean=np.array([0.0, 10.0]))
+
+    assert list(policy["below_reorder_point"]) == [False, True]
+    assert list(policy["demand_mean_daily"]) == [0.0, 10.0]
@@ -0,0 +1,58 @@
+import os
+
+import pandas as pd
+
+from agents.snapshot_store import list_snapshots, load_latest_snapshot, write_snapshot
+
+POSTGRES = {"db_type": "postgresql", "data_source": "postgresql://localhost:5432/inventory_db"}
+DUCKDB = {"db_type": "duckdb", "data_source": "duckdb:/srv/data/parquet"}
+
+
+def write(base_dir, source, rows, data_version=None):
+    frame = pd.DataFrame({"sku_id": [f"S{i}" for i in range(rows)]})
+    metadata = {**source, "data_version": rows if data_version is None else data_version}
+    return write_snapshot(str(base_dir), {"stock_cover": frame}, {}, metadata)
+
+
+def test_snapshot_from_another_database_is_not_served(tmp_path):
+    write(tmp_path, DUCKDB, rows=3)
+
+    assert load_latest_snapshot(str(tmp_path), 3600, expected=POSTGRES) is None
+    frames, manifest, _ = load_latest_snapshot(str(tmp_path), 3600, expected=DUCKDB)
+    assert manifest["db_type"] == "duckdb"
+    assert len(frames["stock_cover"]) == 3
+
+
+def test_newest_matching_snapshot_is_used(tmp_path):
+    # Data versions sort the opposite way to write time
+    postgres_path = write(tmp_path, POSTGRES, rows=2, data_version="ffff")
+    duckdb_path = write(tmp_path, DUCKDB, rows=3, data_version="0000")
+    assert list_snapshots(str(tmp_path)) == [duckdb_path, postgres_path]
+
+    _, manifest, path = load_latest_snapshot(str(tmp_path), 3600, expected=POSTGRES)
+    assert path == postgres_path
+    assert manifest["data_source"] == POSTGRES["data_source"]
+
+
+def test_versions_are_ordered_by_write_time_not_data_version(tmp_path):
+    paths = [write(tmp_path, POSTGRES, rows=1, data_version=version) for version in ("c", "b", "a")]
+
+    assert list_snapshots(str(tmp_path)) == paths[::-1]
+    _, manifest, _ = load_latest_snapshot(str(tmp_path), 3600, expected=POSTGRES)
+    assert manifest["data_version"] == "a"
+
+
+def test_unreadable_version_falls_back_to_an_older_one(tmp_path):
+    older = write(tmp_path, POSTGRES, rows=2, data_version="old")
+    newer = write(tmp_path, POSTGRES, rows=3, data_version="new")
+    os.remove(os.path.join(newer, "stock_cover.parquet"))
+
+    frames, manifest, path = load_latest_snapshot(str(tmp_path), 3600, expected=POSTGRES)
+    assert path == older
+    assert len(frames["stock_cover"]) == 2
+
+
+def test_snapshot_without_source_is_rejected(tmp_path):
+    write(tmp_path, {}, rows=1)
+
+    assert load_latest_snapshot(str(tmp_path), 3600, expected=POSTGRES) is None
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from agents.stockout_simulation import simulate_stockout
+
+BLOCK_DAYS = 7
+
+
+def block_history(block_totals, num_series=1):
+    """Daily demand matrix whose 7-day blocks sum to block_totals (one sale day per block)"""
+    demand = np.zeros((len(block_totals) * BLOCK_DAYS, num_series))
+    demand[::BLOCK_DAYS] = np.asarray(block_totals, dtype=np.float64)[:, None]
+    return demand
+
+
+def run(on_hand, demand, avg_lead, max_lead, trials=20_000, seed=0):
+    n = demand.shape[1]
+    return simulate_stockout(
+        np.full(n, on_hand, dtype=np.float64), demand,
+        np.full(n, avg_lead, dtype=np.float64), np.full(n, max_lead, dtype=np.float64),
+        trials=trials, block_days=BLOCK_DAYS, seed=seed,
+    )
+
+
+def test_same_seed_gives_identical_results():
+    rng = np.random.default_rng(5)
+    demand = rng.poisson(3, (84, 20)).astype(np.float64)
+    on_hand = rng.uniform(10, 60, 20)
+    avg_lead = rng.uniform(3, 10, 20)
+    max_lead = avg_lead + rng.uniform(0, 10, 20)
+
+    first = simulate_stockout(on_hand, demand, avg_lead, max_lead, trials=2_000, seed=42)
+    second = simulate_stockout(on_hand, demand, avg_lead, max_lead, trials=2_000, seed=42)
+    other = simulate_stockout(on_hand, demand, avg_lead, max_lead, trials=2_000, seed=43)
+
+    pd.testing.assert_frame_equal(first, second)
+    assert not first.equals(other)
+
+
+def test_zero_demand_or_zero_lead_time_never_stocks_out():
+    no_demand = run(on_hand=0.0, demand=np.zeros((70, 3)), avg_lead=7, max_lead=14)
+    no_lead = run(on_hand=1.0, demand=block_history(range(10), num_series=3), avg_lead=0, max_lead=0)
+
+    for result in (no_demand, no_lead):
+        assert (result["stockout_probability"] == 0).all()
+        assert (result["expected_shortfall"] == 0).all()
+        assert result["expected_shortfall_if_stockout"].isna().all()
+
+
+def test_matches_the_bootstrap_distribution():
+    demand = block_history(range(10))  # Weekly totals 0..9, sampled uniformly
+
+    # One full block: stockout when the sampled total is 7, 8 or 9
+    one_block = run(on_hand=6.5, demand=demand, avg_lead=7, max_lead=7).iloc[0]
+    assert abs(one_block["stockout_probability"] - 0.3) < 0.015
+    assert abs(one_block["expected_shortfall"] - (0.5 + 1.5 + 2.5) / 10) < 0.03
+    assert abs(one_block["expected_shortfall_if_stockout"] - 1.5) < 0.05
+
+    # Two blocks: P(X + Y >= 10) = 45/100 for X, Y uniform on 0..9
+    two_blocks = run(on_hand=9.5, demand=demand, avg_lead=14, max_lead=14).iloc[0]
+    assert abs(two_blocks["stockout_probability"] - 0.45) < 0.015
+
+    # Half a block counts half of the sampled total: 0.5 * X > 3 -> X in {7, 8, 9}
+    half_block = run(on_hand=3.0, demand=demand, avg_lead=3.5, max_lead=3.5).iloc[0]
+    assert abs(half_block["stockout_probability"] - 0.3) < 0.015
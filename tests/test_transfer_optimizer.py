@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agents.transfer_optimizer import greedy_transfer_plan, haversine_matrix
+
+# Hanoi, Ho Chi Minh City, Da Nang
+WAREHOUSES = pd.Index(["HN", "HCM", "DN"])
+DISTANCE = haversine_matrix([21.0285, 10.8231, 16.0544], [105.8542, 106.6297, 108.2022])
+
+
+def test_haversine_matches_known_city_distances():
+    paris_london = haversine_matrix([48.8566, 51.5074], [2.3522, -0.1278])
+
+    assert paris_london[0, 1] == pytest.approx(343.5, rel=0.01)
+    assert DISTANCE[0, 1] == pytest.approx(1137, rel=0.01)
+    assert np.allclose(DISTANCE, DISTANCE.T)
+    assert np.all(np.diag(DISTANCE) == 0)
+
+
+def test_nearest_receiver_is_served_first_until_surplus_runs_out():
+    donors = pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["DN"], "surplus_qty": [30.0]})
+    receivers = pd.DataFrame({"sku_id": ["S1", "S1"], "warehouse_id": ["HCM", "HN"], "deficit_qty": [25.0, 25.0]})
+
+    plan = greedy_transfer_plan(donors, receivers, DISTANCE, WAREHOUSES)
+
+    # Da Nang -> Hanoi is shorter than Da Nang -> Ho Chi Minh City
+    assert list(zip(plan["to_warehouse"], plan["transfer_qty"])) == [("HN", 25.0), ("HCM", 5.0)]
+    assert plan["transfer_qty"].sum() == 30.0
+
+
+def test_deficit_runs_out_before_surplus():
+    donors = pd.DataFrame({"sku_id": ["S1", "S1"], "warehouse_id": ["HN", "HCM"], "surplus_qty": [40.0, 40.0]})
+    receivers = pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["DN"], "deficit_qty": [50.0]})
+
+    plan = greedy_transfer_plan(donors, receivers, DISTANCE, WAREHOUSES)
+
+    assert list(zip(plan["from_warehouse"], plan["transfer_qty"])) == [("HN", 40.0), ("HCM", 10.0)]
+
+
+def test_warehouse_never_transfers_to_itself_or_across_skus():
+    donors = pd.DataFrame({"sku_id": ["S1", "S2"], "warehouse_id": ["HN", "HCM"], "surplus_qty": [10.0, 10.0]})
+    receivers = pd.DataFrame({"sku_id": ["S1", "S1"], "warehouse_id": ["HN", "DN"], "deficit_qty": [10.0, 4.0]})
+
+    plan = greedy_transfer_plan(donors, receivers, DISTANCE, WAREHOUSES)
+
+    assert (plan["from_warehouse"] != plan["to_warehouse"]).all()
+    assert plan[["sku_id", "from_warehouse", "to_warehouse", "transfer_qty"]].values.tolist() == [
+        ["S1", "HN", "DN", 4.0]
+    ]
+
+
+@pytest.mark.parametrize("donors, receivers, max_distance_km", [
+    (pd.DataFrame(columns=["sku_id", "warehouse_id", "surplus_qty"]),
+     pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["HN"], "deficit_qty": [5.0]}), None),
+    (pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["HN"], "surplus_qty": [5.0]}),
+     pd.DataFrame({"sku_id": ["S2"], "warehouse_id": ["DN"], "deficit_qty": [5.0]}), None),
+    (pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["HN"], "surplus_qty": [5.0]}),
+     pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["HCM"], "deficit_qty": [5.0]}), 500.0),
+    (pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["HN"], "surplus_qty": [0.5]}),
+     pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["DN"], "deficit_qty": [5.0]}), None),
+    (pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["XX"], "surplus_qty": [5.0]}),
+     pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["DN"], "deficit_qty": [5.0]}), None),
+])
+def test_no_transfer_candidates_gives_an_empty_plan(donors, receivers, max_distance_km):
+    plan = greedy_transfer_plan(donors, receivers, DISTANCE, WAREHOUSES, max_distance_km=max_distance_km)
+
+    assert plan.empty
+    assert list(plan.columns) == [
+        "sku_id", "from_warehouse", "to_warehouse", "distance_km", "transfer_qty", "donor_row", "receiver_row"
+    ]
@@ -0,0 +1,97 @@
+import matplotlib
+matplotlib.use("Agg")
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+from matplotlib.figure import Figure as MatplotlibFigure
+
+from agents import viz_agent
+from agents.viz_agent import VisualizationAgent
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(viz_agent, "_figure_cache", viz_agent.FigureCache(1024 * 1024))
+    return VisualizationAgent()
+
+
+def scatter_frame(seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"unit_price": rng.random(50), "order_quantity": rng.random(50)})
+
+
+SCATTER_SPEC = {"chart_type": "scatter", "x": "unit_price", "y": ["order_quantity"], "title": "Price vs quantity"}
+
+
+def test_render_cached_reuses_plotly_figure(agent):
+    df = scatter_frame(0)
+    fig, hit = agent.render_cached(df, SCATTER_SPEC)
+    assert isinstance(fig, go.Figure) and not hit
+
+    cached, hit = agent.render_cached(df.copy(), {**SCATTER_SPEC, "planner": "llm"})
+    assert isinstance(cached, go.Figure) and hit
+    assert cached.to_plotly_json() == fig.to_plotly_json()
+
+
+def test_render_cached_returns_matplotlib_fallback_uncached(agent, monkeypatch):
+    def broken_scatter(*args, **kwargs):
+        raise ValueError("plotly unavailable")
+
+    monkeypatch.setattr(agent, "_scatter_figure", broken_scatter)
+    df = scatter_frame(1)
+
+    fig, hit = agent.render_cached(df, SCATTER_SPEC)
+    assert isinstance(fig, MatplotlibFigure) and not hit
+    assert viz_agent._figure_cache.stats()["entries"] == 0
+
+    # Not served from the cache on the next ask either
+    fig, hit = agent.render_cached(df, SCATTER_SPEC)
+    assert isinstance(fig, MatplotlibFigure) and not hit
+
+
+def test_build_aggregate_sql_quotes_result_columns(agent):
+    sample = pd.DataFrame({"order date": ["2024-01-01"], 'wh"code': ["W1"], "qty": [1.0], "flag": [True]})
+    spec = {"x": "order date", "y": ["qty", "flag", "missing"], "group_by": 'wh"code', "agg": "mean"}
+
+    sql = agent.build_aggregate_sql("SELECT * FROM sales;", spec, sample)
+
+    assert sql == (
+        'SELECT "order date", "wh""code", AVG("qty") AS "qty"\n'
+        "FROM (\nSELECT * FROM sales\n) viz_src\n"
+        'GROUP BY "order date", "wh""code"\nORDER BY "order date", "wh""code"'
+    )
+
+
+def test_build_aggregate_sql_skips_specs_without_group_by(agent):
+    sample = pd.DataFrame({"x": [1], "g": ["a"], "y": [2.0]})
+
+    assert agent.build_aggregate_sql("SELECT 1", {"x": "x", "y": ["y"]}, sample) is None
+    assert agent.build_aggregate_sql("SELECT 1", {"x": "x", "y": ["y"], "group_by": "absent"}, sample) is None
+
+
+@pytest.mark.parametrize("rows, trace_type", [
+    (10, "scatter"),
+    (11, "scattergl"),
+    (100, "scattergl"),
+    (101, "heatmap"),
+])
+def test_scatter_trace_type_switches_at_point_thresholds(agent, monkeypatch, rows, trace_type):
+    monkeypatch.setattr(viz_agent, "VIZ_WEBGL_MIN_POINTS", 10)
+    monkeypatch.setattr(viz_agent, "VIZ_DENSITY_MIN_POINTS", 100)
+
+    fig = agent.render_from_spec(scatter_frame(0).sample(rows, replace=True, random_state=1), SCATTER_SPEC)
+
+    assert {trace.type for trace in fig.data} == {trace_type}
+
+
+@pytest.mark.parametrize("rows, trace_type", [(10, "scatter"), (11, "scattergl")])
+def test_line_trace_type_switches_at_webgl_threshold(agent, monkeypatch, rows, trace_type):
+    monkeypatch.setattr(viz_agent, "VIZ_WEBGL_MIN_POINTS", 10)
+    df = pd.DataFrame({"order_date": pd.date_range("2024-01-01", periods=rows), "qty": np.arange(rows, dtype=float)})
+
+    fig = agent.render_from_spec(df, {"chart_type": "line", "x": "order_date", "y": ["qty"], "title": "Qty"})
+
+    assert {trace.type for trace in fig.data} == {trace_type}
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from agents.analytics_agent import AnalyticsAgent
+
+ROLLUPS = pd.DataFrame({
+    "level": ["warehouse", "warehouse", "global"],
+    "warehouse_id": ["W2", "W1", None],
+    "avg_stock_cover_days": [20.0, 10.0, 15.0],
+})
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    analytics = AnalyticsAgent(db_type="duckdb")
+    analytics.snapshot_max_age_seconds = 0
+    calls = {"rollups": 0, "stock_cover": 0}
+
+    def rollups(period_days=30):
+        calls["rollups"] += 1
+        return analytics.rollup_result
+
+    def stock_cover():
+        calls["stock_cover"] += 1
+        return pd.DataFrame({"sku_id": ["S1"], "warehouse_id": ["W1"], "avg_daily_sales": [1.0]})
+
+    analytics.rollup_result = ROLLUPS
+    analytics.calls = calls
+    monkeypatch.setattr(analytics, "calculate_warehouse_rollups", rollups)
+    monkeypatch.setattr(analytics, "calculate_stock_cover_days", stock_cover)
+    monkeypatch.setattr(analytics, "load_daily_sales_history", lambda: pd.DataFrame())
+    return analytics
+
+
+def test_cold_analyze_by_warehouse_runs_only_the_rollup_query(agent):
+    first = agent.analyze_by_warehouse()
+    second = agent.analyze_by_warehouse()
+
+    assert list(first["warehouse_id"]) == ["W1", "W2"]
+    assert "level" not in first.columns
+    assert second.equals(first)
+    assert agent.calls == {"rollups": 1, "stock_cover": 0}
+
+
+def test_fresh_snapshot_serves_and_keeps_the_rollups(agent):
+    agent.get_warehouse_rollups()
+    snapshot = agent.get_snapshot()
+    agent.get_warehouse_rollups()
+
+    assert snapshot.cached_view("warehouse_rollups") is ROLLUPS
+    assert agent.calls == {"rollups": 1, "stock_cover": 1}
+
+
+def test_empty_rollups_are_retried(agent):
+    agent.rollup_result = pd.DataFrame()
+    assert agent.analyze_by_warehouse().empty
+
+    agent.rollup_result = ROLLUPS
+    assert len(agent.analyze_by_warehouse()) == 2
+    assert agent.calls["rollups"] == 2
+
+
+def test_refresh_drops_cached_rollups(agent):
+    agent.get_warehouse_rollups()
+    agent.invalidate_snapshot()
+    agent.get_warehouse_rollups()
+    agent.get_snapshot(force_refresh=True)
+    agent.get_warehouse_rollups()
+
+    assert agent.calls["rollups"] == 3
@@ -0,0 +1,160 @@
+"""
+Chart Export - Lưu Plotly figure dạng JSON nén (gzip) vào sidecar file, địa chỉ hóa theo nội dung
+Hội thoại chỉ giữ key (hash của figure JSON); chart được dựng lại từ sidecar khi hiển thị
+PNG chỉ được xuất khi cần (ví dụ tải xuống), ở background (kaleido), memo theo key
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+import gzip
+import hashlib
+import os
+import threading
+
+
+def figure_hash(fig_json: str) -> str:
+	"""Hash nội dung figure (JSON) - cùng figure thì cùng key"""
+	return hashlib.sha256(fig_json.encode("utf-8")).hexdigest()[:20]
+
+
+def chart_spec_path(key: str, directory: str) -> str:
+	"""Đường dẫn sidecar của key"""
+	return os.path.join(directory, f"{key}.json.gz")
+
+
+def save_chart_spec(fig, directory: str) -> str:
+	"""
+	Ghi figure (JSON, gzip) vào directory nếu chưa có, trả về key
+
+	Cùng figure chỉ được ghi một lần; file được ghi ra tên tạm rồi os.replace
+	nên session khác không bao giờ đọc phải file dở dang.
+	"""
+	fig_json = fig.to_json()
+	key = figure_hash(fig_json)
+	path = chart_spec_path(key, directory)
+	if not os.path.exists(path):
+		os.makedirs(directory, exist_ok=True)
+		tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+			f.write(fig_json)
+		os.replace(tmp_path, path)
+	return key
+
+
+def load_chart_spec(key: str, directory: str) -> Optional[str]:
+	"""Figure JSON của key, None nếu sidecar không còn / hỏng"""
+	try:
+		with gzip.open(chart_spec_path(key, directory), "rt", encoding="utf-8") as f:
+			return f.read()
+	except (OSError, EOFError) as e:
+		print(f"⚠️ Could not load chart {key}: {e}")
+		return None
+
+
+def chart_png_path(key: str, directory: str) -> str:
+	"""Đường dẫn PNG đã xuất của key (nằm cạnh sidecar JSON)"""
+	return os.path.join(directory, f"{key}.png")
+
+
+class ChartExporter:
+	"""
+	Worker pool xuất PNG từ sidecar JSON; submit() trả về ngay, get() lấy PNG khi đã xong
+
+	Không có gì được xuất cho tới khi submit(key) được gọi. PNG được ghi cạnh sidecar
+	nên cùng figure chỉ xuất một lần, kể cả sau khi restart.
+	"""
+
+	def __init__(self, directory: str, max_workers: int = 1, max_cached: int = 64, width: int = 800, height: int = 600, scale: int = 1):
+		self.directory = directory
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chart-export")
+		self._lock = threading.Lock()
+		self._pending: Dict[str, Future] = {}
+		self._done: "OrderedDict[str, Optional[bytes]]" = OrderedDict()
+		self.max_cached = max_cached
+		self.width = width
+		self.height = height
+		self.scale = scale
+
+	def submit(self, key: str) -> None:
+		"""Đưa chart (key của sidecar) vào hàng đợi xuất PNG, bỏ qua nếu đã có / đang xuất (lần lỗi trước được thử lại)"""
+		with self._lock:
+			if self._done.get(key) is not None:
+				self._done.move_to_end(key)
+			elif key not in self._pending:
+				self._done.pop(key, None)
+				self._pending[key] = self._executor.submit(self._export, key)
+
+	def status(self, key: str) -> Optional[str]:
+		"""'done' / 'pending' / 'failed', None nếu chưa từng được yêu cầu"""
+		with self._lock:
+			if key in self._done:
+				return "done" if self._done[key] is not None else "failed"
+			if key in self._pending:
+				return "pending"
+		return "done" if os.path.exists(chart_png_path(key, self.directory)) else None
+
+	def get(self, key: str, timeout: Optional[float] = 0) -> Optional[bytes]:
+		"""
+		PNG bytes của key, None nếu chưa xong / lỗi / chưa được yêu cầu
+
+		Args:
+			timeout: 0 = không chờ, None = chờ đến khi xong, số giây = chờ tối đa
+		"""
+		with self._lock:
+			if key in self._done:
+				return self._done[key]
+			future = self._pending.get(key)
+		if future is None:
+			return self._read_png(key)
+		if timeout == 0 and not future.done():
+			return None
+		try:
+			return future.result(timeout=timeout)
+		except Exception:
+			return None
+
+	def _read_png(self, key: str) -> Optional[bytes]:
+		try:
+			with open(chart_png_path(key, self.directory), "rb") as f:
+				png = f.read()
+		except OSError:
+			return None
+		with self._lock:
+			self._remember(key, png)
+		return png
+
+	def _remember(self, key: str, png: Optional[bytes]) -> None:
+		self._done[key] = png
+		self._done.move_to_end(key)
+		while len(self._done) > self.max_cached:
+			self._done.popitem(last=False)
+
+	def _export(self, key: str) -> Optional[bytes]:
+		png = None
+		fig_json = load_chart_spec(key, self.directory)
+		if fig_json is not None:
+			try:
+				import plotly.io as pio
+				png = pio.to_image(
+					pio.from_json(fig_json),
+					format="png",
+					width=self.width,
+					height=self.height,
+					scale=self.scale,
+				)
+				path = chart_png_path(key, self.directory)
+				tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+				with open(tmp_path, "wb") as f:
+					f.write(png)
+				os.replace(tmp_path, path)
+			except Exception as e:
+				if "kaleido" in str(e).lower():
+					print("⚠️ Chart PNG export needs kaleido: pip install kaleido")
+				else:
+					print(f"⚠️ Chart PNG export failed: {str(e)[:100]}")
+				png = None
+		with self._lock:
+			self._pending.pop(key, None)
+			self._remember(key, png)
+		return png
@@ -0,0 +1,263 @@
+"""
+Conversation Store - Lịch sử hội thoại dạng JSONL append-only, mỗi dòng một message
+Lưu chỉ ghi thêm message mới, khởi động chỉ đọc N message cuối (đọc ngược từ cuối file)
+Mỗi conversation (session) có log riêng trong một thư mục; lịch sử không bao giờ bị xóa khi compact
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+
+_CONVERSATION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _json_default(obj):
+	"""pd.Timestamp / date / datetime -> ISO string, kiểu lạ khác -> str"""
+	if hasattr(obj, "isoformat"):
+		return obj.isoformat()
+	return str(obj)
+
+
+def _tail_lines(path: str, n: int, block_size: int = 65536) -> Tuple[List[bytes], bool]:
+	"""
+	n dòng cuối của file (đọc ngược theo block, không đọc cả file)
+
+	Returns:
+		(các dòng không rỗng, còn dòng cũ hơn phía trước hay không)
+	"""
+	with open(path, "rb") as f:
+		f.seek(0, os.SEEK_END)
+		pos = f.tell()
+		data = b""
+		while pos > 0 and data.count(b"\n") <= n:
+			read_size = min(block_size, pos)
+			pos -= read_size
+			f.seek(pos)
+			data = f.read(read_size) + data
+	lines = [line for line in data.split(b"\n") if line.strip()]
+	if pos > 0:
+		lines = lines[1:]  # First line may be cut by the block boundary
+	return lines[-n:], pos > 0 or len(lines) > n
+
+
+class ConversationStore:
+	"""
+	Append-only JSONL: {"ts": ..., "message": {...}, "chart": {...} | null}
+
+	Chart của message nằm cùng record (không dùng chart_index toàn cục) nên load một
+	phần lịch sử vẫn ghép đúng chart. Sau mỗi compact_every lần ghi, file được compact:
+	chỉ bỏ dòng hỏng (ghi dở). Nếu max_messages > 0, các record cũ hơn max_messages
+	message cuối được chuyển sang file archive (<path>.archive), load_recent vẫn đọc tới.
+	"""
+
+	def __init__(self, path: str, max_messages: int = 0, compact_every: int = 100):
+		self.path = path
+		self.archive_path = f"{path}.archive"
+		self.max_messages = max_messages
+		self.compact_every = compact_every
+		self._lock = threading.Lock()
+		self._appends_since_compact = 0
+
+	def append(self, records: List[Dict[str, Any]]) -> None:
+		"""Ghi thêm records (message + chart) vào cuối file bằng một lần write"""
+		if not records:
+			return
+		lines = "".join(
+			json.dumps({"ts": time.time(), **record}, ensure_ascii=False, default=_json_default) + "\n"
+			for record in records
+		)
+		with self._lock:
+			_append_lines(self.path, lines)
+			self._appends_since_compact += 1
+			if self._appends_since_compact >= self.compact_every:
+				self._compact_locked()
+
+	def load_recent(self, n: int) -> Tuple[List[Dict[str, Any]], bool]:
+		"""
+		n record cuối (cũ -> mới), đọc tiếp vào archive nếu log hiện tại không đủ
+
+		Returns:
+			(records, còn message cũ hơn chưa load hay không)
+		"""
+		with self._lock:
+			lines, has_more = [], False
+			if os.path.exists(self.path):
+				lines, has_more = _tail_lines(self.path, n)
+			if len(lines) < n and os.path.exists(self.archive_path):
+				archived, has_more = _tail_lines(self.archive_path, n - len(lines))
+				lines = archived + lines
+			elif not has_more and os.path.exists(self.archive_path):
+				has_more = os.path.getsize(self.archive_path) > 0
+		return self._parse(lines), has_more
+
+	def rewrite(self, records: List[Dict[str, Any]]) -> None:
+		"""Thay toàn bộ log của conversation này (ví dụ migrate file cũ, load chat segment)"""
+		with self._lock:
+			self._write_locked([
+				json.dumps({"ts": time.time(), **record}, ensure_ascii=False, default=_json_default)
+				for record in records
+			])
+
+	def compact(self) -> None:
+		with self._lock:
+			self._compact_locked()
+
+	@staticmethod
+	def _parse(lines: List[bytes]) -> List[Dict[str, Any]]:
+		records = []
+		for line in lines:
+			try:
+				records.append(json.loads(line))
+			except ValueError:
+				continue  # Partial line from an interrupted write
+		return records
+
+	def _compact_locked(self) -> None:
+		self._appends_since_compact = 0
+		if not os.path.exists(self.path):
+			return
+		with open(self.path, "rb") as f:
+			records = self._parse(f.read().split(b"\n"))
+		if self.max_messages > 0 and len(records) > self.max_messages:
+			# Older records are moved, never dropped: archive first, then shrink the live log
+			archived = records[:-self.max_messages]
+			records = records[-self.max_messages:]
+			_append_lines(self.archive_path, "".join(
+				json.dumps(record, ensure_ascii=False, default=_json_default) + "\n" for record in archived
+			))
+		self._write_locked([json.dumps(record, ensure_ascii=False, default=_json_default) for record in records])
+
+	def _write_locked(self, lines: List[str]) -> None:
+		os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+		tmp_path = f"{self.path}.{os.getpid()}.tmp"
+		with open(tmp_path, "w", encoding="utf-8") as f:
+			f.write("".join(line + "\n" for line in lines))
+		os.replace(tmp_path, self.path)
+		self._appends_since_compact = 0
+
+
+def _append_lines(path: str, lines: str) -> None:
+	"""Ghi thêm lines vào cuối file; dòng ghi dở trước đó (nếu có) không dính vào record mới"""
+	os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+	with open(path, "a+b") as f:
+		# An interrupted write leaves a partial last line; start the new records on their own line
+		if f.tell() > 0:
+			f.seek(-1, os.SEEK_END)
+			if f.read(1) != b"\n":
+				lines = "\n" + lines
+		f.write(lines.encode("utf-8"))
+
+
+def new_conversation_id() -> str:
+	"""Id conversation mới: thời điểm tạo + hậu tố ngẫu nhiên (sắp xếp được theo thời gian)"""
+	return f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def is_conversation_id(value: Optional[str]) -> bool:
+	"""Id hợp lệ để dùng làm tên file (không chứa / hay ..)"""
+	return bool(value) and bool(_CONVERSATION_ID.match(value))
+
+
+def conversation_log_path(directory: str, conversation_id: str) -> str:
+	return os.path.join(directory, f"{conversation_id}.jsonl")
+
+
+def list_conversations(directory: str) -> List[str]:
+	"""Id các conversation có log, mới ghi nhất trước"""
+	if not os.path.isdir(directory):
+		return []
+	logs = [name for name in os.listdir(directory) if name.endswith(".jsonl")]
+	logs.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True)
+	return [name[:-len(".jsonl")] for name in logs]
+
+
+def serialize_charts(charts) -> List[Optional[Dict[str, Any]]]:
+	"""Charts -> dạng lưu được (JSON): chỉ giữ chart_ref, figure nằm ở sidecar file"""
+	serializable_charts = []
+	for chart_data in charts or []:
+		if not chart_data:
+			serializable_charts.append(None)  # Keep positions so message chart_index stays valid
+			continue
+		serializable_chart = {
+			"question": chart_data.get("question", ""),
+			"chart_ref": chart_data.get("chart_ref"),
+			"timestamp": chart_data.get("timestamp", time.time())
+		}
+		# Conversations saved before chart refs still carry the PNG
+		if chart_data.get("chart_png_base64"):
+			serializable_chart["chart_png_base64"] = chart_data["chart_png_base64"]
+		serializable_charts.append(serializable_chart)
+	return serializable_charts
+
+
+def restore_charts(saved_charts) -> List[Optional[Dict[str, Any]]]:
+	"""Dạng đã lưu -> session charts; figure chỉ được đọc từ sidecar khi hiển thị"""
+	charts = []
+	for chart_data in saved_charts or []:
+		if not chart_data:
+			charts.append(None)
+			continue
+		chart = {
+			"question": chart_data.get("question", ""),
+			"chart": None,
+			"chart_ref": chart_data.get("chart_ref"),
+			"timestamp": chart_data.get("timestamp", time.time())
+		}
+		if chart_data.get("chart_png_base64"):
+			chart["chart_png_base64"] = chart_data["chart_png_base64"]
+		charts.append(chart)
+	return charts
+
+
+def conversation_records(messages, charts) -> List[Dict[str, Any]]:
+	"""
+	Messages -> records của conversation log; chart đi cùng message của nó
+
+	chart được lấy theo chart_index của chính message (không theo thứ tự chart),
+	chart_index không hợp lệ (không phải số, ngoài phạm vi, trỏ vào chart rỗng) -> không có chart.
+	"""
+	serializable_charts = serialize_charts(charts)
+	records = []
+	for message in messages:
+		record = {"message": {k: v for k, v in message.items() if k != "chart_index"}, "chart": None}
+		chart_index = message.get("chart_index")
+		if isinstance(chart_index, int) and not isinstance(chart_index, bool) and 0 <= chart_index < len(serializable_charts):
+			record["chart"] = serializable_charts[chart_index]
+		records.append(record)
+	return records
+
+
+def legacy_conversation_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+	"""
+	data/conversation.json cũ -> records của conversation log
+
+	File cũ chỉ lưu các chart xuất được PNG (chart lỗi bị bỏ, không để lại chỗ trống),
+	nên chart_index của message có thể lệch. Chart được gán cho message theo câu hỏi
+	(nội dung user message ngay trước nó): ưu tiên chart tại chart_index nếu câu hỏi khớp,
+	ngược lại chart chưa dùng đầu tiên có cùng câu hỏi; không tìm thấy -> message không có chart.
+	"""
+	messages = data.get("messages", [])
+	charts = serialize_charts(data.get("charts", []))
+	used = set()
+	records = []
+	question = None
+	for message in messages:
+		record = {"message": {k: v for k, v in message.items() if k != "chart_index"}, "chart": None}
+		if message.get("role") == "user":
+			question = message.get("content")
+		chart_index = message.get("chart_index")
+		if chart_index is not None:
+			candidates = ([chart_index] if isinstance(chart_index, int) else []) + list(range(len(charts)))
+			for idx in candidates:
+				chart = charts[idx] if 0 <= idx < len(charts) else None
+				if chart and idx not in used and chart.get("question") == question:
+					record["chart"] = chart
+					used.add(idx)
+					break
+		records.append(record)
+	return records